@@ -0,0 +1,312 @@
+"""JSON metrics API over the dashboard's plot datasets.
+
+Serves the dataset behind every plot over local HTTP, for tools that poll
+the dashboard's numbers:
+
+    GET /plots                                   plot ids, regions, months and the data version
+    GET /plots/plot1?region=West                 plot1's rows for the West region
+    GET /plots/plot10?start=2016-01&end=2016-06  restricted to an inclusive range of months
+    GET /plots/plot18?high_activity_orders=30    with thresholds of the plot overridden
+
+Datasets go through the same source, local snapshot, query paths and
+result cache as the dashboard (see sources.py and result_cache.py), so
+with a shared ``SALES_DASHBOARD_CACHE`` a result computed by either is
+served to both.
+Every dataset carries an ETag made from the data version and the request;
+a request whose ``If-None-Match`` still matches gets ``304 Not Modified``
+without a query being run. Bodies are gzip-compressed for clients sending
+``Accept-Encoding: gzip``.
+
+    python api.py --port 8502
+    python api.py --check      # answer malformed and failing requests with JSON errors
+
+Numeric thresholds must lie within queries.THRESHOLD_RANGES, the bounds
+of the sidebar widgets; other values get ``400 Bad Request``. Any other
+failure is logged and answered with ``500``, never a dropped connection.
+
+Setting ``SALES_DASHBOARD_API_PORT`` serves the API from the dashboard's own
+process instead, on its connection and caches.
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import datastore
+import result_cache
+import sources
+from queries import ALL_REGIONS, PLOT_IDS, PLOT_THRESHOLDS, THRESHOLD_RANGES
+
+API_PORT_ENV_VAR = "SALES_DASHBOARD_API_PORT"
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+
+# Smaller bodies are sent as they are; gzip would barely shrink them
+MIN_GZIP_BYTES = 512
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _month(value, name):
+    try:
+        return datetime.datetime.strptime(value[:7], '%Y-%m').date()
+    except ValueError:
+        raise ApiError(400, f"{name} must be a month such as 2016-01, not {value!r}") from None
+
+
+class MetricsApi:
+    """Plot datasets of ``source``, queried on the copy ``snapshots`` holds through ``cache``."""
+
+    def __init__(self, source, snapshots, cache=None):
+        self.source = source
+        self.snapshots = snapshots
+        self.cache = cache
+        self._catalog = None
+
+    def version(self):
+        return self.source.version()
+
+    def catalog(self, version):
+        """Connection, regions and months of the data at ``version``."""
+        catalog = self._catalog
+        if catalog is None or catalog[0] != version:
+            con = self.snapshots.connection(version)
+            catalog = (version, con, [ALL_REGIONS] + datastore.region_names(con), datastore.data_months(con))
+            self._catalog = catalog
+        return catalog[1:]
+
+    def index(self, version):
+        _, regions, months = self.catalog(version)
+        return {
+            'version': version,
+            'plots': PLOT_IDS,
+            'regions': regions,
+            'months': [f"{month:%Y-%m}" for month in months],
+            'thresholds': PLOT_THRESHOLDS,
+            'threshold_ranges': THRESHOLD_RANGES,
+        }
+
+    @staticmethod
+    def _date_range(params, months):
+        start = _month(params.pop('start'), 'start') if 'start' in params else months[0]
+        end = _month(params.pop('end'), 'end') if 'end' in params else months[-1]
+        if start > end:
+            raise ApiError(400, "start must not be after end")
+        # The full range is no filter, as on the dashboard, so both share cache entries
+        return None if (start, end) == (months[0], months[-1]) else (start, end)
+
+    @staticmethod
+    def _thresholds(plot_id, params):
+        defaults = PLOT_THRESHOLDS.get(plot_id, {})
+        thresholds = {}
+        for name, value in params.items():
+            if name not in defaults:
+                raise ApiError(400, f"Unknown parameter for {plot_id}: {name!r}")
+            try:
+                thresholds[name] = type(defaults[name])(value)
+            except ValueError:
+                raise ApiError(400, f"Invalid value for {name}: {value!r}") from None
+            low, high = THRESHOLD_RANGES.get(plot_id, {}).get(name, (None, None))
+            if low is not None and not low <= thresholds[name] <= high:
+                raise ApiError(400, f"{name} must be between {low} and {high}, not {value}")
+        return thresholds or None
+
+    def dataset(self, plot_id, params, version):
+        """Rows of ``plot_id`` for the region, month range and thresholds in ``params``."""
+        if plot_id not in PLOT_IDS:
+            raise ApiError(404, f"Unknown plot: {plot_id!r}")
+        con, regions, months = self.catalog(version)
+        params = dict(params)
+        region = params.pop('region', ALL_REGIONS)
+        if region not in regions:
+            raise ApiError(400, f"Unknown region: {region!r}")
+        date_range = self._date_range(params, months)
+        thresholds = self._thresholds(plot_id, params)
+        try:
+            data = self.source.fetch_plot_data(con, plot_id, region, self.cache, version,
+                                               date_range=date_range, thresholds=thresholds)
+        except ValueError as exc:
+            # Thresholds with a fixed set of values, such as touch or resolution, are checked by the query
+            raise ApiError(400, str(exc)) from None
+        return {
+            'plot_id': plot_id,
+            'region': region,
+            'date_range': [f"{month:%Y-%m}" for month in date_range] if date_range else None,
+            'thresholds': {**PLOT_THRESHOLDS.get(plot_id, {}), **(thresholds or {})} or None,
+            'version': version,
+            'columns': list(data.columns),
+            'rows': json.loads(data.to_json(orient='records', date_format='iso')),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'SalesDashboardAPI/1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qsl(url.query)
+        api = self.server.api
+        try:
+            version = api.version()
+            etag = '"' + hashlib.sha1(f"{version}|{url.path}|{sorted(params)}".encode()).hexdigest()[:20] + '"'
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self._send(304, None, etag)
+                return
+            parts = [part for part in url.path.split('/') if part]
+            if parts == ['plots']:
+                if params:
+                    raise ApiError(400, "/plots takes no parameters")
+                body = api.index(version)
+            elif len(parts) == 2 and parts[0] == 'plots':
+                body = api.dataset(parts[1], params, version)
+            else:
+                raise ApiError(404, f"Not found: {url.path}")
+        except ApiError as exc:
+            self._send(exc.status, {'error': str(exc)})
+            return
+        except TimeoutError as exc:
+            self._send(503, {'error': str(exc)})
+            return
+        except Exception:
+            # A failing query answers 500 rather than dropping the connection
+            logger.exception("Failed to serve %s", self.path)
+            self._send(500, {'error': 'Internal server error'})
+            return
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        gzipped = len(payload) >= MIN_GZIP_BYTES and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            payload = gzip.compress(payload, compresslevel=6)
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            # Clients may keep the body but must check the ETag before reusing it
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Vary', 'Accept-Encoding')
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(api, host=DEFAULT_HOST, port=DEFAULT_PORT, quiet=False):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.api = api
+    server.quiet = quiet
+    return server
+
+
+def start(api, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serve ``api`` from a daemon thread; returns the server."""
+    server = make_server(api, host, port, quiet=True)
+    threading.Thread(target=server.serve_forever, name='metrics-api', daemon=True).start()
+    return server
+
+
+# Requests with the status each must get: (path, status)
+CHECK_REQUESTS = [
+    ('/plots', 200),
+    ('/plots/plot21?zoom_level=3&max_points=50', 200),
+    ('/plots/plot21?zoom_level=-2000', 400),
+    ('/plots/plot21?zoom_level=9', 400),
+    ('/plots/plot21?max_points=0', 400),
+    ('/plots/plot20?churn_window_days=99999999999999999999', 400),
+    ('/plots/plot20?churn_window_days=0', 400),
+    ('/plots/plot18?high_activity_orders=abc', 400),
+    ('/plots/plot24?resolution=week', 400),
+    ('/plots/plot1?region=Nowhere', 400),
+    ('/plots/plot99', 404),
+]
+
+
+class _FailingSource(sources.DataSource):
+    """Delegates to ``source`` but fails every plot query, as a broken database would."""
+
+    def __init__(self, source):
+        self.source = source
+
+    def version(self):
+        return self.source.version()
+
+    def open_database(self):
+        return self.source.open_database()
+
+    def fetch_plot_data(self, *args, **kwargs):
+        raise RuntimeError("simulated query failure")
+
+
+def check(source):
+    """Send CHECK_REQUESTS, and a plot request to a failing source; returns the failures."""
+    import http.client
+
+    snapshots = sources.Snapshots(source)
+    cases = [(MetricsApi(source, snapshots), path, status) for path, status in CHECK_REQUESTS]
+    cases.append((MetricsApi(_FailingSource(source), snapshots), '/plots/plot1', 500))
+    failures = []
+    for api, path, expected in cases:
+        server = start(api, port=0)
+        try:
+            con = http.client.HTTPConnection(DEFAULT_HOST, server.server_port, timeout=60)
+            con.request('GET', path)
+            response = con.getresponse()
+            body = json.loads(response.read() or b'null')
+            if response.status != expected or (expected != 200 and 'error' not in body):
+                failures.append(f"{path}: {response.status} {body} (expected {expected})")
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            failures.append(f"{path}: {exc!r} (expected {expected})")
+        finally:
+            server.shutdown()
+            server.server_close()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--check', action='store_true', help='Check the answers to malformed and failing requests')
+    args = parser.parse_args(argv)
+
+    source = sources.from_url()
+    if args.check:
+        failures = check(source)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print(f"{len(CHECK_REQUESTS) + 1 - len(failures)}/{len(CHECK_REQUESTS) + 1} requests answered as expected")
+        return 1 if failures else 0
+    api = MetricsApi(source, sources.Snapshots(source), result_cache.from_url())
+    server = make_server(api, args.host, args.port)
+    print(f"serving plot datasets on http://{args.host}:{server.server_port}/plots")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
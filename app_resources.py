@@ -0,0 +1,40 @@
+"""Streamlit-cached resources shared by every page of the app."""
+
+import os
+
+import streamlit as st
+
+import api
+import result_cache
+import sources
+
+
+# Where the tables come from: the CSVs or a SQL database (see sources.py)
+@st.cache_resource
+def get_source():
+    return sources.from_url()
+
+
+# DuckDB copy of the source's tables, reloaded when the data version changes
+@st.cache_resource
+def get_snapshots():
+    return sources.Snapshots(get_source())
+
+
+def get_connection(version):
+    return get_snapshots().connection(version)
+
+
+# Second-level result cache shared across replicas (see result_cache.py)
+@st.cache_resource
+def get_result_cache():
+    return result_cache.from_url()
+
+
+# JSON metrics API served from this process when a port is configured (see api.py)
+@st.cache_resource
+def start_metrics_api():
+    port = os.environ.get(api.API_PORT_ENV_VAR)
+    if not port:
+        return None
+    return api.start(api.MetricsApi(get_source(), get_snapshots(), get_result_cache()), port=int(port))
@@ -0,0 +1,125 @@
+"""Web-event-to-order attribution materialized at ingest.
+
+``order_attribution`` holds every order with its first-touch and last-touch
+channel. Orders and web events are matched with an as-of join on the
+account, which DuckDB runs as a sort-merge rather than comparing every order
+with every event of its account, so the build scales with the number of
+rows. Appended orders are attributed on their own; appended web events can
+re-attribute the orders of their accounts, so those accounts' orders are
+attributed again.
+"""
+
+from queries import ALL_REGIONS, ATTRIBUTION_TOUCHES, PLOT_THRESHOLDS, date_range_clause
+
+ATTRIBUTION_TABLE = 'order_attribution'
+
+# Last touch is the latest event at or before the order; first touch is the
+# account's first event, when that one precedes the order
+_ATTRIBUTION_QUERY = """
+SELECT o.id AS order_id,
+       o.account_id,
+       o.ordered_at,
+       date_trunc('month', o.ordered_at) AS month,
+       o.total_amt_usd,
+       f.channel AS first_touch,
+       e.channel AS last_touch
+FROM (
+    SELECT id, account_id, CAST(occurred_at AS TIMESTAMP) AS ordered_at, total_amt_usd
+    FROM {orders}
+) o
+ASOF LEFT JOIN (
+    SELECT account_id, CAST(occurred_at AS TIMESTAMP) AS event_at, channel
+    FROM {web_events}
+    WHERE account_id IN (SELECT account_id FROM {orders})
+) e ON o.account_id = e.account_id AND o.ordered_at >= e.event_at
+LEFT JOIN (
+    SELECT account_id, arg_min(channel, CAST(occurred_at AS TIMESTAMP)) AS channel
+    FROM {web_events}
+    WHERE account_id IN (SELECT account_id FROM {orders})
+    GROUP BY account_id
+) f ON e.account_id = f.account_id
+"""
+
+
+def enabled():
+    return True
+
+
+def cache_tag():
+    return 'attribution'
+
+
+def build(con):
+    con.execute(f"CREATE OR REPLACE TABLE {ATTRIBUTION_TABLE} AS "
+                + _ATTRIBUTION_QUERY.format(orders='orders', web_events='web_events'))
+
+
+def update(con, table, rows):
+    """Attribute appended orders, or re-attribute the orders of accounts with appended web events."""
+    if table not in ('orders', 'web_events'):
+        return
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_rows', rows)
+        if table == 'orders':
+            cursor.execute(f"INSERT INTO {ATTRIBUTION_TABLE} BY NAME "
+                           + _ATTRIBUTION_QUERY.format(orders='_new_rows', web_events='web_events'))
+        else:
+            cursor.execute("CREATE TEMP TABLE _touched_accounts AS SELECT DISTINCT account_id FROM _new_rows")
+            cursor.execute(f"DELETE FROM {ATTRIBUTION_TABLE} "
+                           "WHERE account_id IN (SELECT account_id FROM _touched_accounts)")
+            touched_orders = "(SELECT * FROM orders WHERE account_id IN (SELECT account_id FROM _touched_accounts))"
+            cursor.execute(f"INSERT INTO {ATTRIBUTION_TABLE} BY NAME "
+                           + _ATTRIBUTION_QUERY.format(orders=touched_orders, web_events='web_events'))
+            cursor.execute("DROP TABLE _touched_accounts")
+        cursor.unregister('_new_rows')
+    finally:
+        cursor.close()
+
+
+def plot22_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    """Revenue per region and attributed channel, from ``order_attribution``.
+
+    A date range restricts the events as well as the orders, as in the
+    plot's SQL, so the orders in range are attributed again from the events
+    in range.
+    """
+    touch = {**PLOT_THRESHOLDS['plot22'], **(thresholds or {})}['touch']
+    if touch not in ATTRIBUTION_TOUCHES:
+        raise ValueError(f"touch must be one of {ATTRIBUTION_TOUCHES}, not {touch!r}")
+    if date_range is None:
+        source = ATTRIBUTION_TABLE
+    else:
+        in_range = date_range_clause(date_range)
+        source = "(" + _ATTRIBUTION_QUERY.format(
+            orders=f"(SELECT * FROM orders WHERE {in_range})",
+            web_events=f"(SELECT * FROM web_events WHERE {in_range})") + ")"
+    params = []
+    region_where = ""
+    if region_choice != ALL_REGIONS:
+        region_where = "WHERE r.name = ?"
+        params.append(region_choice)
+    cursor = con.cursor()
+    try:
+        return cursor.execute(f"""
+        SELECT r.name AS region_name,
+               COALESCE(t.{touch}_touch, 'unattributed') AS channel,
+               COUNT(*) AS orders,
+               SUM(t.total_amt_usd) AS revenue
+        FROM {source} t
+        JOIN accounts a ON t.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        {region_where}
+        GROUP BY 1, 2
+        ORDER BY region_name, revenue DESC
+        """, params).df()
+    finally:
+        cursor.close()
+
+
+CROSS_FILTERS = ()
+
+PLOT_EXECUTORS = {
+    'plot22': plot22_data,
+}
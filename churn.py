@@ -0,0 +1,143 @@
+"""Churn by inactivity window, from per-account recency and the monthly rollups.
+
+``account_recency`` keeps each account's first and last order time, its
+order count and its order total. It is built when the data is loaded and
+upserted from appended orders, so the current churn split for any window and
+region, and the account totals of the rep drill-down (see drilldown.py), are
+lookups on one row per account. The churn trend reads the ``last_order_at`` of each
+account's monthly order buckets (see rollups.py) instead of the orders.
+"""
+
+import rollups
+from queries import ALL_REGIONS, PLOT_THRESHOLDS
+
+RECENCY_TABLE = 'account_recency'
+
+_RECENCY_QUERY = """
+SELECT account_id,
+       MIN({first}) AS first_order_at,
+       MAX({last}) AS last_order_at,
+       {count} AS orders,
+       SUM({amount}) AS total_amt_usd
+FROM {source}
+GROUP BY account_id
+"""
+
+
+def enabled():
+    return True
+
+
+def cache_tag():
+    return 'churn'
+
+
+def build(con):
+    con.execute(f"""
+    CREATE OR REPLACE TABLE {RECENCY_TABLE} (
+        account_id BIGINT PRIMARY KEY,
+        first_order_at TIMESTAMP,
+        last_order_at TIMESTAMP,
+        orders BIGINT,
+        total_amt_usd DOUBLE
+    )
+    """)
+    con.execute(f"INSERT INTO {RECENCY_TABLE} " + _RECENCY_QUERY.format(
+        first='first_order_at', last='last_order_at', count='SUM(orders)', amount='total_amt_usd_sum',
+        source=rollups.ORDERS_ROLLUP))
+
+
+def update(con, table, rows):
+    """Upsert the recency of the accounts with appended orders."""
+    if table != 'orders':
+        return
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_orders', rows)
+        cursor.execute(f"INSERT INTO {RECENCY_TABLE} " + _RECENCY_QUERY.format(
+            first='CAST(occurred_at AS TIMESTAMP)', last='CAST(occurred_at AS TIMESTAMP)', count='COUNT(*)',
+            amount='total_amt_usd', source='_new_orders') + """
+        ON CONFLICT (account_id) DO UPDATE SET
+            first_order_at = least(first_order_at, EXCLUDED.first_order_at),
+            last_order_at = greatest(last_order_at, EXCLUDED.last_order_at),
+            orders = orders + EXCLUDED.orders,
+            total_amt_usd = total_amt_usd + EXCLUDED.total_amt_usd
+        """)
+        cursor.unregister('_new_orders')
+    finally:
+        cursor.close()
+
+
+def churn_counts(con, region_choice=ALL_REGIONS, window_days=180):
+    """Active, churned and never-ordered accounts as of the latest order.
+
+    An account is active if its last order falls within ``window_days`` of
+    the latest order and churned if it has ordered, but not within the window.
+    """
+    params = [window_days, window_days]
+    region_where = ""
+    if region_choice != ALL_REGIONS:
+        region_where = "WHERE r.name = ?"
+        params.append(region_choice)
+    cursor = con.cursor()
+    try:
+        row = cursor.execute(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE rc.last_order_at >= l.latest - to_days(?)) AS active_accounts,
+            COUNT(*) FILTER (WHERE rc.last_order_at < l.latest - to_days(?)) AS churned_accounts,
+            COUNT(*) FILTER (WHERE rc.account_id IS NULL) AS never_ordered
+        FROM accounts a
+        LEFT JOIN {RECENCY_TABLE} rc ON a.id = rc.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        CROSS JOIN (SELECT MAX(last_order_at) AS latest FROM {RECENCY_TABLE}) l
+        {region_where}
+        """, params).fetchone()
+    finally:
+        cursor.close()
+    return dict(zip(('active_accounts', 'churned_accounts', 'never_ordered'), row))
+
+
+def plot20_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    window_days = int({**PLOT_THRESHOLDS['plot20'], **(thresholds or {})}['churn_window_days'])
+    region_where = "" if region_choice == ALL_REGIONS else "WHERE r.name = ?"
+    # Buckets before a month start hold exactly the orders before it
+    return rollups.query_buckets(con, f"""
+    , scoped AS (
+        SELECT o.account_id, o.month, o.last_order_at
+        FROM om o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        {region_where}
+    ),
+    as_of AS (
+        SELECT range AS as_of_date
+        FROM range(
+            (SELECT MIN(month) FROM scoped) + INTERVAL 1 MONTH,
+            (SELECT MAX(month) FROM scoped) + INTERVAL 2 MONTH,
+            INTERVAL 1 MONTH
+        )
+    ),
+    last_orders AS (
+        SELECT d.as_of_date, s.account_id, MAX(s.last_order_at) AS last_order_at
+        FROM as_of d
+        JOIN scoped s ON s.month < d.as_of_date
+        GROUP BY d.as_of_date, s.account_id
+    )
+    SELECT
+        as_of_date,
+        COUNT(*) FILTER (WHERE last_order_at >= as_of_date - INTERVAL {window_days} DAY) AS active_accounts,
+        COUNT(*) FILTER (WHERE last_order_at < as_of_date - INTERVAL {window_days} DAY) AS churned_accounts,
+        churned_accounts / COUNT(*) AS churn_rate
+    FROM last_orders
+    GROUP BY as_of_date
+    ORDER BY as_of_date
+    """, region_choice, date_range, filters)
+
+
+CROSS_FILTERS = rollups.CROSS_FILTERS
+
+PLOT_EXECUTORS = {
+    'plot20': plot20_data,
+}
@@ -0,0 +1,145 @@
+"""Cohort retention matrix maintained on top of the monthly order rollups.
+
+Every account belongs to the cohort of its first order month.
+``cohort_matrix`` holds, per region, cohort month and months since first
+order, the number of active accounts and their revenue; it is built with a
+single window pass over ``orders_monthly`` when the data is loaded.
+``account_cohorts`` remembers each account's cohort so that appended orders
+only rebuild the cohorts of the accounts they touch: a back-dated order can
+move an account to an earlier cohort, so both its old and new cohort are
+recomputed.
+"""
+
+from queries import ALL_REGIONS
+from rollups import ORDERS_ROLLUP
+
+COHORT_MATRIX = 'cohort_matrix'
+ACCOUNT_COHORTS = 'account_cohorts'
+
+# Cohort cells per region from monthly buckets carrying their cohort_month
+_MATRIX_QUERY = """
+SELECT r.name AS region_name,
+       b.cohort_month,
+       date_diff('month', b.cohort_month, b.month) AS months_since_first_order,
+       COUNT(*) AS active_accounts,
+       SUM(b.total_amt_usd_sum) AS revenue
+FROM ({buckets}) b
+JOIN accounts a ON b.account_id = a.id
+JOIN sales_reps sr ON a.sales_rep_id = sr.id
+JOIN region r ON sr.region_id = r.id
+GROUP BY ALL
+"""
+
+_WINDOWED_BUCKETS = """
+SELECT account_id, month, total_amt_usd_sum,
+       MIN(month) OVER (PARTITION BY account_id) AS cohort_month
+FROM {source}
+"""
+
+
+def enabled():
+    return True
+
+
+def cache_tag():
+    return 'cohorts'
+
+
+def build(con):
+    con.execute(f"""
+    CREATE OR REPLACE TABLE {ACCOUNT_COHORTS} AS
+    SELECT account_id, MIN(month) AS cohort_month
+    FROM {ORDERS_ROLLUP}
+    GROUP BY account_id
+    """)
+    buckets = _WINDOWED_BUCKETS.format(source=ORDERS_ROLLUP)
+    con.execute(f"CREATE OR REPLACE TABLE {COHORT_MATRIX} AS {_MATRIX_QUERY.format(buckets=buckets)}")
+
+
+def update(con, table, rows):
+    """Recompute the cohorts of the accounts with appended orders.
+
+    Runs after rollups.update(), so ``orders_monthly`` already holds the new
+    orders.
+    """
+    if table != 'orders':
+        return
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_orders', rows)
+        cursor.execute("CREATE TEMP TABLE _touched_accounts AS SELECT DISTINCT account_id FROM _new_orders")
+        cursor.unregister('_new_orders')
+        cursor.execute(f"""
+        CREATE TEMP TABLE _touched_cohorts AS
+        SELECT cohort_month FROM {ACCOUNT_COHORTS} WHERE account_id IN (SELECT account_id FROM _touched_accounts)
+        """)
+        cursor.execute(f"DELETE FROM {ACCOUNT_COHORTS} WHERE account_id IN (SELECT account_id FROM _touched_accounts)")
+        cursor.execute(f"""
+        INSERT INTO {ACCOUNT_COHORTS}
+        SELECT account_id, MIN(month) FROM {ORDERS_ROLLUP}
+        WHERE account_id IN (SELECT account_id FROM _touched_accounts)
+        GROUP BY account_id
+        """)
+        cursor.execute(f"""
+        INSERT INTO _touched_cohorts
+        SELECT cohort_month FROM {ACCOUNT_COHORTS} WHERE account_id IN (SELECT account_id FROM _touched_accounts)
+        """)
+        cursor.execute(f"DELETE FROM {COHORT_MATRIX} WHERE cohort_month IN (SELECT cohort_month FROM _touched_cohorts)")
+        buckets = f"""
+        SELECT o.account_id, o.month, o.total_amt_usd_sum, c.cohort_month
+        FROM {ORDERS_ROLLUP} o
+        JOIN {ACCOUNT_COHORTS} c ON o.account_id = c.account_id
+        WHERE c.cohort_month IN (SELECT cohort_month FROM _touched_cohorts)
+        """
+        cursor.execute(f"INSERT INTO {COHORT_MATRIX} BY NAME {_MATRIX_QUERY.format(buckets=buckets)}")
+        cursor.execute("DROP TABLE _touched_accounts")
+        cursor.execute("DROP TABLE _touched_cohorts")
+    finally:
+        cursor.close()
+
+
+def plot19_data(con, region_choice, date_range=None, filters=None):
+    """The retention matrix, from ``cohort_matrix`` or, for a date range, its monthly buckets."""
+    if date_range is None:
+        source = COHORT_MATRIX
+        params = []
+    else:
+        # Cohorts are first orders within the range, as in the SQL with its orders restricted
+        buckets = _WINDOWED_BUCKETS.format(source=f"(SELECT * FROM {ORDERS_ROLLUP} WHERE month BETWEEN ? AND ?)")
+        source = f"({_MATRIX_QUERY.format(buckets=buckets)})"
+        params = list(date_range)
+    region_where = ""
+    if region_choice != ALL_REGIONS:
+        region_where = "WHERE region_name = ?"
+        params.append(region_choice)
+    cursor = con.cursor()
+    try:
+        return cursor.execute(f"""
+        WITH cohort_activity AS (
+            SELECT cohort_month,
+                   months_since_first_order,
+                   CAST(SUM(active_accounts) AS BIGINT) AS active_accounts,
+                   SUM(revenue) AS revenue
+            FROM {source}
+            {region_where}
+            GROUP BY cohort_month, months_since_first_order
+        )
+        SELECT cohort_month,
+               months_since_first_order,
+               MAX(active_accounts) FILTER (WHERE months_since_first_order = 0)
+                   OVER (PARTITION BY cohort_month) AS cohort_size,
+               active_accounts,
+               active_accounts / cohort_size AS retention,
+               revenue
+        FROM cohort_activity
+        ORDER BY cohort_month, months_since_first_order
+        """, params).df()
+    finally:
+        cursor.close()
+
+
+CROSS_FILTERS = ()
+
+PLOT_EXECUTORS = {
+    'plot19': plot19_data,
+}
@@ -0,0 +1,110 @@
+"""Compact in-memory layout of the source tables.
+
+``pd.read_csv`` leaves every string as a Python object, timestamps as text
+and every integer as int64. ``compact_table`` narrows each column to what
+its values need:
+
+* strings with few distinct values become categoricals (dictionary encoded)
+* integers become int32 when every value fits
+* ``occurred_at`` becomes datetime64, which DuckDB stores as a TIMESTAMP
+* coordinates become float32; order amounts stay float64, as sums of
+  float32 dollars drift by cents
+
+The tables copied into DuckDB keep the narrow integer, float and timestamp
+types, so its in-memory tables are smaller and scans read fewer bytes.
+Categoricals are copied as VARCHAR: DuckDB would make them ENUMs, which
+reject values first seen in an append, and the tables' indexes rule out
+widening an ENUM column in place.
+
+``python compaction.py`` prints the memory of each table as read and as
+compacted.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_COLUMNS = {
+    'orders': ('occurred_at',),
+    'web_events': ('occurred_at',),
+}
+
+# Columns where float32's seven significant digits are enough (about a metre of latitude)
+FLOAT32_COLUMNS = {
+    'accounts': ('lat', 'long'),
+}
+
+# Strings are dictionary encoded when their distinct values are at most this share of the rows
+MAX_CATEGORY_RATIO = 0.5
+
+_INT32 = np.iinfo(np.int32)
+
+
+def compact_table(name, frame):
+    """``frame`` with every column narrowed as described in the module docstring."""
+    columns = {}
+    for column, values in frame.items():
+        if column in TIMESTAMP_COLUMNS.get(name, ()):
+            values = pd.to_datetime(values).astype('datetime64[us]')
+        elif column in FLOAT32_COLUMNS.get(name, ()):
+            values = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values) and len(values) \
+                and _INT32.min <= values.min() and values.max() <= _INT32.max:
+            values = values.astype(np.int32)
+        elif values.dtype == object and values.nunique() <= MAX_CATEGORY_RATIO * len(values):
+            values = values.astype('category')
+        columns[column] = values
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def select_list(frame):
+    """Select list copying ``frame`` into DuckDB with its categoricals as VARCHAR."""
+    categorical = [column for column, values in frame.items() if isinstance(values.dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return "*"
+    return f"* REPLACE ({', '.join(f'CAST({column} AS VARCHAR) AS {column}' for column in categorical)})"
+
+
+def read_csv_types(name):
+    """DuckDB types matching the compact layout, for ``read_csv`` of table ``name``.
+
+    Integer widths are left to DuckDB, whose on-disk storage bit-packs them.
+    """
+    types = {column: 'TIMESTAMP' for column in TIMESTAMP_COLUMNS.get(name, ())}
+    types.update({column: 'FLOAT' for column in FLOAT32_COLUMNS.get(name, ())})
+    return types
+
+
+def memory_report(raw_tables):
+    """Bytes of every table as read by ``pd.read_csv`` and once compacted, per table."""
+    rows = []
+    for name, raw in raw_tables.items():
+        compacted = compact_table(name, raw)
+        raw_bytes = int(raw.memory_usage(deep=True).sum())
+        compact_bytes = int(compacted.memory_usage(deep=True).sum())
+        rows.append({
+            'table': name,
+            'rows': len(raw),
+            'raw_bytes': raw_bytes,
+            'compact_bytes': compact_bytes,
+            'ratio': round(raw_bytes / max(compact_bytes, 1), 2),
+            'categorical': ', '.join(column for column, values in compacted.items()
+                                     if isinstance(values.dtype, pd.CategoricalDtype)),
+        })
+    return pd.DataFrame(rows)
+
+
+def _print_report():
+    import datastore
+
+    raw_tables = {name: datastore.load_table(name, compact=False) for name in datastore.TABLE_FILES}
+    report = memory_report(raw_tables)
+    for row in report.itertuples():
+        print(f"{row.table:>10}: {row.rows:>8} rows  {row.raw_bytes / 1024:>9.1f} KB -> "
+              f"{row.compact_bytes / 1024:>9.1f} KB  ({row.ratio:g}x)"
+              + (f"  categorical: {row.categorical}" if row.categorical else ""))
+    raw, compact = report['raw_bytes'].sum(), report['compact_bytes'].sum()
+    print(f"{'total':>10}: {raw / 1024:>24.1f} KB -> {compact / 1024:>9.1f} KB  ({raw / compact:.2f}x)")
+
+
+if __name__ == '__main__':
+    _print_report()
@@ -0,0 +1,174 @@
+"""Cross-filter selection shared by every chart.
+
+A click on a region, sales rep, channel, activity segment or month in one
+chart is recorded in a :class:`CrossFilter`, and every plot query is
+compiled against it: the fact and dimension tables the plot SQL reads are
+shadowed by CTEs of the same name that keep only the selected rows, with the
+selected values bound as query parameters rather than spliced into the SQL.
+Plots backed by monthly rollups (see rollups.py) compile the same filter
+against the rollup tables, so a click re-aggregates pre-summed buckets.
+"""
+
+import datetime
+from dataclasses import dataclass, replace
+
+from queries import date_range_clause, shadow_tables
+
+# Account activity segments, as defined by the activity segment chart
+ACTIVITY_SEGMENT = """CASE
+    WHEN {order_count} > {high} THEN 'High Activity'
+    WHEN {order_count} BETWEEN {medium} AND {high} THEN 'Medium Activity'
+    ELSE 'Low Activity'
+END"""
+
+# Charts a selection can be made in: plot id -> (dimension, selected point field)
+SELECTION_SOURCES = {
+    'plot3': ('sales_rep', 'x'),
+    'plot5': ('region', 'y'),
+    'plot11': ('region', 'x'),
+    'plot12': ('sales_rep', 'x'),
+    'plot13': ('month', 'x'),
+    'plot15': ('channel', 'x'),
+    'plot18': ('segment', 'x'),
+}
+
+DIMENSION_LABELS = {
+    'region': 'Region',
+    'month': 'Month',
+    'sales_rep': 'Sales Rep',
+    'channel': 'Channel',
+    'segment': 'Activity Segment',
+}
+
+
+@dataclass(frozen=True)
+class CrossFilter:
+    """The current cross-filter selection; ``None`` leaves a dimension open.
+
+    ``region`` and ``month`` narrow the sidebar region and date range (see
+    :meth:`scope`); the other dimensions narrow the accounts every plot sees.
+    """
+
+    region: str = None
+    month: datetime.date = None
+    sales_rep: str = None
+    channel: str = None
+    segment: str = None
+    # (high, medium) order counts the activity segments are cut at
+    activity_thresholds: tuple = (20, 10)
+
+    def toggled(self, dimension, value):
+        """A copy with ``dimension`` set to ``value``, or cleared if already selected."""
+        if dimension == 'month' and isinstance(value, str):
+            value = datetime.datetime.strptime(value[:7], '%Y-%m').date()
+        return replace(self, **{dimension: None if getattr(self, dimension) == value else value})
+
+    def active(self):
+        """The selected dimensions and values, in a stable order."""
+        return {dimension: getattr(self, dimension) for dimension in DIMENSION_LABELS
+                if getattr(self, dimension) is not None}
+
+    def account_dimensions(self):
+        return {dimension: value for dimension, value in self.active().items()
+                if dimension in ('sales_rep', 'channel', 'segment')}
+
+    def scope(self, region_choice, date_range):
+        """The region choice and date range after applying a region or month selection."""
+        if self.region is not None:
+            region_choice = self.region
+        if self.month is not None:
+            date_range = (self.month, self.month)
+        return region_choice, date_range
+
+    def __bool__(self):
+        return bool(self.active())
+
+
+def selection_from_event(plot_id, event):
+    """``(dimension, value)`` for a plotly selection event, or ``None``."""
+    source = SELECTION_SOURCES.get(plot_id)
+    points = (event or {}).get('selection', {}).get('points', [])
+    if source is None or not points:
+        return None
+    dimension, point_field = source
+    return dimension, points[0][point_field]
+
+
+def _month_clause(date_range, column):
+    start, end = date_range
+    return f"{column} BETWEEN ? AND ?", [start, end]
+
+
+def compile_ctes(filters, date_range=None, rollup_tables=None):
+    """CTEs restricting the tables a plot reads to ``filters``, with their parameters.
+
+    Given the ``(orders, web_events)`` monthly ``rollup_tables`` the CTEs
+    select their buckets as ``om`` and ``wm``; otherwise they shadow
+    ``orders`` and ``web_events`` for the plot's reference SQL. ``sales_reps``
+    and ``accounts`` are shadowed either way when an account-level dimension
+    is selected.
+    """
+    ctes, params = [], []
+    rollup = rollup_tables is not None
+    if rollup:
+        orders_source, web_events_source = rollup_tables
+        order_count = "SUM(orders)"
+        if date_range is None:
+            date_clause, date_params = "TRUE", []
+        else:
+            date_clause, date_params = _month_clause(date_range, 'month')
+    else:
+        orders_source, web_events_source = 'main.orders', 'main.web_events'
+        order_count = "COUNT(*)"
+        date_clause = "TRUE" if date_range is None else date_range_clause(date_range)
+        date_params = []
+
+    dimensions = filters.account_dimensions() if filters else {}
+    if 'sales_rep' in dimensions:
+        ctes.append("sales_reps AS (SELECT * FROM main.sales_reps WHERE name = ?)")
+        params.append(dimensions['sales_rep'])
+    if dimensions:
+        clauses = []
+        if 'sales_rep' in dimensions:
+            clauses.append("sales_rep_id IN (SELECT id FROM sales_reps)")
+        if 'channel' in dimensions:
+            clauses.append(f"id IN (SELECT account_id FROM {web_events_source} "
+                           f"WHERE channel = ? AND {date_clause})")
+            params.extend([dimensions['channel']] + date_params)
+        if 'segment' in dimensions:
+            high, medium = (int(threshold) for threshold in filters.activity_thresholds)
+            segment = ACTIVITY_SEGMENT.format(order_count="COALESCE(c.order_count, 0)", high=high, medium=medium)
+            clauses.append(f"""id IN (
+                SELECT a.id
+                FROM main.accounts a
+                LEFT JOIN (
+                    SELECT account_id, {order_count} AS order_count
+                    FROM {orders_source}
+                    WHERE {date_clause}
+                    GROUP BY account_id
+                ) c ON a.id = c.account_id
+                WHERE {segment} = ?
+            )""")
+            params.extend(date_params + [dimensions['segment']])
+        ctes.append(f"accounts AS (SELECT * FROM main.accounts WHERE {' AND '.join(clauses)})")
+
+    for table, source, alias in (('orders', orders_source, 'om'), ('web_events', web_events_source, 'wm')):
+        clauses = [date_clause]
+        table_params = list(date_params)
+        if dimensions:
+            clauses.append("account_id IN (SELECT id FROM accounts)")
+        if table == 'web_events' and 'channel' in dimensions:
+            clauses.append("channel = ?")
+            table_params.append(dimensions['channel'])
+        if not rollup and clauses == ["TRUE"]:
+            continue
+        ctes.append(f"{alias if rollup else table} AS (SELECT * FROM {source} WHERE {' AND '.join(clauses)})")
+        params.extend(table_params)
+    return ctes, params
+
+
+def apply(query, filters, date_range=None):
+    """``(query, params)`` with the plot's tables restricted to ``filters`` and ``date_range``."""
+    ctes, params = compile_ctes(filters, date_range)
+    return (shadow_tables(query, ctes) if ctes else query), params
+
@@ -0,0 +1,205 @@
+"""Loading of the source CSVs and execution of plot queries.
+
+Nothing here imports Streamlit, so the dashboard, the headless report
+renderer and other tooling share one data path.
+"""
+
+import functools
+import multiprocessing.util
+import os
+import shutil
+import tempfile
+
+import duckdb
+import pandas as pd
+
+import compaction
+import crossfilter
+import materialize
+import result_cache
+from queries import base_query, plot_query
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TABLE_FILES = {
+    'accounts': 'accounts.csv',
+    'orders': 'orders.csv',
+    'region': 'region.csv',
+    'sales_reps': 'sales_reps.csv',
+    'web_events': 'web_events.csv',
+}
+
+
+# Tables are stored sorted on their lookup key so DuckDB's per-row-group
+# min/max zonemaps prune everything but the matching rows, and the key also
+# gets an ART index for drill-down point lookups.
+CLUSTER_KEYS = {
+    'accounts': 'sales_rep_id',
+    'orders': 'account_id',
+    'web_events': 'account_id',
+}
+
+
+# Out-of-core mode: DuckDB scans the CSVs itself under a memory limit
+MEMORY_LIMIT_ENV_VAR = "SALES_DASHBOARD_MEMORY_LIMIT"
+TEMP_DIR_ENV_VAR = "SALES_DASHBOARD_TEMP_DIR"
+
+def data_files(data_dir=DATA_DIR):
+    return [os.path.join(data_dir, file_name) for file_name in TABLE_FILES.values()]
+
+
+def data_version(data_dir=DATA_DIR):
+    return result_cache.data_version(data_files(data_dir))
+
+
+def load_table(name, data_dir=DATA_DIR, compact=True):
+    """Read a source CSV, narrowed to the compact layout of compaction.py unless ``compact`` is false."""
+    table = pd.read_csv(os.path.join(data_dir, TABLE_FILES[name]))
+    return compaction.compact_table(name, table) if compact else table
+
+
+def load_tables(data_dir=DATA_DIR):
+    return {name: load_table(name, data_dir) for name in TABLE_FILES}
+
+
+def connect(tables):
+    """Create an in-memory DuckDB database holding ``tables``.
+
+    Tables are copied into DuckDB rather than registered as views so that
+    cursors opened from other threads can see them. The ingest-time
+    aggregates from materialize.py are built on top of them.
+    """
+    con = duckdb.connect()
+    for name, df in tables.items():
+        con.register('_source_df', df)
+        cluster_key = CLUSTER_KEYS.get(name)
+        order_by = f" ORDER BY {cluster_key}" if cluster_key else ""
+        con.execute(f"CREATE TABLE {name} AS SELECT {compaction.select_list(df)} FROM _source_df{order_by}")
+        con.unregister('_source_df')
+        if cluster_key:
+            con.execute(f"CREATE INDEX idx_{name}_{cluster_key} ON {name} ({cluster_key})")
+    materialize.build(con)
+    return con
+
+
+def fetch_column(con, query, params=None):
+    """The first column of ``query`` as a list of Python values, on a cursor of its own."""
+    cursor = con.cursor()
+    try:
+        return [row[0] for row in cursor.execute(query, params).fetchall()]
+    finally:
+        cursor.close()
+
+
+def connect_files(data_dir=DATA_DIR, memory_limit='1GB', temp_directory=None):
+    """Create a disk-backed DuckDB database from the CSVs in ``data_dir``.
+
+    Unlike connect(), no DataFrames are built: DuckDB scans the files
+    itself, keeps its buffer pool within ``memory_limit`` and spills sorts,
+    joins and aggregates that do not fit to a new directory under
+    ``temp_directory``. The directory also holds the database file, so
+    tables larger than memory stay on disk, and is removed at exit. Tables
+    are clustered as in connect() but not indexed, as ART indexes must fit
+    in memory.
+    """
+    if temp_directory:
+        os.makedirs(temp_directory, exist_ok=True)
+    # A directory per connection, so processes sharing temp_directory do not share a database
+    directory = tempfile.mkdtemp(prefix='sales-dashboard-', dir=temp_directory)
+    # Unlike atexit, this also runs when a process pool worker exits
+    multiprocessing.util.Finalize(None, shutil.rmtree, args=(directory, True), exitpriority=0)
+    con = duckdb.connect(os.path.join(directory, 'sales_dashboard.duckdb'), config={
+        'memory_limit': memory_limit,
+        'temp_directory': directory,
+    })
+    for name, file_name in TABLE_FILES.items():
+        path = os.path.join(data_dir, file_name).replace("'", "''")
+        types = ", ".join(f"'{column}': '{kind}'" for column, kind in compaction.read_csv_types(name).items())
+        options = f", types = {{{types}}}" if types else ""
+        cluster_key = CLUSTER_KEYS.get(name)
+        order_by = f" ORDER BY {cluster_key}" if cluster_key else ""
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM read_csv('{path}'{options}){order_by}")
+    materialize.build(con)
+    return con
+
+
+def open_database(data_dir=DATA_DIR):
+    """connect() to the CSVs in ``data_dir``, or connect_files() them when a memory limit is configured."""
+    memory_limit = os.environ.get(MEMORY_LIMIT_ENV_VAR)
+    if memory_limit:
+        return connect_files(data_dir, memory_limit, os.environ.get(TEMP_DIR_ENV_VAR))
+    return connect(load_tables(data_dir))
+
+
+def region_names(con):
+    return fetch_column(con, "SELECT name FROM region ORDER BY id")
+
+
+def data_months(con):
+    """Every month from the first to the last order or web event, as dates."""
+    return fetch_column(con, """
+    SELECT CAST(month AS DATE)
+    FROM range(
+        (SELECT date_trunc('month', MIN(CAST(occurred_at AS TIMESTAMP)))
+         FROM (SELECT occurred_at FROM orders UNION ALL SELECT occurred_at FROM web_events)),
+        (SELECT date_trunc('month', MAX(CAST(occurred_at AS TIMESTAMP)))
+         FROM (SELECT occurred_at FROM orders UNION ALL SELECT occurred_at FROM web_events))
+            + INTERVAL 1 MONTH,
+        INTERVAL 1 MONTH
+    ) t(month)
+    ORDER BY month
+    """)
+
+
+def execute(con, query, params=None):
+    # A cursor per call keeps concurrent Streamlit sessions off a shared connection
+    cursor = con.cursor()
+    try:
+        return cursor.execute(query, params).df()
+    finally:
+        cursor.close()
+
+
+def fetch_page(con, query, params=None, page=0, page_size=25):
+    """Return one page of ``query`` plus the total row count.
+
+    ``query`` must carry its own ORDER BY so pages are stable; only the
+    requested window of rows is materialized in pandas.
+    """
+    params = list(params or [])
+    total = execute(con, f"SELECT COUNT(*) AS n FROM ({query})", params)['n'].iloc[0]
+    rows = execute(con, f"{query} LIMIT ? OFFSET ?", params + [page_size, page * page_size])
+    return rows, int(total)
+
+
+def fetch_plot_data(con, plot_id, region_choice, cache=None, version=None, exact=False,
+                    date_range=None, filters=None, thresholds=None):
+    """Run a plot query, going through ``cache`` when one is given.
+
+    Plots with a materialized executor (see materialize.py) are answered from
+    it unless ``exact`` is set, which forces the plot's reference SQL.
+    ``date_range`` restricts the plot to an inclusive ``(start, end)`` pair of
+    months and ``filters`` to a crossfilter.CrossFilter selection;
+    ``thresholds`` overrides the plot's queries.PLOT_THRESHOLDS.
+    """
+    if filters:
+        region_choice, date_range = filters.scope(region_choice, date_range)
+    if filters and filters.account_dimensions():
+        query, params = crossfilter.apply(base_query(plot_id, region_choice, date_range, thresholds),
+                                          filters, date_range)
+    else:
+        query, params = plot_query(plot_id, region_choice, date_range, thresholds), None
+    executor = None if exact else materialize.executor_for(plot_id, filters)
+    if executor is None:
+        cache_tag, compute = query, lambda: execute(con, query, params)
+    else:
+        executor_tag, run = executor
+        if thresholds:
+            run = functools.partial(run, thresholds=thresholds)
+        cache_tag, compute = query + executor_tag, lambda: run(con, region_choice, date_range, filters)
+    if params:
+        cache_tag += repr(params)
+    if cache is None:
+        return compute()
+    key = result_cache.make_key(plot_id, region_choice, version, cache_tag)
+    return result_cache.cached_query(cache, key, compute)
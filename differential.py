@@ -0,0 +1,275 @@
+"""Differential check of the optimized plot paths against the reference SQL.
+
+Every plot's SQL in queries.py is the reference. For every plot, region and
+scenario (full range, a narrowed date range, each kind of cross-filter
+selection and non-default thresholds) the harness runs the reference with
+``exact=True`` and compares it with each optimized path:
+
+* ``materialized`` - the ingest-time executors of materialize.py
+* ``cached`` - a result served back from the result cache
+* ``incremental`` - the executors after the data was loaded in two parts,
+  the second through materialize.append_rows (with ``--incremental``)
+* ``source`` - pushdown to a SQL source (with ``--source``; see sources.py),
+  checked against the reference over the tables copied from it
+
+Results must match row for row, in any order, to a float tolerance; the
+columns answered from sketches must match to the sketch's error bound.
+``--scale`` runs the same checks on synthetic data made of that many
+jittered copies of the sample accounts with their orders and web events:
+
+    python differential.py
+    python differential.py --scale 10 --incremental --plots plot6 plot10
+    python differential.py --source sqlite:///sales.db
+
+A SQLite source is read with its database attached as ``sales``, so the
+date range CTEs name a schema DuckDB does not have, as PostgreSQL's
+``public`` is.
+
+The exit status is non-zero if any result differs.
+"""
+
+import argparse
+import datetime
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import compaction
+import datastore
+import materialize
+import quantiles
+import result_cache
+import sketches
+import sources
+from crossfilter import CrossFilter
+from queries import ALL_REGIONS, PLOT_IDS
+
+DEFAULT_RTOL = 1e-9
+
+# Columns answered from sketches, checked against their error bound instead
+APPROXIMATE_COLUMNS = {
+    'plot11': ('unique_accounts_impacted',),
+    'plot15': ('unique_accounts', 'total_customers'),
+    'plot23': ('p50', 'p90', 'p99'),
+}
+
+# Non-default thresholds each tunable plot is also checked with
+ALTERNATE_THRESHOLDS = {
+    'plot6': {'high_volume_orders': 30, 'moderate_volume_orders': 5, 'high_value_avg_usd': 2500},
+    'plot17': {'highly_active_rank': 5, 'moderately_active_rank': 20,
+               'high_spender_rank': 2, 'moderate_spender_rank': 15},
+    'plot18': {'high_activity_orders': 30, 'medium_activity_orders': 5},
+    'plot20': {'churn_window_days': 60},
+    'plot21': {'zoom_level': 3, 'max_points': 50},
+    'plot22': {'touch': 'first'},
+    'plot23': {'group_by': 'segment', 'high_activity_orders': 30, 'medium_activity_orders': 5},
+    'plot24': {'resolution': 'hour'},
+}
+
+
+def approximate_rtol(plot_id):
+    """Relative tolerance of the sketch-backed columns of ``plot_id``."""
+    if plot_id == 'plot23':
+        return quantiles.configured_relative_error()
+    # A distinct count estimate is within a few standard errors with near certainty
+    return 4 * sketches.HyperLogLog.for_error(sketches.configured_relative_error()).relative_error
+
+
+def synthetic_tables(tables, scale, seed=0):
+    """``scale`` copies of the sample accounts, each with its own jittered orders and web events.
+
+    Copies keep the sales reps, regions and channels; timestamps move by up
+    to two weeks and order amounts by up to 20%, so every copy aggregates
+    differently.
+    """
+    rng = np.random.default_rng(seed)
+    accounts, orders, web_events = tables['accounts'], tables['orders'], tables['web_events']
+    account_offset = 10 ** len(str(int(accounts['id'].max())))
+    copies = {'accounts': [], 'orders': [], 'web_events': []}
+    for copy in range(scale):
+        copied_accounts = accounts.copy()
+        copied_accounts['id'] += copy * account_offset
+        if copy:
+            copied_accounts['name'] = copied_accounts['name'] + f' #{copy}'
+            copied_accounts[['lat', 'long']] += rng.uniform(-0.5, 0.5, (len(accounts), 2))
+        copies['accounts'].append(copied_accounts)
+
+        for name, table in (('orders', orders), ('web_events', web_events)):
+            copied = table.copy()
+            copied['id'] += copy * (int(table['id'].max()) + 1)
+            copied['account_id'] += copy * account_offset
+            if copy:
+                shift = pd.to_timedelta(rng.integers(-14 * 86400, 14 * 86400, len(table)), unit='s')
+                copied['occurred_at'] = copied['occurred_at'] + shift
+            if name == 'orders' and copy:
+                factor = rng.uniform(0.8, 1.2, len(table))
+                for column in ('standard_amt_usd', 'gloss_amt_usd', 'poster_amt_usd'):
+                    copied[column] = (copied[column] * factor).round(2)
+                copied['total_amt_usd'] = (copied['standard_amt_usd'] + copied['gloss_amt_usd']
+                                           + copied['poster_amt_usd']).round(2)
+            copies[name].append(copied)
+    return {**tables, **{name: compaction.compact_table(name, pd.concat(parts, ignore_index=True))
+                         for name, parts in copies.items()}}
+
+
+def split_connection(tables, fraction=0.75):
+    """A connection loaded with the earliest ``fraction`` of the fact rows and appended the rest."""
+    head, tail = {}, {}
+    for name in ('orders', 'web_events'):
+        table = tables[name].sort_values('occurred_at', kind='stable')
+        split = int(len(table) * fraction)
+        head[name], tail[name] = table.iloc[:split], table.iloc[split:]
+    con = datastore.connect({**tables, **head})
+    for name, rows in tail.items():
+        materialize.append_rows(con, name, rows.reset_index(drop=True))
+    return con
+
+
+def scenarios(con, tables):
+    """``(label, fetch_plot_data keyword arguments)`` for every checked scenario."""
+    months = datastore.data_months(con)
+    rep = tables['sales_reps'].sort_values('id')['name'].iloc[0]
+    channel = tables['web_events']['channel'].mode().iloc[0]
+    yield 'default', {}
+    yield 'date range', {'date_range': (months[len(months) // 4], months[3 * len(months) // 4])}
+    yield 'month', {'filters': CrossFilter(month=months[len(months) // 2])}
+    yield 'sales rep', {'filters': CrossFilter(sales_rep=rep)}
+    yield 'channel', {'filters': CrossFilter(channel=channel)}
+    yield 'segment', {'filters': CrossFilter(segment='Medium Activity')}
+    yield 'thresholds', {}
+
+
+def _sort_key(frame, exclude):
+    key = pd.DataFrame(index=frame.index)
+    for column in frame.columns:
+        if column in exclude:
+            continue
+        values = frame[column]
+        if pd.api.types.is_float_dtype(values):
+            key[column] = values.round(6).astype(str)
+        else:
+            key[column] = values.astype(str)
+    return frame.iloc[np.lexsort([key[column].to_numpy() for column in reversed(key.columns)])] \
+        if len(key.columns) else frame
+
+
+def _is_temporal(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return True
+    sample = values.dropna()
+    return len(sample) > 0 and isinstance(sample.iloc[0], (datetime.date, pd.Timestamp))
+
+
+def compare(reference, result, rtol=DEFAULT_RTOL, approximate=(), approximate_rtol=0.0):
+    """``None`` if ``result`` matches ``reference`` in any row order, else what differs."""
+    if list(reference.columns) != list(result.columns):
+        return f"columns {list(result.columns)} != {list(reference.columns)}"
+    if len(reference) != len(result):
+        return f"{len(result)} rows != {len(reference)}"
+    reference = _sort_key(reference, approximate).reset_index(drop=True)
+    result = _sort_key(result, approximate).reset_index(drop=True)
+    for column in reference.columns:
+        expected, actual = reference[column], result[column]
+        if _is_temporal(expected) or _is_temporal(actual):
+            expected, actual = pd.to_datetime(expected), pd.to_datetime(actual)
+            same = (expected == actual) | (expected.isna() & actual.isna())
+        elif pd.api.types.is_numeric_dtype(expected) and pd.api.types.is_numeric_dtype(actual):
+            tolerance = approximate_rtol if column in approximate else rtol
+            same = np.isclose(actual.astype(float), expected.astype(float), rtol=tolerance, atol=1e-9,
+                              equal_nan=True)
+        else:
+            same = (expected.astype(object) == actual.astype(object)) | (expected.isna() & actual.isna())
+        if not np.all(same):
+            row = int(np.argmin(same))
+            return f"{column} row {row}: {actual.iloc[row]!r} != {expected.iloc[row]!r}"
+    return None
+
+
+def schema_source(url):
+    """SqlSource for ``url``; a SQLite database is attached as ``sales`` rather than opened as ``main``."""
+    source = sources.SqlSource(url)
+    if source.dialect == 'sqlite':
+        path = url[len('sqlite:///'):]
+
+        def connect():
+            # Unqualified names still resolve, as SQLite searches attached databases too
+            con = sqlite3.connect(':memory:', timeout=source.timeout, check_same_thread=False)
+            con.execute("ATTACH DATABASE ? AS sales", (path,))
+            return con
+
+        source.pool = sources.ConnectionPool(connect, source.pool.size, source.timeout)
+        source._schema = 'sales'
+    return source
+
+
+def run(tables, plot_ids=PLOT_IDS, incremental=False, rtol=DEFAULT_RTOL, source=None):
+    """Check every optimized path; returns ``(checks, failures)``."""
+    con = datastore.connect(tables)
+    paths = {
+        'materialized': lambda plot_id, region, kwargs: datastore.fetch_plot_data(con, plot_id, region, **kwargs),
+        'cached': lambda plot_id, region, kwargs: _cached(con, plot_id, region, kwargs),
+    }
+    if incremental:
+        split_con = split_connection(tables)
+        paths['incremental'] = lambda plot_id, region, kwargs: datastore.fetch_plot_data(
+            split_con, plot_id, region, **kwargs)
+    if source is not None:
+        paths['source'] = lambda plot_id, region, kwargs: source.fetch_plot_data(con, plot_id, region, **kwargs)
+    regions = [ALL_REGIONS] + datastore.region_names(con)
+    checks, failures = 0, []
+    for plot_id in plot_ids:
+        for label, kwargs in scenarios(con, tables):
+            if label == 'thresholds':
+                if plot_id not in ALTERNATE_THRESHOLDS:
+                    continue
+                kwargs = {'thresholds': ALTERNATE_THRESHOLDS[plot_id]}
+            for region in regions:
+                reference = datastore.fetch_plot_data(con, plot_id, region, exact=True, **kwargs)
+                for path, fetch in paths.items():
+                    checks += 1
+                    difference = compare(reference, fetch(plot_id, region, kwargs), rtol,
+                                         APPROXIMATE_COLUMNS.get(plot_id, ()), approximate_rtol(plot_id))
+                    if difference:
+                        failures.append({'plot_id': plot_id, 'region': region, 'scenario': label,
+                                         'path': path, 'difference': difference})
+    return checks, failures
+
+
+def _cached(con, plot_id, region, kwargs):
+    # The second call is served from the cache, after a round trip through its serialization
+    cache = result_cache.MemoryResultCache()
+    datastore.fetch_plot_data(con, plot_id, region, cache, 'differential', **kwargs)
+    return datastore.fetch_plot_data(con, plot_id, region, cache, 'differential', **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=datastore.DATA_DIR, help='Directory holding the source CSVs')
+    parser.add_argument('--scale', type=int, default=1, help='Copies of the sample data to check against')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic copies')
+    parser.add_argument('--plots', nargs='+', default=PLOT_IDS, help='Plot ids to check (default: all)')
+    parser.add_argument('--incremental', action='store_true', help='Also check executors after an append')
+    parser.add_argument('--rtol', type=float, default=DEFAULT_RTOL, help='Relative tolerance of exact columns')
+    parser.add_argument('--source', help='Also check pushdown to this SQL source, on its data')
+    args = parser.parse_args(argv)
+    if args.source and args.scale > 1:
+        parser.error("--source checks the data in the source; it cannot be combined with --scale")
+
+    source = schema_source(args.source) if args.source else None
+    tables = source.load_tables() if source else datastore.load_tables(args.data_dir)
+    if args.scale > 1:
+        tables = synthetic_tables(tables, args.scale, args.seed)
+    started = time.perf_counter()
+    checks, failures = run(tables, args.plots, args.incremental, args.rtol, source)
+    for failure in failures:
+        print(f"FAIL {failure['plot_id']} {failure['region']} [{failure['scenario']}] "
+              f"{failure['path']}: {failure['difference']}")
+    print(f"{checks - len(failures)}/{checks} checks passed in {time.perf_counter() - started:.1f}s "
+          f"({len(tables['orders'])} orders, {len(tables['web_events'])} web events)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
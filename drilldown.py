@@ -0,0 +1,72 @@
+"""Rep -> account -> orders / web events drill-down lookups.
+
+Every step is a parameterized point lookup on ``sales_rep_id`` or
+``account_id``; datastore.connect() clusters and indexes the tables on those
+keys, so a drill step only touches the matching rows whatever the table size.
+A rep's account list reads each account's order count and total from
+churn's ``account_recency``, one row per account maintained on ingest, as a
+join to the orders could not be pruned to the rep's scattered account ids.
+Results are paginated in DuckDB and only the visible page reaches pandas.
+"""
+
+from churn import RECENCY_TABLE
+from datastore import execute, fetch_page
+from queries import ALL_REGIONS
+
+PAGE_SIZE = 25
+
+
+def sales_reps(con, region_choice):
+    """Sales reps for ``region_choice`` as a DataFrame of id and name."""
+    if region_choice == ALL_REGIONS:
+        return execute(con, "SELECT id, name FROM sales_reps ORDER BY name")
+    return execute(con, """
+    SELECT sr.id, sr.name
+    FROM sales_reps sr
+    JOIN region r ON sr.region_id = r.id
+    WHERE r.name = ?
+    ORDER BY sr.name
+    """, [region_choice])
+
+
+def rep_accounts(con, sales_rep_id, page=0, page_size=PAGE_SIZE):
+    """One page of a rep's accounts with their order totals."""
+    query = f"""
+    SELECT a.id AS account_id,
+           a.name AS account_name,
+           a.primary_poc,
+           a.website,
+           COALESCE(rc.orders, 0) AS total_orders,
+           COALESCE(rc.total_amt_usd, 0) AS total_amt_usd
+    FROM accounts a
+    LEFT JOIN {RECENCY_TABLE} rc ON rc.account_id = a.id
+    WHERE a.sales_rep_id = ?
+    ORDER BY total_amt_usd DESC, a.id
+    """
+    return fetch_page(con, query, [sales_rep_id], page, page_size)
+
+
+def account_orders(con, account_id, page=0, page_size=PAGE_SIZE):
+    """One page of an account's orders, newest first."""
+    query = """
+    SELECT id, occurred_at, standard_qty, gloss_qty, poster_qty, total, total_amt_usd
+    FROM orders
+    WHERE account_id = ?
+    ORDER BY occurred_at DESC, id DESC
+    """
+    return fetch_page(con, query, [account_id], page, page_size)
+
+
+def account_web_events(con, account_id, page=0, page_size=PAGE_SIZE):
+    """One page of an account's web events, newest first."""
+    query = """
+    SELECT id, occurred_at, channel
+    FROM web_events
+    WHERE account_id = ?
+    ORDER BY occurred_at DESC, id DESC
+    """
+    return fetch_page(con, query, [account_id], page, page_size)
+
+
+def page_count(total, page_size=PAGE_SIZE):
+    return max(1, -(-total // page_size))
@@ -0,0 +1,119 @@
+"""Server-side filtering, sorting and pagination of the raw fact tables.
+
+Filters are compiled into a parameterized WHERE clause that DuckDB pushes
+down into the table scan, and each page is fetched with ORDER BY ... LIMIT
+... OFFSET, so only the visible window of rows ever reaches pandas.
+"""
+
+from datastore import fetch_page
+from queries import ALL_REGIONS
+
+PAGE_SIZE = 100
+
+# Explorable tables and the kind of filter offered for each column
+EXPLORER_TABLES = {
+    'orders': {
+        'id': 'number',
+        'account_id': 'number',
+        'occurred_at': 'timestamp',
+        'standard_qty': 'number',
+        'gloss_qty': 'number',
+        'poster_qty': 'number',
+        'total': 'number',
+        'standard_amt_usd': 'number',
+        'gloss_amt_usd': 'number',
+        'poster_amt_usd': 'number',
+        'total_amt_usd': 'number',
+    },
+    'web_events': {
+        'id': 'number',
+        'account_id': 'number',
+        'occurred_at': 'timestamp',
+        'channel': 'category',
+    },
+}
+
+
+def _check_column(table, column):
+    # Column names are interpolated into SQL, so only known columns are allowed
+    if column not in EXPLORER_TABLES[table]:
+        raise ValueError(f"Unknown column {column!r} for table {table!r}")
+
+
+def compile_filters(table, filters, region_choice=ALL_REGIONS):
+    """Compile ``filters`` into a WHERE clause and its parameters.
+
+    ``filters`` maps column names to a value:
+
+    * number and timestamp columns take a ``(low, high)`` pair, either end
+      of which may be ``None``;
+    * category columns take a list of allowed values;
+    * any other value is matched as a case-insensitive substring.
+    """
+    if table not in EXPLORER_TABLES:
+        raise ValueError(f"Unknown table: {table!r}")
+    clauses, params = [], []
+    for column, value in filters.items():
+        _check_column(table, column)
+        kind = EXPLORER_TABLES[table][column]
+        if kind in ('number', 'timestamp') and isinstance(value, (tuple, list)):
+            low, high = value
+            # Timestamp bounds may come as text, which DuckDB does not compare with a TIMESTAMP
+            placeholder = "CAST(? AS TIMESTAMP)" if kind == 'timestamp' else "?"
+            if low is not None:
+                clauses.append(f"{column} >= {placeholder}")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{column} <= {placeholder}")
+                params.append(high)
+        elif kind == 'category':
+            if value:
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+        elif value not in (None, ''):
+            clauses.append(f"CAST({column} AS VARCHAR) ILIKE ?")
+            params.append(f"%{value}%")
+    if region_choice != ALL_REGIONS:
+        clauses.append("""account_id IN (
+            SELECT a.id
+            FROM accounts a
+            JOIN sales_reps sr ON a.sales_rep_id = sr.id
+            JOIN region r ON sr.region_id = r.id
+            WHERE r.name = ?
+        )""")
+        params.append(region_choice)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def fetch_rows(con, table, filters=None, region_choice=ALL_REGIONS, sort_column='id',
+               descending=False, page=0, page_size=PAGE_SIZE):
+    """Return one page of ``table`` after filtering and sorting, plus the total count."""
+    where, params = compile_filters(table, filters or {}, region_choice)
+    _check_column(table, sort_column)
+    direction = 'DESC' if descending else 'ASC'
+    # id breaks ties so every page boundary is stable
+    order_by = f"{sort_column} {direction}" + (f", id {direction}" if sort_column != 'id' else "")
+    query = f"SELECT * FROM {table} {where} ORDER BY {order_by}"
+    return fetch_page(con, query, params, page, page_size)
+
+
+def column_range(con, table, column):
+    """Min and max of ``column``, used to seed the filter widgets."""
+    _check_column(table, column)
+    cursor = con.cursor()
+    try:
+        return cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}").fetchone()
+    finally:
+        cursor.close()
+
+
+def category_values(con, table, column):
+    _check_column(table, column)
+    cursor = con.cursor()
+    try:
+        return [row[0] for row in cursor.execute(
+            f"SELECT DISTINCT {column} FROM {table} ORDER BY {column}"
+        ).fetchall()]
+    finally:
+        cursor.close()
@@ -0,0 +1,148 @@
+"""Streaming export of dashboard datasets to XLSX and CSV.
+
+Rows are pulled from DuckDB in Arrow record batches and written straight to
+the output file, so exporting a region's full order history never builds a
+pandas DataFrame. CSV goes through DuckDB's own ``COPY``; XLSX uses
+XlsxWriter in constant-memory mode, which flushes each row as it is written.
+
+Exports are restricted like the charts: to the date range, the cross-filter
+selection and, for a plot, its thresholds, so a plot's export holds the data
+behind the chart as it is shown.
+"""
+
+import datetime
+import decimal
+import math
+
+import crossfilter
+from queries import ALL_REGIONS, PLOT_IDS, PLOT_TITLES, base_query, with_date_range
+
+FORMATS = ('xlsx', 'csv')
+BATCH_SIZE = 10_000
+# Excel's row limit, minus the header row
+XLSX_MAX_ROWS = 1_048_575
+
+MIME_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+}
+
+# Fact tables reach their region through the account's sales rep
+FACT_TABLES = {
+    'orders': 'Orders (full history)',
+    'web_events': 'Web events (full history)',
+}
+
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def fact_table_query(table, region_choice):
+    if table not in FACT_TABLES:
+        raise ValueError(f"Unknown fact table: {table!r}")
+    if region_choice == ALL_REGIONS:
+        return f"SELECT * FROM {table} ORDER BY id"
+    return f"""
+    SELECT f.*
+    FROM {table} f
+    JOIN accounts a ON f.account_id = a.id
+    JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    JOIN region r ON sr.region_id = r.id
+    WHERE r.name = {sql_literal(region_choice)}
+    ORDER BY f.id
+    """
+
+
+def datasets():
+    """Exportable datasets as an ordered {dataset id: label} mapping."""
+    options = {plot_id: f"{plot_id}: {PLOT_TITLES[plot_id]}" for plot_id in PLOT_IDS}
+    options.update(FACT_TABLES)
+    return options
+
+
+def dataset_query(dataset, region_choice, date_range=None, filters=None, thresholds=None):
+    """``(query, params)`` of ``dataset``, restricted as datastore.fetch_plot_data restricts a plot."""
+    if filters:
+        region_choice, date_range = filters.scope(region_choice, date_range)
+    if dataset in FACT_TABLES:
+        query = fact_table_query(dataset, region_choice)
+    else:
+        query = base_query(dataset, region_choice, date_range, thresholds)
+    if filters and filters.account_dimensions():
+        return crossfilter.apply(query, filters, date_range)
+    return (query if date_range is None else with_date_range(query, date_range)), None
+
+
+def export_csv(con, query, path, params=None):
+    """Write the result of ``query`` to ``path`` as CSV and return the row count."""
+    cursor = con.cursor()
+    try:
+        query = query.strip().rstrip(';')
+        escaped_path = path.replace("'", "''")
+        return cursor.execute(f"COPY ({query}) TO '{escaped_path}' (HEADER, DELIMITER ',')", params).fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def _write_cell(sheet, row, col, value, date_format):
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        sheet.write_blank(row, col, None)
+    elif isinstance(value, bool):
+        sheet.write_boolean(row, col, value)
+    elif isinstance(value, (int, float)):
+        sheet.write_number(row, col, value)
+    elif isinstance(value, decimal.Decimal):
+        sheet.write_number(row, col, float(value))
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        sheet.write_datetime(row, col, value, date_format)
+    else:
+        sheet.write_string(row, col, str(value))
+
+
+def export_xlsx(con, query, path, sheet_name='data', batch_size=BATCH_SIZE, params=None):
+    """Write the result of ``query`` to ``path`` as XLSX and return the row count.
+
+    Results longer than Excel's row limit continue on numbered sheets.
+    """
+    import xlsxwriter
+
+    cursor = con.cursor()
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True})
+    try:
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        header_format = workbook.add_format({'bold': True})
+        reader = cursor.execute(query, params).fetch_record_batch(batch_size)
+        columns = reader.schema.names
+        sheet, sheet_row, sheet_count, total_rows = None, 0, 0, 0
+        for batch in reader:
+            for row_values in zip(*(column.to_pylist() for column in batch.columns)):
+                if sheet is None or sheet_row > XLSX_MAX_ROWS:
+                    sheet_count += 1
+                    name = sheet_name if sheet_count == 1 else f"{sheet_name}_{sheet_count}"
+                    sheet = workbook.add_worksheet(name[:31])
+                    sheet.write_row(0, 0, columns, header_format)
+                    sheet_row = 1
+                for col, value in enumerate(row_values):
+                    _write_cell(sheet, sheet_row, col, value, date_format)
+                sheet_row += 1
+                total_rows += 1
+        if sheet is None:
+            workbook.add_worksheet(sheet_name[:31]).write_row(0, 0, columns, header_format)
+    finally:
+        workbook.close()
+        cursor.close()
+    return total_rows
+
+
+def export_dataset(con, dataset, region_choice, fmt, path, date_range=None, filters=None, thresholds=None):
+    """Export ``dataset`` for ``region_choice`` to ``path`` and return the row count.
+
+    ``date_range``, ``filters`` and ``thresholds`` are those of datastore.fetch_plot_data.
+    """
+    query, params = dataset_query(dataset, region_choice, date_range, filters, thresholds)
+    if fmt == 'csv':
+        return export_csv(con, query, path, params)
+    if fmt == 'xlsx':
+        return export_xlsx(con, query, path, sheet_name=dataset, params=params)
+    raise ValueError(f"Unsupported export format: {fmt!r}")
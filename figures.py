@@ -0,0 +1,917 @@
+"""Plotly figure builders for the dashboard plots.
+
+Each ``plotN_figure`` turns the result of ``queries.plotN_query`` into the
+figure shown on the dashboard, without touching Streamlit. Plotly Express
+adds a noticeable share of a cold start, so the few builders using it import
+it when they are first called.
+
+The styling every figure shares - transparent backgrounds, white text, font
+sizes, grid lines and the colour sequence - lives in the ``sales_dashboard``
+template registered here, which ``build_figure`` applies; builders set only
+what sets their figure apart. The template is small next to the Streamlit
+theme's, so the figures sent to the page are too, and the dashboard draws
+them with ``theme=None`` so the Streamlit theme does not override it.
+"""
+
+from datetime import timedelta
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+TEMPLATE = 'sales_dashboard'
+
+# The page background in .streamlit/config.toml, for figures shown outside the dashboard
+BACKGROUND = '#000000'
+
+_AXIS = dict(title=dict(font=dict(size=14)), tickfont=dict(size=12), gridcolor='rgba(255, 255, 255, 0.1)')
+_COLORBAR = dict(tickfont=dict(size=12))
+
+pio.templates[TEMPLATE] = go.layout.Template(
+    layout=dict(
+        font=dict(size=14, color='white'),
+        title=dict(font=dict(size=18)),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        # Streamlit's categorical palette for dark themes
+        colorway=['#83c9ff', '#0068c9', '#ffabab', '#ff2b2b', '#7defa1',
+                  '#29b09d', '#ffd16a', '#ff8700', '#6d3fc0', '#d5dae5'],
+        xaxis=dict(_AXIS, zerolinecolor='rgba(255, 255, 255, 0.2)'),
+        yaxis=dict(_AXIS, zerolinecolor='rgba(255, 255, 255, 0.2)'),
+        polar=dict(bgcolor='rgba(0,0,0,0)', angularaxis=dict(tickfont=dict(size=12)), radialaxis=_AXIS),
+        coloraxis=dict(colorbar=_COLORBAR),
+    ),
+    data=dict(
+        bar=[go.Bar(marker=dict(colorbar=_COLORBAR))],
+        barpolar=[go.Barpolar(marker=dict(colorbar=_COLORBAR))],
+        heatmap=[go.Heatmap(colorbar=_COLORBAR)],
+        scattergeo=[go.Scattergeo(marker=dict(colorbar=_COLORBAR))],
+    ),
+)
+
+
+def plot1_figure(region_sales_data, region_choice):
+    # Total sales for the selected region or sum for all regions
+    if region_choice == "All Regions":
+        total_sales = region_sales_data["total_sales"].sum().round()  # Sum all regions for "All Regions"
+    else:
+        total_sales = region_sales_data["total_sales"].iloc[0].round()  # Get sales for the selected region
+
+    # Create an indicator chart
+    fig1 = go.Figure()
+
+    fig1.add_trace(go.Indicator(
+        mode="number",
+        value=total_sales,
+        title={"text": f"Total Sales Amount - {region_choice}"},
+        number={'prefix': "$", 'valueformat': ".f"},
+        domain={'x': [0, 1], 'y': [0, 1]}  # Full-width domain
+    ))
+
+    # Larger, green text for the single number
+    fig1.update_layout(
+        font=dict(size=24, color="darkgreen")
+    )
+    return fig1
+
+
+def plot2_figure(region_data, region_choice):
+    import plotly.express as px
+
+    grouped_data = region_data.groupby('Rep_name').size().reset_index(name='Account_Count')
+
+    fig2 = px.bar(
+        grouped_data,
+        template=TEMPLATE,
+        x='Rep_name',
+        y='Account_Count',
+        title=f"{region_choice}: Accounts by Sales Rep",
+        labels={'Rep_name': 'Sales Representative', 'Account_Count': 'Number of Accounts'},
+        text='Account_Count',
+        color='Account_Count',
+        color_continuous_scale='Blues'
+    )
+    fig2.update_traces(textposition='outside')
+    fig2.update_layout(
+        xaxis_title="Sales Representative",
+        yaxis_title="Number of Accounts",
+    )
+    return fig2
+
+
+def plot3_figure(web_event_data, region_choice):
+    pivot_data = web_event_data.pivot(index='sales_rep_name', columns='channel', values='number_of_occurrences').fillna(0)
+
+    fig3 = go.Figure()
+    for channel in pivot_data.columns:
+        fig3.add_trace(go.Bar(
+            x=pivot_data.index,
+            y=pivot_data[channel],
+            name=channel
+        ))
+
+    fig3.update_layout(
+        title=f"{region_choice}: Web Event Occurrences by Sales Representative and Channel",
+        xaxis_title="Sales Representative",
+        yaxis_title="Number of Occurrences",
+        barmode='stack',
+        xaxis_tickangle=-45,
+        legend_title_text='Channel'
+    )
+    return fig3
+
+
+def plot4_figure(acquisition_data, region_choice):
+    fig4 = go.Figure()
+
+    for i, rep in enumerate(acquisition_data['sales_representative'].unique()):
+        rep_data = acquisition_data[acquisition_data['sales_representative'] == rep]
+
+        fig4.add_trace(go.Scatter(
+            x=rep_data['first_order_year'],
+            y=rep_data['new_customers_acquired'],
+            mode='markers',
+            name=rep,
+            marker=dict(
+                size=12,
+                color=f'rgba({(i * 50) % 255}, {(i * 80) % 255}, {(i * 100) % 255}, 0.8)',
+                line=dict(width=1.5, color='black')
+            ),
+            hovertemplate=(
+                f"<b>Sales Rep:</b> {rep}<br>"
+                "<b>Year of First Order:</b> %{x}<br>"
+                "<b>New Customers Acquired:</b> %{y}<extra></extra>"
+            )
+        ))
+
+    fig4.update_layout(
+        title=f"Customer Acquisition Analysis by Sales Rep ({region_choice})",
+        xaxis_title="Year of First Order",
+        yaxis_title="New Customers Acquired",
+        xaxis=dict(tickmode='linear', dtick=1),
+        showlegend=True
+    )
+    return fig4
+
+
+def plot5_figure(avg_order_data, region_choice):
+    fig5 = go.Figure()
+
+    fig5.add_trace(go.Bar(
+        x=avg_order_data['avg_order_size'],
+        y=avg_order_data['region_name'],
+        orientation='h',
+        marker=dict(
+            color=avg_order_data['avg_order_size'],
+            colorscale='blues',
+            showscale=True,
+            colorbar=dict(title='Avg Order Size (USD)')
+        ),
+        text=avg_order_data['avg_order_size'].apply(lambda x: f"${x:,.2f}"),
+        textposition='inside',
+        insidetextanchor='middle'
+    ))
+
+    fig5.update_layout(
+        title="Average Order Size Comparison Across Regions",
+        xaxis_title="Average Order Size (USD)",
+        yaxis=dict(title="Region", automargin=True),
+        bargap=0.2
+    )
+    return fig5
+
+
+def plot6_figure(avg_order_size_data, region_choice):
+    fig6 = go.Figure()
+
+    fig6.add_trace(go.Bar(
+        x=avg_order_size_data['order_volume_segment'] + " - " + avg_order_size_data['order_value_segment'],
+        y=avg_order_size_data['avg_order_size_usd'],
+        name='Avg Order Size (USD)',
+        marker=dict(color='rgb(53, 151, 255)'),
+    ))
+
+    fig6.add_trace(go.Bar(
+        x=avg_order_size_data['order_volume_segment'] + " - " + avg_order_size_data['order_value_segment'],
+        y=avg_order_size_data['num_accounts'],
+        name='Number of Accounts',
+        marker=dict(color='rgb(255, 130, 50)'),
+    ))
+
+    fig6.add_trace(go.Bar(
+        x=avg_order_size_data['order_volume_segment'] + " - " + avg_order_size_data['order_value_segment'],
+        y=avg_order_size_data['total_sales_in_segment'],
+        name='Total Sales (USD)',
+        marker=dict(color='rgb(255, 99, 132)'),
+    ))
+
+    fig6.add_trace(go.Bar(
+        x=avg_order_size_data['order_volume_segment'] + " - " + avg_order_size_data['order_value_segment'],
+        y=avg_order_size_data['avg_order_std_dev_usd'],
+        name='Order Std. Dev. (USD)',
+        marker=dict(color='rgb(75, 192, 192)'),
+    ))
+
+    fig6.update_layout(
+        barmode='group',
+        title=f"Analysis of Order Size, Number of Accounts, and Total Sales by Segment ({region_choice})",
+        xaxis_title="Customer Segment",
+        yaxis_title="Values (USD / Accounts)",
+        legend_title="Metrics",
+    )
+
+    # Create three columns
+    return fig6
+
+
+def plot7_figure(region_data, region_choice):
+    import plotly.express as px
+
+    region_data_sorted = region_data[['account_name', 'unit_price']]
+
+    fig7 = px.bar(
+        region_data_sorted,
+        template=TEMPLATE,
+        x='account_name',
+        y='unit_price',
+        title=f"{region_choice}: Unit Price for Orders with Quantity Conditions",
+        labels={'account_name': 'Account Name', 'unit_price': 'Unit Price (USD)'},
+        color='unit_price',
+        color_continuous_scale='Viridis'
+    )
+    fig7.update_traces(textposition='outside')
+    fig7.update_layout(
+        xaxis_title="Account Name",
+        yaxis_title="Unit Price (USD)",
+        xaxis_tickangle=-45
+    )
+    return fig7
+
+
+def plot8_figure(yearly_order_data, region_choice):
+    fig8 = go.Figure()
+
+    fig8.add_trace(go.Scatter(
+        x=yearly_order_data['year'],
+        y=yearly_order_data['total_usd'],
+        mode='lines+markers',
+        fill='tozeroy',
+        line=dict(color='mediumslateblue', width=3),
+        marker=dict(color='darkorange', size=8, symbol='diamond'),
+        name='Total USD'
+    ))
+
+    fig8.update_layout(
+        title=f"Total USD Amount of Orders by Year ({region_choice})",
+        xaxis_title="Year",
+        yaxis_title="Total USD Amount (in millions)",
+        xaxis_tickangle=-45,
+        showlegend=True
+    )
+
+    min_value = yearly_order_data.loc[yearly_order_data['total_usd'].idxmin()]
+    max_value = yearly_order_data.loc[yearly_order_data['total_usd'].idxmax()]
+    fig8.add_annotation(x=min_value['year'], y=min_value['total_usd'],
+                        text=f"Lowest: ${min_value['total_usd']:.2f}",
+                        showarrow=True, arrowhead=2, ax=-40, ay=-40, bgcolor="blue")
+    fig8.add_annotation(x=max_value['year'], y=max_value['total_usd'],
+                        text=f"Highest: ${max_value['total_usd']:.2f}",
+                        showarrow=True, arrowhead=2, ax=40, ay=-40, bgcolor="green")
+    return fig8
+
+
+def plot9_figure(clv_data, region_choice):
+    import plotly.express as px
+
+    clv_data['average_order_amount'] = clv_data['average_order_amount'].fillna(1)
+
+    fig9 = px.scatter(
+        clv_data,
+        template=TEMPLATE,
+        x="total_orders",
+        y="total_spent",
+        size="average_order_amount",
+        color="total_spent",
+        hover_data=["account_name"],
+        labels={
+            "total_orders": "Total Orders",
+            "total_spent": "Total Spent (USD)",
+            "average_order_amount": "Avg Order Amount (USD)"
+        },
+        title=f"Customer Lifetime Value Analysis - {region_choice}",
+        color_continuous_scale="Viridis"
+    )
+
+    fig9.update_layout(
+        xaxis_title="Total Orders",
+        yaxis_title="Total Spent (USD)",
+        xaxis_tickangle=-45
+    )
+    return fig9
+
+
+def plot10_figure(churn_data, region_choice):
+    active_customers = churn_data['active_customers'][0]
+    churned_customers = churn_data['churned_customers'][0]
+
+    fig10 = go.Figure()
+
+    fig10.add_trace(go.Bar(
+        x=[active_customers],
+        y=['Active Customers'],
+        orientation='h',
+        name='Active Customers',
+        marker=dict(color='green', line=dict(color='darkgreen', width=1.5)),
+        hovertemplate="Active Customers: %{x}<extra></extra>"
+    ))
+
+    fig10.add_trace(go.Bar(
+        x=[churned_customers],
+        y=['Churned Customers'],
+        orientation='h',
+        name='Churned Customers',
+        marker=dict(color='red', line=dict(color='darkred', width=1.5)),
+        hovertemplate="Churned Customers: %{x}<extra></extra>"
+    ))
+
+    fig10.update_layout(
+        title=f"Customer Churn Analysis ({region_choice})",
+        xaxis_title="Number of Customers",
+        yaxis_title="Customer Status",
+        barmode='stack',
+        showlegend=True
+    )
+    return fig10
+
+
+def plot11_figure(web_event_data, region_choice):
+    fig11 = go.Figure()
+    channels = web_event_data['channel'].unique()
+    channel_colors = {
+        'direct': 'rgba(255, 99, 132, 0.6)',
+        'facebook': 'rgba(54, 162, 235, 0.6)',
+        'organic': 'rgba(75, 192, 192, 0.6)',
+        'adwords': 'rgba(153, 102, 255, 0.6)',
+        'twitter': 'rgba(255, 159, 64, 0.6)',
+        'banner': 'rgba(255, 205, 86, 0.6)'
+    }
+
+    for channel in channels:
+        channel_data = web_event_data[web_event_data['channel'] == channel]
+        fig11.add_trace(go.Bar(
+            x=channel_data['region_name'],
+            y=channel_data['total_events'],
+            name=f'Channel: {channel}',
+            text=channel_data['unique_accounts_impacted'].apply(lambda x: f"Unique Accounts: {x}"),
+            textposition='inside',
+            hoverinfo='x+text+y',
+            marker=dict(
+                color=channel_colors[channel],  # Use the predefined color for each channel
+                line=dict(color='white', width=1),  # White outline for better visibility
+            )
+        ))
+
+    # Update layout for better visualization
+    fig11.update_layout(
+        title="Web Event Effectiveness by Region and Channel",
+        xaxis=dict(
+            title="Region",
+            tickangle=45,  # Rotate x-axis labels for better readability
+        ),
+        yaxis_title="Total Events",
+        barmode='stack',  # Stack bars to combine events of each channel per region
+        legend=dict(
+            title="Channels",
+            orientation="v",  # Vertical orientation for the legend
+            x=1.05,  # Position legend to the right
+            y=0.5,  # Center the legend vertically
+            xanchor="left",
+            yanchor="middle",
+            traceorder='normal',  # Order items in the legend
+            font=dict(size=12),
+            bordercolor='white',  # White border around the legend
+            borderwidth=1
+        ),
+        showlegend=True
+    )
+    return fig11
+
+
+def plot12_figure(sales_contribution_data, region_choice):
+    import plotly.express as px
+
+    # Create the bar chart
+    fig12 = px.bar(
+        sales_contribution_data,
+        template=TEMPLATE,
+        x='sales_representative',
+        y='contribution_percent_of_region',
+        color='sales_representative',
+        text='sales_representative',
+        title=f"Sales Contribution by Sales Rep and Region ({region_choice})",
+        labels={
+            'sales_representative': 'Sales Representative',
+            'contribution_percent_of_region': 'Contribution (%)'
+        },
+        hover_data=['num_orders', 'total_amt_usd'],  # Show additional data on hover
+    )
+
+    # Update layout for the bar chart
+    fig12.update_layout(
+        xaxis_title='Sales Representative',
+        yaxis_title='Contribution Percentage (%)',
+        title_font=dict(size=16),
+        showlegend=False  # Hide legend for clarity
+    )
+
+    # Display the plot in col2
+    return fig12
+
+
+def plot13_figure(year_month_data, region_choice):
+    # Prepare data for visualization
+    year_month_data['month'] = year_month_data['month'].apply(lambda x: f"{x:02d}")  # Format month as two digits
+    year_month_data['year_month'] = year_month_data['year'].astype(str) + "-" + year_month_data['month']
+
+    # Ensure that the x-axis is ordered correctly
+    year_month_data = year_month_data.sort_values(by=['year', 'month'])
+
+    # Create a figure
+    fig13 = go.Figure()
+
+    # Add Line Plot for Total USD
+    fig13.add_trace(go.Scatter(
+        x=year_month_data['year_month'],
+        y=year_month_data['total_usd'],
+        mode='lines+markers',
+        name='Total USD',
+        line=dict(color='rgb(53, 151, 255)', width=2),
+        marker=dict(color='rgb(53, 151, 255)', size=8)
+    ))
+
+    # Add Line Plot for Average Order Amount
+    fig13.add_trace(go.Scatter(
+        x=year_month_data['year_month'],
+        y=year_month_data['avg_order_amt'],
+        mode='lines+markers',
+        name='Average Order Amount (USD)',
+        line=dict(color='rgb(255, 130, 50)', width=2),
+        marker=dict(color='rgb(255, 130, 50)', size=8)
+    ))
+
+    # Add Line Plot for Total Orders
+    fig13.add_trace(go.Scatter(
+        x=year_month_data['year_month'],
+        y=year_month_data['total_orders'],
+        mode='lines+markers',
+        name='Total Orders',
+        line=dict(color='rgb(255, 99, 132)', width=2),
+        marker=dict(color='rgb(255, 99, 132)', size=8)
+    ))
+
+    # Add Line Plot for Max Order Amount
+    fig13.add_trace(go.Scatter(
+        x=year_month_data['year_month'],
+        y=year_month_data['max_order_amt'],
+        mode='lines+markers',
+        name='Max Order Amount (USD)',
+        line=dict(color='rgb(54, 162, 235)', width=2),
+        marker=dict(color='rgb(54, 162, 235)', size=8)
+    ))
+
+    # Update layout for better visualization
+    fig13.update_layout(
+        title=f"Order Trends by Year and Month ({region_choice})",
+        xaxis_title="Year-Month",
+        yaxis_title="Amount / Number of Orders",
+        xaxis_tickangle=-45,
+        showlegend=True
+    )
+    return fig13
+
+
+def plot14_figure(avg_order_data, region_choice):
+    # Prepare data for visualization
+    fig14 = go.Figure()
+
+    # Add traces for each type of order amount
+    fig14.add_trace(go.Scatter(
+        x=avg_order_data['account_name'],
+        y=avg_order_data['avg_standard_amt_usd'],
+        mode='lines+markers',
+        name='Avg Standard Amt (USD)',
+        line=dict(color='royalblue'),
+        marker=dict(symbol='circle')
+    ))
+
+    fig14.add_trace(go.Scatter(
+        x=avg_order_data['account_name'],
+        y=avg_order_data['avg_gloss_amt_usd'],
+        mode='lines+markers',
+        name='Avg Gloss Amt (USD)',
+        line=dict(color='green'),
+        marker=dict(symbol='square')
+    ))
+
+    fig14.add_trace(go.Scatter(
+        x=avg_order_data['account_name'],
+        y=avg_order_data['avg_poster_amt_usd'],
+        mode='lines+markers',
+        name='Avg Poster Amt (USD)',
+        line=dict(color='orange'),
+        marker=dict(symbol='diamond')
+    ))
+
+    # Update the layout for better visualization
+    fig14.update_layout(
+        title=f"{region_choice}: Average Order Amounts by Account Name",
+        xaxis_title="Account Name",
+        yaxis_title="Average Order Amount (USD)",
+        xaxis_tickangle=-45,  # Rotate x-axis labels for better readability
+        showlegend=True
+    )
+    return fig14
+
+
+def plot15_figure(channel_data, region_choice):
+    # Create a bar chart for Channel Effectiveness Analysis
+    fig15 = go.Figure()
+
+    # Add bars for total events
+    fig15.add_trace(go.Bar(
+        x=channel_data['channel'],
+        y=channel_data['total_events'],
+        name='Total Events',
+        marker_color='indianred'
+    ))
+
+    # Add bars for unique accounts
+    fig15.add_trace(go.Bar(
+        x=channel_data['channel'],
+        y=channel_data['unique_accounts'],
+        name='Unique Accounts',
+        marker_color='lightskyblue'
+    ))
+
+    # Add bars for total customers
+    fig15.add_trace(go.Bar(
+        x=channel_data['channel'],
+        y=channel_data['total_customers'],
+        name='Total Customers',
+        marker_color='lightgreen'
+    ))
+
+    # Update layout for better visualization
+    fig15.update_layout(
+        title=f"Channel Effectiveness Analysis - {region_choice}",
+        xaxis_title="Channel",
+        yaxis_title="Count",
+        barmode='group',  # Group bars side-by-side
+        legend=dict(title="Metrics", orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+        xaxis_tickangle=-45  # Rotate x-axis labels
+    )
+    return fig15
+
+
+def plot16_figure(seasonal_data, region_choice):
+    # Map months to names
+    month_names = [
+        'January', 'February', 'March', 'April', 'May', 'June',
+        'July', 'August', 'September', 'October', 'November', 'December'
+    ]
+    seasonal_data['month_name'] = seasonal_data['month'].apply(lambda x: month_names[int(x) - 1])
+
+    # Create a polar bar chart for seasonal trends
+    fig16 = go.Figure()
+
+    fig16.add_trace(go.Barpolar(
+        r=seasonal_data['total_sales'],
+        theta=seasonal_data['month_name'],
+        width=[30] * len(seasonal_data),  # Bar width
+        marker=dict(
+            color=seasonal_data['total_sales'],
+            colorscale='viridis',  # Gradient color scheme with good contrast
+            showscale=True,
+            colorbar=dict(title='Total Sales (USD)')
+        ),
+        name='Seasonal Sales'
+    ))
+
+    # Update layout for better readability
+    fig16.update_layout(
+        title=f"Seasonal Sales Trends ({region_choice})",
+        polar=dict(
+            angularaxis=dict(
+                direction='clockwise',
+                tickmode='array',
+                tickvals=list(range(1, 13)),
+                ticktext=month_names
+            ),
+            radialaxis=dict(visible=True, title="Total Sales (USD)")
+        ),
+    )
+    return fig16
+
+
+def plot17_figure(customer_segmentation_data, region_choice):
+    # Create a scatter plot for customer segmentation
+    fig17 = go.Figure()
+
+    # Add a scatter plot for customer segments
+    fig17.add_trace(go.Scatter(
+        x=customer_segmentation_data['total_orders'],
+        y=customer_segmentation_data['total_spend'],
+        mode='markers',
+        text=customer_segmentation_data['account_name'],
+        hoverinfo='text+x+y',  # Show account name, orders, and spend on hover
+        marker=dict(
+            size=12,
+            color=customer_segmentation_data['order_activity_segment'].apply(
+                lambda x: {'Highly Active': 'rgba(54, 162, 235, 0.6)', 
+                            'Moderately Active': 'rgba(255, 159, 64, 0.6)', 
+                            'Less Active': 'rgba(255, 99, 132, 0.6)'}[x]
+            ),
+            line=dict(color='black', width=1)  # Black outline for better visibility
+        ),
+        name="Customer Segmentation"
+    ))
+
+    # Update layout for the scatter plot
+    fig17.update_layout(
+        title=f"Customer Segmentation by Purchase Frequency and Total Spend ({region_choice})",
+        xaxis_title="Total Orders",
+        yaxis_title="Total Spend (USD)",
+        showlegend=False  # Hide legend for clarity
+    )
+    return fig17
+
+
+def plot18_figure(activity_sales_data, region_choice):
+    # Create a plot with colors corresponding to different regions
+    fig18 = go.Figure()
+
+    # Define colors for each region
+    region_colors = {
+        'North': 'rgba(54, 162, 235, 0.6)',   # Blue
+        'South': 'rgba(255, 159, 64, 0.6)',   # Orange
+        'East': 'rgba(75, 192, 192, 0.6)',    # Green
+        'West': 'rgba(153, 102, 255, 0.6)',   # Purple
+        'Central': 'rgba(255, 99, 132, 0.6)', # Red
+    }
+
+    # Add traces for each region in the selected data
+    for region in activity_sales_data['region_name'].unique():
+        region_data = activity_sales_data[activity_sales_data['region_name'] == region]
+
+        fig18.add_trace(go.Bar(
+            x=region_data['activity_segment'],
+            y=region_data['avg_sales'],
+            name=region,
+            marker=dict(color=region_colors.get(region, 'rgba(169, 169, 169, 0.6)')),  # Default color if region is not listed
+            text=region_data['activity_segment'],
+            hoverinfo='text+y',  # Show activity segment and avg sales
+        ))
+
+    # Update layout for the bar chart
+    fig18.update_layout(
+        title=f"Average Sales by Account Activity Segment ({region_choice})",
+        xaxis=dict(title="Account Activity Segment"),
+        yaxis=dict(title="Average Sales (USD)"),
+        barmode='stack',  # Stack bars for each region
+    )
+    return fig18
+
+
+def plot19_figure(cohort_data, region_choice):
+    # Pivot to one row per cohort and one column per month since first order
+    cohort_data['cohort'] = cohort_data['cohort_month'].dt.strftime('%Y-%m')
+    retention = cohort_data.pivot(index='cohort', columns='months_since_first_order', values='retention')
+    revenue = cohort_data.pivot(index='cohort', columns='months_since_first_order', values='revenue')
+
+    fig19 = go.Figure()
+
+    fig19.add_trace(go.Heatmap(
+        z=retention.values * 100,
+        x=retention.columns,
+        y=retention.index,
+        customdata=revenue.values,
+        colorscale='Viridis',
+        colorbar=dict(title='Retention (%)'),
+        hovertemplate='Cohort %{y}<br>Month %{x}<br>Retention %{z:.1f}%<br>Revenue $%{customdata:,.0f}<extra></extra>'
+    ))
+
+    fig19.update_layout(
+        title=f"Cohort Retention by First Order Month ({region_choice})",
+        xaxis_title="Months Since First Order",
+        yaxis_title="Cohort (First Order Month)",
+        yaxis=dict(autorange='reversed'),  # Oldest cohort on top
+        height=600
+    )
+    return fig19
+
+
+def plot20_figure(churn_data, region_choice):
+    fig20 = go.Figure()
+
+    # Active and churned account counts at each month start
+    fig20.add_trace(go.Scatter(
+        x=churn_data['as_of_date'],
+        y=churn_data['active_accounts'],
+        mode='lines',
+        name='Active Accounts',
+        line=dict(color='lightgreen', width=3)
+    ))
+    fig20.add_trace(go.Scatter(
+        x=churn_data['as_of_date'],
+        y=churn_data['churned_accounts'],
+        mode='lines',
+        name='Churned Accounts',
+        line=dict(color='tomato', width=3)
+    ))
+
+    # Churn rate on a secondary axis
+    fig20.add_trace(go.Scatter(
+        x=churn_data['as_of_date'],
+        y=churn_data['churn_rate'] * 100,
+        mode='lines+markers',
+        name='Churn Rate (%)',
+        line=dict(color='gold', width=2, dash='dot'),
+        yaxis='y2'
+    ))
+
+    fig20.update_layout(
+        title=f"Customer Churn by Inactivity Window ({region_choice})",
+        xaxis_title="As of",
+        yaxis=dict(title="Accounts"),
+        yaxis2=dict(title="Churn Rate (%)", overlaying='y', side='right', showgrid=False),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+    )
+    return fig20
+
+
+def plot21_figure(map_data, region_choice):
+    segment_colors = {
+        'High Activity': 'rgb(255, 99, 132)',
+        'Medium Activity': 'rgb(255, 206, 86)',
+        'Low Activity': 'rgb(54, 162, 235)',
+    }
+    # Binned cells are drawn larger the more accounts they hold
+    marker_size = 8 + 4 * map_data['accounts'].pow(0.5)
+
+    fig21 = go.Figure()
+
+    # One trace per segment, plus a spend-coloured trace; the buttons switch between them
+    for segment, color in segment_colors.items():
+        in_segment = map_data['activity_segment'] == segment
+        fig21.add_trace(go.Scattergeo(
+            lat=map_data.loc[in_segment, 'lat'],
+            lon=map_data.loc[in_segment, 'long'],
+            text=map_data.loc[in_segment, 'label'],
+            customdata=map_data.loc[in_segment, 'total_spend'],
+            marker=dict(size=marker_size[in_segment], color=color, line=dict(width=0.5, color='white')),
+            name=segment,
+            hovertemplate='%{text}<br>Spend $%{customdata:,.0f}<extra></extra>'
+        ))
+    fig21.add_trace(go.Scattergeo(
+        lat=map_data['lat'],
+        lon=map_data['long'],
+        text=map_data['label'],
+        customdata=map_data['total_spend'],
+        marker=dict(
+            size=marker_size,
+            color=map_data['total_spend'],
+            colorscale='Viridis',
+            colorbar=dict(title='Spend (USD)'),
+            line=dict(width=0.5, color='white')
+        ),
+        name='Spend',
+        visible=False,
+        hovertemplate='%{text}<br>Spend $%{customdata:,.0f}<extra></extra>'
+    ))
+
+    segment_count = len(segment_colors)
+    fig21.update_layout(
+        title=f"Account Map by Spend and Segment ({region_choice})",
+        geo=dict(scope='usa', bgcolor='rgba(0,0,0,0)', landcolor='rgb(40, 40, 40)', showland=True),
+        updatemenus=[dict(
+            type='buttons',
+            direction='right',
+            x=0.5, xanchor='center', y=1.08,
+            buttons=[
+                dict(label='Colour by Segment', method='update',
+                     args=[{'visible': [True] * segment_count + [False]}]),
+                dict(label='Colour by Spend', method='update',
+                     args=[{'visible': [False] * segment_count + [True]}]),
+            ]
+        )],
+        height=600
+    )
+    return fig21
+
+
+def plot22_figure(attribution_data, region_choice):
+    import plotly.express as px
+
+    # Stacked bars of attributed revenue per channel, one colour per region
+    fig22 = px.bar(
+        attribution_data,
+        template=TEMPLATE,
+        x='channel',
+        y='revenue',
+        color='region_name',
+        hover_data=['orders'],
+        labels={'channel': 'Channel', 'revenue': 'Revenue (USD)', 'region_name': 'Region', 'orders': 'Orders'},
+        title=f"Revenue by Attributed Channel - {region_choice}"
+    )
+    fig22.update_layout(
+        barmode='stack',
+        xaxis={'categoryorder': 'total descending'},
+        legend=dict(title="Region", orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
+    )
+    return fig22
+
+
+def plot23_figure(percentile_data, region_choice):
+    # Grouped bars of the order value percentiles; a log axis keeps the tail readable
+    fig23 = go.Figure()
+    for percentile, color in (('p50', 'lightskyblue'), ('p90', 'orange'), ('p99', 'indianred')):
+        fig23.add_trace(go.Bar(
+            x=percentile_data['group_value'],
+            y=percentile_data[percentile],
+            name=percentile.upper(),
+            marker_color=color,
+            customdata=percentile_data['orders'],
+            hovertemplate='%{x}<br>$%{y:,.2f}<br>%{customdata} orders<extra></extra>'
+        ))
+
+    fig23.update_layout(
+        title=f"Order Value Percentiles - {region_choice}",
+        yaxis_title="Order Value (USD)",
+        yaxis_type='log',
+        barmode='group',
+        legend=dict(title="Percentile", orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+        xaxis_tickangle=-45
+    )
+    return fig23
+
+
+def plot24_figure(series_data, region_choice):
+    import timeseries
+
+    # Hourly buckets are an hour apart; each series is cut to a fixed point budget
+    hourly = series_data.groupby('series')['bucket'].diff().min() < timedelta(days=1)
+    points = timeseries.downsample(series_data)
+
+    fig24 = go.Figure()
+    for series, rows in points.groupby('series', sort=False):
+        is_orders = series == 'orders'
+        fig24.add_trace(go.Scatter(
+            x=rows['bucket'],
+            y=rows['value'],
+            mode='lines',
+            name='Orders' if is_orders else f'Web events: {series}',
+            line=dict(width=2.5 if is_orders else 1.2, color='white' if is_orders else None),
+            opacity=1 if is_orders else 0.8
+        ))
+
+    fig24.update_layout(
+        title=f"{'Hourly' if hourly else 'Daily'} Orders and Web Events by Channel ({region_choice})",
+        xaxis_title="Hour" if hourly else "Day",
+        yaxis_title="Count",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+        height=500
+    )
+    return fig24
+
+
+PLOT_FIGURES = {
+    'plot1': plot1_figure,
+    'plot2': plot2_figure,
+    'plot3': plot3_figure,
+    'plot4': plot4_figure,
+    'plot5': plot5_figure,
+    'plot6': plot6_figure,
+    'plot7': plot7_figure,
+    'plot8': plot8_figure,
+    'plot9': plot9_figure,
+    'plot10': plot10_figure,
+    'plot11': plot11_figure,
+    'plot12': plot12_figure,
+    'plot13': plot13_figure,
+    'plot14': plot14_figure,
+    'plot15': plot15_figure,
+    'plot16': plot16_figure,
+    'plot17': plot17_figure,
+    'plot18': plot18_figure,
+    'plot19': plot19_figure,
+    'plot20': plot20_figure,
+    'plot21': plot21_figure,
+    'plot22': plot22_figure,
+    'plot23': plot23_figure,
+    'plot24': plot24_figure,
+}
+
+
+def build_figure(plot_id, data, region_choice):
+    figure = PLOT_FIGURES[plot_id](data, region_choice)
+    figure.update_layout(template=TEMPLATE)
+    return figure
@@ -0,0 +1,116 @@
+"""Import-time profile of the dashboard and its data layer.
+
+Imports each entry point in a fresh interpreter under ``python -X importtime``
+and reports its import time, the packages that take the longest to import
+and whether it stays within its budget:
+
+    python import_profile.py
+    python import_profile.py --top 10 --repeat 5 datastore dashboard
+
+The ``dashboard`` entry runs the module-level imports of sales_dashboard.py
+without starting the app. An entry fails if it is over its time budget or
+loads a package it must not depend on, such as Streamlit or Plotly from the
+data layer; the exit status is non-zero if any entry fails.
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry point -> (import time budget in ms, packages it must not load)
+ENTRY_POINTS = {
+    'queries': (50, ('pandas', 'duckdb', 'numpy', 'streamlit', 'plotly')),
+    'datastore': (1500, ('streamlit', 'plotly')),
+    'report': (1500, ('streamlit', 'plotly')),
+    'figures': (300, ('streamlit', 'duckdb', 'plotly.express')),
+    'dashboard': (3000, ('plotly.express',)),
+}
+
+
+def dashboard_imports():
+    """The module-level import statements of sales_dashboard.py."""
+    with open(os.path.join(APP_DIR, 'sales_dashboard.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def _statement(entry):
+    return dashboard_imports() if entry == 'dashboard' else f"import {entry}"
+
+
+def _import_times(statement):
+    """Per-module ``(self_us, cumulative_us, depth)`` and the modules loaded, for one fresh import."""
+    code = f"{statement}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return times, json.loads(result.stdout.splitlines()[-1])
+
+
+def profile(entry, repeat=3, top=5, baseline=None):
+    """Fastest of ``repeat`` fresh imports of ``entry``, excluding interpreter startup."""
+    baseline = baseline or {}
+    runs = []
+    for _ in range(repeat):
+        times, modules = _import_times(_statement(entry))
+        total_us = sum(cumulative for name, (_, cumulative, depth) in times.items()
+                       if depth == 0 and name not in baseline)
+        runs.append((total_us, times, modules))
+    total_us, times, modules = min(runs, key=lambda run: run[0])
+    # Own import time of every module, summed per top-level package
+    packages = {}
+    for name, (self_us, _, _) in times.items():
+        if name not in baseline:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+    budget_ms, forbidden = ENTRY_POINTS.get(entry, (None, ()))
+    loaded = [package for package in forbidden if package in modules]
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'entry': entry,
+        'total_ms': round(total_us / 1000, 1),
+        'budget_ms': budget_ms,
+        'forbidden_loaded': loaded,
+        'heaviest': [{'package': name, 'ms': round(self_us / 1000, 1)} for name, self_us in heaviest],
+        'ok': not loaded and (budget_ms is None or total_us / 1000 <= budget_ms),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('entries', nargs='*', default=list(ENTRY_POINTS),
+                        help="Modules to import, or 'dashboard' (default: every entry point)")
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh imports per entry; the fastest is kept')
+    parser.add_argument('--top', type=int, default=5, help='Slowest packages to list')
+    parser.add_argument('--json', action='store_true', help='Print the profile as JSON')
+    args = parser.parse_args(argv)
+
+    baseline, _ = _import_times("pass")
+    results = [profile(entry, args.repeat, args.top, baseline) for entry in args.entries]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            budget = f"{result['budget_ms']} ms" if result['budget_ms'] is not None else "no budget"
+            status = 'ok' if result['ok'] else 'FAIL'
+            print(f"{result['entry']:<12} {result['total_ms']:>8.1f} ms  (budget {budget})  {status}")
+            if result['forbidden_loaded']:
+                print(f"    loads {', '.join(result['forbidden_loaded'])}")
+            for package in result['heaviest']:
+                print(f"    {package['ms']:>8.1f} ms  {package['package']}")
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Concurrent-session load test of the dashboard.
+
+Starts sales_dashboard.py under ``streamlit run`` and drives it headlessly
+with simulated browser sessions speaking Streamlit's websocket protocol.
+Each session loads the page, then repeatedly switches ``Select Region`` to
+a random other region after a random think time; every rerun is timed from
+the request until the server reports the script finished. Sessions share
+the one server process and its caches, as real users do.
+
+Concurrency levels run one after another; each is measured for a fixed
+duration once all of its sessions have loaded the page. For each level the
+report gives rerun latency percentiles, reruns per second, the time to the
+first chart and bytes received on a session's first page load, and the CPU
+use and peak RSS of the server process. The first level whose p90 latency is
+over ``--saturation`` times the first level's p90 is reported as the
+saturation point:
+
+    python loadtest.py --sessions 1 2 4 8 16 --duration 60 --out loadtest.json
+    python loadtest.py --url ws://localhost:8501 --pid 1234   # an already running server
+
+The JSON output can be kept per release to track the saturation curve.
+AppTest, Streamlit's app testing API, cannot run sessions concurrently in
+one process, hence the real server.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sales_dashboard.py')
+REGION_LABEL = 'Select Region'
+DEFAULT_PORT = 8599
+
+
+def start_server(port, timeout=60):
+    """Run the dashboard under ``streamlit run`` and wait until it is healthy."""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_FILE, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://localhost:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"The dashboard did not start on port {port} within {timeout}s")
+
+
+class ProcessMonitor:
+    """CPU time and RSS of a process, read from /proc; ``None`` where unavailable."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def cpu_seconds(self):
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, TypeError):
+            return None
+        # utime and stime are fields 14 and 15 of the stat line
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def rss_mb(self):
+        try:
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except (OSError, TypeError):
+            pass
+        return None
+
+
+class Session:
+    """One simulated browser session on the dashboard's websocket."""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.region_box = None
+        self.exceptions = 0
+        self.received_bytes = 0
+        self.first_chart_at = None
+
+    async def connect(self):
+        self.ws = await websocket_connect(f'{self.url}/_stcore/stream', max_message_size=1 << 30)
+
+    async def rerun(self, widgets=()):
+        """Request a rerun with ``widgets`` and wait until the script finishes.
+
+        Counts the bytes received and notes when the first chart arrived.
+        """
+        self.received_bytes, self.first_chart_at = 0, None
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.widget_states.widgets.extend(widgets)
+        await self.ws.write_message(message.SerializeToString(), binary=True)
+        while True:
+            payload = await asyncio.wait_for(self.ws.read_message(), self.timeout)
+            if payload is None:
+                raise ConnectionError("The dashboard closed the session")
+            self.received_bytes += len(payload)
+            forward = ForwardMsg()
+            forward.ParseFromString(payload)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                if element.WhichOneof('type') == 'selectbox' and element.selectbox.label == REGION_LABEL:
+                    self.region_box = element.selectbox
+                elif element.WhichOneof('type') == 'plotly_chart' and self.first_chart_at is None:
+                    self.first_chart_at = time.perf_counter()
+                elif element.WhichOneof('type') == 'exception':
+                    self.exceptions += 1
+            elif kind == 'script_finished':
+                if forward.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY:
+                    self.exceptions += 1
+                return
+
+    async def select_region(self, index):
+        await self.rerun([WidgetState(id=self.region_box.id, int_value=index)])
+
+    def close(self):
+        self.ws.close()
+
+
+async def run_session(url, window, seed, think_time, timeout):
+    """Load the page, then switch regions at random for the level's measured window.
+
+    ``window`` holds a barrier every session passes once its page has loaded
+    and the end of the window, set by the first session through it. Returns
+    the first load's time, time to first chart and bytes, the rerun
+    latencies and the number of errors.
+    """
+    rng = random.Random(seed)
+    session = Session(url, timeout)
+    await session.connect()
+    try:
+        started = time.perf_counter()
+        await session.rerun()
+        first_load = {
+            'seconds': time.perf_counter() - started,
+            'first_chart_seconds': session.first_chart_at - started if session.first_chart_at else None,
+            'bytes': session.received_bytes,
+        }
+        await window['loaded'].wait()
+        stop_at = window.setdefault('stop_at', time.perf_counter() + window['duration'])
+        current = 0
+        latencies = []
+        while True:
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+            if time.perf_counter() >= stop_at:
+                break
+            current = rng.choice([index for index in range(len(session.region_box.options)) if index != current])
+            started = time.perf_counter()
+            await session.select_region(current)
+            latencies.append(time.perf_counter() - started)
+        return first_load, latencies, session.exceptions
+    finally:
+        session.close()
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': round(p50 * 1000, 1), 'p90': round(p90 * 1000, 1), 'p99': round(p99 * 1000, 1)}
+
+
+async def run_level(url, monitor, sessions, duration, think_time, timeout, seed):
+    """Run ``sessions`` concurrent sessions for ``duration`` seconds and summarize them."""
+    cpu_started = monitor.cpu_seconds() if monitor else None
+    peak_rss = []
+
+    async def sample_rss():
+        while True:
+            peak_rss.append(monitor.rss_mb())
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_rss()) if monitor else None
+    started = time.perf_counter()
+    window = {'loaded': asyncio.Barrier(sessions), 'duration': duration}
+    results = await asyncio.gather(*(run_session(url, window, seed + session, think_time, timeout)
+                                     for session in range(sessions)))
+    elapsed = time.perf_counter() - started
+    if sampler:
+        sampler.cancel()
+    cpu_seconds = monitor.cpu_seconds() if monitor else None
+    rss = [value for value in peak_rss if value is not None]
+    latencies = [latency for _, session_latencies, _ in results for latency in session_latencies]
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'errors': sum(errors for _, _, errors in results),
+        'throughput_per_s': round(len(latencies) / duration, 2),
+        'latency_ms': _percentiles(latencies),
+        'first_load_ms': _percentiles([first_load['seconds'] for first_load, _, _ in results]),
+        'first_chart_ms': _percentiles([first_load['first_chart_seconds'] for first_load, _, _ in results
+                                        if first_load['first_chart_seconds'] is not None]),
+        'page_kb': round(float(np.mean([first_load['bytes'] for first_load, _, _ in results])) / 1024, 1),
+        'cpu_percent': (round(100 * (cpu_seconds - cpu_started) / elapsed, 1)
+                        if cpu_seconds is not None and cpu_started is not None else None),
+        'peak_rss_mb': round(max(rss), 1) if rss else None,
+    }
+
+
+def saturation_point(levels, factor):
+    """Sessions of the first level whose p90 is over ``factor`` times the first level's, or ``None``."""
+    baseline = levels[0]['latency_ms']['p90'] if levels else None
+    for level in levels[1:]:
+        p90 = level['latency_ms']['p90']
+        if baseline and p90 is not None and p90 > factor * baseline:
+            return level['sessions']
+    return None
+
+
+async def run_levels(url, monitor, args):
+    levels = []
+    for sessions in args.sessions:
+        level = await run_level(url, monitor, sessions, args.duration, args.think_time, args.timeout, args.seed)
+        levels.append(level)
+        latency = level['latency_ms']
+        print(f"{sessions:>3} sessions: {level['reruns']:>5} reruns  {level['throughput_per_s']:>6.2f}/s  "
+              f"p50 {latency['p50']} ms  p90 {latency['p90']} ms  p99 {latency['p99']} ms  "
+              f"first chart {level['first_chart_ms']['p50']} ms  page {level['page_kb']} KB  "
+              f"cpu {level['cpu_percent']}%  rss {level['peak_rss_mb']} MB  errors {level['errors']}")
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Concurrent sessions of each level, in order')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds each level runs for')
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help='Mean seconds a session waits between reruns (exponential; 0 for none)')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds a single rerun may take')
+    parser.add_argument('--saturation', type=float, default=2.0,
+                        help='p90 growth over the first level that counts as saturated')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the session schedules')
+    parser.add_argument('--url', help='Websocket base URL of a running dashboard (default: start one)')
+    parser.add_argument('--pid', type=int, help='Process id of the running dashboard, for CPU and RSS')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the dashboard started for the test')
+    parser.add_argument('--label', help='Label stored with the results, such as a release or commit')
+    parser.add_argument('--out', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        url, pid = args.url.rstrip('/'), args.pid
+    else:
+        server = start_server(args.port)
+        url, pid = f'ws://localhost:{args.port}', server.pid
+    try:
+        levels = asyncio.run(run_levels(url, ProcessMonitor(pid) if pid else None, args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    saturated_at = saturation_point(levels, args.saturation)
+    print(f"saturated at {saturated_at} sessions" if saturated_at else "no saturation within the tested levels")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({
+                'label': args.label,
+                'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'duration_s': args.duration,
+                'think_time_s': args.think_time,
+                'saturated_at': saturated_at,
+                'levels': levels,
+            }, f, indent=2)
+    return 1 if any(level['errors'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
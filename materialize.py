@@ -0,0 +1,63 @@
+"""Aggregates materialized at ingest time, and the plot executors they back.
+
+Each module in ``MATERIALIZERS`` exposes ``build(con)``, run once when the
+source tables are loaded, ``update(con, table, rows)``, run after rows are
+appended, ``enabled()`` and ``cache_tag()`` describing its configuration,
+and a ``PLOT_EXECUTORS`` mapping of plot id to a function
+``(con, region_choice, date_range=None, filters=None) -> DataFrame`` that
+answers the plot from its materialized state instead of the plot's
+reference SQL. ``date_range`` is an inclusive ``(start, end)`` pair of
+months, or ``None`` for all data; ``filters`` is a crossfilter.CrossFilter
+restricted to the dimensions listed in the module's ``CROSS_FILTERS``.
+Executors of the plots in queries.PLOT_THRESHOLDS also take ``thresholds``,
+overriding those defaults.
+"""
+
+import attribution
+import churn
+import cohorts
+import compaction
+import quantiles
+import rollups
+import segments
+import sketches
+
+# Built and updated in order; modules reading the rollups come after them
+MATERIALIZERS = [rollups, churn, cohorts, segments, sketches, attribution, quantiles]
+
+# Plot id -> (materializer, executor)
+_EXECUTORS = {}
+for _module in MATERIALIZERS:
+    for _plot_id, _executor in getattr(_module, 'PLOT_EXECUTORS', {}).items():
+        _EXECUTORS[_plot_id] = (_module, _executor)
+
+
+def build(con):
+    for module in MATERIALIZERS:
+        module.build(con)
+
+
+def append_rows(con, table, rows):
+    """Append a DataFrame of new ``rows`` to ``table`` and refresh the aggregates."""
+    cursor = con.cursor()
+    try:
+        cursor.register('_appended_rows', rows)
+        cursor.execute(f"INSERT INTO {table} BY NAME SELECT {compaction.select_list(rows)} FROM _appended_rows")
+        cursor.unregister('_appended_rows')
+    finally:
+        cursor.close()
+    for module in MATERIALIZERS:
+        module.update(con, table, rows)
+
+
+def executor_for(plot_id, filters=None):
+    """Return ``(cache_tag, executor)`` for a plot, or ``None`` to use its SQL."""
+    entry = _EXECUTORS.get(plot_id)
+    if entry is None:
+        return None
+    module, executor = entry
+    if not module.enabled():
+        return None
+    if filters and set(filters.account_dimensions()) - set(module.CROSS_FILTERS):
+        return None
+    return f"{module.__name__}.{executor.__name__}:{module.cache_tag()}", executor
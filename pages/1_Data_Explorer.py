@@ -0,0 +1,63 @@
+import streamlit as st
+import pandas as pd
+import datastore
+import explorer
+from app_resources import get_connection, get_source
+from drilldown import page_count
+
+# Set page configuration
+st.set_page_config(page_title="Data Explorer", page_icon="🗂️", layout="wide")
+
+con = get_connection(get_source().version())
+
+st.markdown("## Data Explorer 🗂️")
+st.caption("Rows are filtered, sorted and paginated inside DuckDB; only the visible page is loaded.")
+
+# Sidebar table and region selection
+table = st.sidebar.radio('Table', options=list(explorer.EXPLORER_TABLES))
+region_choice = st.sidebar.selectbox(
+    'Select Region',
+    options=['All Regions'] + datastore.region_names(con)
+)
+columns = explorer.EXPLORER_TABLES[table]
+
+# Column filters
+filters = {}
+with st.expander('Filters', expanded=True):
+    filter_columns = st.multiselect('Filter on columns', options=list(columns), key=f'{table}_filter_columns')
+    for column in filter_columns:
+        kind = columns[column]
+        if kind == 'category':
+            filters[column] = st.multiselect(column, options=explorer.category_values(con, table, column),
+                                             key=f'{table}_{column}')
+        elif kind == 'timestamp':
+            low, high = (pd.Timestamp(value).date() for value in explorer.column_range(con, table, column))
+            picked = st.date_input(column, value=(low, high), min_value=low, max_value=high,
+                                   key=f'{table}_{column}')
+            if len(picked) == 2:
+                filters[column] = (f"{picked[0]} 00:00:00", f"{picked[1]} 23:59:59")
+        else:
+            low, high = explorer.column_range(con, table, column)
+            range_col1, range_col2 = st.columns(2)
+            filters[column] = (
+                range_col1.number_input(f'{column} from', value=float(low), key=f'{table}_{column}_low'),
+                range_col2.number_input(f'{column} to', value=float(high), key=f'{table}_{column}_high'),
+            )
+
+# Sorting and pagination
+sort_col1, sort_col2, sort_col3, sort_col4 = st.columns(4)
+sort_column = sort_col1.selectbox('Sort by', options=list(columns), key=f'{table}_sort')
+descending = sort_col2.toggle('Descending', key=f'{table}_descending')
+page_size = sort_col3.selectbox('Rows per page', options=[50, 100, 250, 500], index=1)
+page = sort_col4.number_input('Page', min_value=1, value=1, step=1, key=f'{table}_page')
+
+rows, total = explorer.fetch_rows(con, table, filters, region_choice, sort_column, descending,
+                                  page - 1, page_size)
+pages = page_count(total, page_size)
+if page > pages:
+    page = pages
+    rows, total = explorer.fetch_rows(con, table, filters, region_choice, sort_column, descending,
+                                      page - 1, page_size)
+
+st.caption(f"Page {page} of {pages} · {total:,} matching rows")
+st.dataframe(rows, hide_index=True, use_container_width=True)
@@ -0,0 +1,220 @@
+"""Mergeable quantile sketches of order values.
+
+``order_value_sketch`` holds one sketch of order values per account and
+month, built when the data is loaded and merged into on every append. A
+sketch counts orders in logarithmic buckets ``(gamma ** (k - 1), gamma ** k]``
+with ``gamma = (1 + e) / (1 - e)``, so any value read back from a bucket is
+within a relative error ``e`` of the orders in it. Sketches merge by adding
+their bucket counts, so percentiles for any region, sales rep, activity
+segment or month are a ``SUM`` over a few thousand bucket rows and a running
+total, instead of sorting the orders. Zero-value orders share one bucket.
+
+The relative error is set with the ``SALES_DASHBOARD_QUANTILE_ERROR``
+environment variable (default 0.01). Setting it to 0 turns the sketches off
+and every percentile is exact. ``python quantiles.py`` compares the sketched
+percentiles of the sample data with the exact ones.
+"""
+
+import math
+import os
+
+from queries import ALL_REGIONS, PERCENTILE_GROUPS, PLOT_THRESHOLDS
+
+ERROR_ENV_VAR = "SALES_DASHBOARD_QUANTILE_ERROR"
+DEFAULT_RELATIVE_ERROR = 0.01
+
+SKETCH_TABLE = "order_value_sketch"
+
+# Bucket of zero-value orders, below every logarithmic bucket
+ZERO_BUCKET = -2 ** 31
+
+PERCENTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+def configured_relative_error():
+    """Relative error from the environment; 0 means exact percentiles only."""
+    return float(os.environ.get(ERROR_ENV_VAR, DEFAULT_RELATIVE_ERROR))
+
+
+def enabled():
+    return configured_relative_error() > 0
+
+
+def cache_tag():
+    """Identifies the sketch configuration in result cache keys."""
+    return f"quantile-e{configured_relative_error():g}"
+
+
+def bucket_expression(column, relative_error):
+    """SQL for the sketch bucket of the non-negative values in ``column``."""
+    log_gamma = math.log((1 + relative_error) / (1 - relative_error))
+    return f"CASE WHEN {column} > 0 THEN CAST(ceil(ln({column}) / {log_gamma!r}) AS INTEGER) ELSE {ZERO_BUCKET} END"
+
+
+# The value a bucket stands for, within relative_error of every value in it
+_BUCKET_VALUE = f"""CASE WHEN bucket = {ZERO_BUCKET} THEN 0
+    ELSE (1 - relative_error) * pow((1 + relative_error) / (1 - relative_error), bucket) END"""
+
+_PARTITION_QUERY = """
+SELECT account_id,
+       date_trunc('month', CAST(occurred_at AS TIMESTAMP)) AS month,
+       {bucket} AS bucket,
+       COUNT(*) AS orders,
+       {relative_error!r} AS relative_error
+FROM {source}
+GROUP BY ALL
+"""
+
+
+def build(con, relative_error=None):
+    """Materialize the order value sketches from the full orders table."""
+    relative_error = configured_relative_error() if relative_error is None else relative_error
+    con.execute(f"DROP TABLE IF EXISTS {SKETCH_TABLE}")
+    if relative_error <= 0:
+        return
+    # No primary key: an index as large as the orders would have to fit in memory
+    con.execute(f"""
+    CREATE TABLE {SKETCH_TABLE} (
+        account_id BIGINT, month TIMESTAMP, bucket INTEGER, orders BIGINT, relative_error DOUBLE
+    )
+    """)
+    con.execute(f"INSERT INTO {SKETCH_TABLE} " + _PARTITION_QUERY.format(
+        bucket=bucket_expression('total_amt_usd', relative_error), relative_error=relative_error, source='orders'))
+
+
+def update(con, table, rows):
+    """Merge newly appended orders into the existing sketches, bucket by bucket."""
+    if table != 'orders' or not is_built(con):
+        return
+    relative_error = con.execute(f"SELECT ANY_VALUE(relative_error) FROM {SKETCH_TABLE}").fetchone()[0]
+    if relative_error is None:
+        relative_error = configured_relative_error()
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_orders', rows)
+        cursor.execute("CREATE TEMP TABLE _sketch_delta AS " + _PARTITION_QUERY.format(
+            bucket=bucket_expression('total_amt_usd', relative_error), relative_error=relative_error,
+            source='_new_orders'))
+        cursor.unregister('_new_orders')
+        cursor.execute(f"""
+        CREATE TEMP TABLE _sketch_merged AS
+        SELECT account_id, month, bucket, SUM(orders) AS orders, ANY_VALUE(relative_error) AS relative_error
+        FROM (
+            SELECT s.* FROM {SKETCH_TABLE} s SEMI JOIN _sketch_delta d USING (account_id, month, bucket)
+            UNION ALL BY NAME
+            SELECT * FROM _sketch_delta
+        )
+        GROUP BY ALL
+        """)
+        cursor.execute(f"""
+        DELETE FROM {SKETCH_TABLE} s USING _sketch_delta d
+        WHERE s.account_id = d.account_id AND s.month = d.month AND s.bucket = d.bucket
+        """)
+        cursor.execute(f"INSERT INTO {SKETCH_TABLE} BY NAME SELECT * FROM _sketch_merged")
+        cursor.execute("DROP TABLE _sketch_delta")
+        cursor.execute("DROP TABLE _sketch_merged")
+    finally:
+        cursor.close()
+
+
+def is_built(con):
+    return bool(con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [SKETCH_TABLE]
+    ).fetchone()[0])
+
+
+def plot23_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    """Order value percentiles per group, merged from the account-month sketches.
+
+    A percentile ``q`` of ``n`` orders is read from the first bucket whose
+    running count reaches ``q * n``, the same rank ``quantile_disc`` picks.
+    """
+    thresholds = {**PLOT_THRESHOLDS['plot23'], **(thresholds or {})}
+    group_by = thresholds['group_by']
+    if group_by not in PERCENTILE_GROUPS:
+        raise ValueError(f"group_by must be one of {PERCENTILE_GROUPS}, not {group_by!r}")
+    high, medium = int(thresholds['high_activity_orders']), int(thresholds['medium_activity_orders'])
+    group_columns = {
+        'region': "region_name",
+        'sales_rep': "sales_rep_name",
+        'segment': f"""CASE
+            WHEN order_count > {high} THEN 'High Activity'
+            WHEN order_count BETWEEN {medium} AND {high} THEN 'Medium Activity'
+            ELSE 'Low Activity'
+        END""",
+        'month': "strftime(month, '%Y-%m')",
+    }
+    clauses, params = [], []
+    if region_choice != ALL_REGIONS:
+        clauses.append("r.name = ?")
+        params.append(region_choice)
+    if date_range is not None:
+        clauses.append("s.month BETWEEN ? AND ?")
+        params.extend(date_range)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    percentiles = ",\n".join(
+        f"arg_min(value, bucket) FILTER (WHERE cumulative >= total * {fraction!r}) AS {name}"
+        for name, fraction in PERCENTILES.items()
+    )
+    cursor = con.cursor()
+    try:
+        return cursor.execute(f"""
+        WITH scoped AS (
+            SELECT s.*, r.name AS region_name, sr.name AS sales_rep_name,
+                   SUM(s.orders) OVER (PARTITION BY s.account_id) AS order_count
+            FROM {SKETCH_TABLE} s
+            JOIN accounts a ON s.account_id = a.id
+            JOIN sales_reps sr ON a.sales_rep_id = sr.id
+            JOIN region r ON sr.region_id = r.id
+            {where}
+        ),
+        merged AS (
+            SELECT {group_columns[group_by]} AS group_value, bucket,
+                   ANY_VALUE(relative_error) AS relative_error, SUM(orders) AS orders
+            FROM scoped
+            GROUP BY 1, 2
+        ),
+        ranked AS (
+            SELECT group_value, bucket, {_BUCKET_VALUE} AS value,
+                   SUM(orders) OVER (PARTITION BY group_value ORDER BY bucket) AS cumulative,
+                   SUM(orders) OVER (PARTITION BY group_value) AS total
+            FROM merged
+        )
+        SELECT group_value,
+               CAST(ANY_VALUE(total) AS BIGINT) AS orders,
+               {percentiles}
+        FROM ranked
+        GROUP BY group_value
+        ORDER BY group_value
+        """, params).df()
+    finally:
+        cursor.close()
+
+
+CROSS_FILTERS = ()
+
+PLOT_EXECUTORS = {
+    'plot23': plot23_data,
+}
+
+
+def _accuracy_report():
+    """Largest relative error of the sketched percentiles against quantile_disc."""
+    import datastore
+    from queries import plot_query
+
+    con = datastore.open_database()
+    print(f"relative error bound {configured_relative_error():g}")
+    for group_by in PERCENTILE_GROUPS:
+        thresholds = {'group_by': group_by}
+        exact = datastore.execute(con, plot_query('plot23', ALL_REGIONS, thresholds=thresholds))
+        sketched = plot23_data(con, ALL_REGIONS, thresholds=thresholds)
+        worst = 0.0
+        for name in PERCENTILES:
+            errors = (sketched[name] - exact[name]).abs() / exact[name].where(exact[name] > 0)
+            worst = max(worst, errors.max(skipna=True))
+        print(f"{group_by:>10}: {len(exact)} groups, max relative error {worst:.4%}")
+
+
+if __name__ == '__main__':
+    _accuracy_report()
@@ -0,0 +1,938 @@
+"""SQL definitions for the dashboard plots.
+
+Each ``plotN_query`` returns the DuckDB SQL behind the matching chart for a
+region choice. This module has no Streamlit or Plotly dependency so the same
+definitions back the dashboard and the headless report renderer.
+"""
+
+import datetime
+import re
+
+ALL_REGIONS = "All Regions"
+
+# Fact tables narrowed by the sidebar date range
+DATED_TABLES = ('orders', 'web_events')
+
+
+def region_slug(region_choice):
+    return re.sub(r'[^A-Za-z0-9]+', '-', region_choice).strip('-').lower()
+
+
+def plot1_query(region_choice):
+    if region_choice == "All Regions":
+        query = """
+        SELECT r.name AS region_name,
+                SUM(o.total_amt_usd) AS total_sales
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        GROUP BY r.name
+        ORDER BY total_sales DESC;
+        """
+    else:
+        query = f"""
+        SELECT r.name AS region_name,
+                SUM(o.total_amt_usd) AS total_sales
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY r.name
+        ORDER BY total_sales DESC;
+        """
+    return query
+
+
+def plot2_query(region_choice):
+    if region_choice == 'All Regions':
+        query = """
+        SELECT r.name AS Region,
+                sr.name AS Rep_name,
+                a.name AS account_name
+        FROM region r
+        JOIN sales_reps sr ON r.id = sr.region_id
+        JOIN accounts a ON sr.id = a.sales_rep_id
+        ORDER BY account_name ASC;
+        """
+    else:
+        query = f"""
+        SELECT r.name AS Region,
+                sr.name AS Rep_name,
+                a.name AS account_name
+        FROM region r
+        JOIN sales_reps sr ON r.id = sr.region_id
+        JOIN accounts a ON sr.id = a.sales_rep_id
+        WHERE r.name = '{region_choice}'
+        ORDER BY account_name ASC;
+        """
+    return query
+
+
+def plot3_query(region_choice):
+    if region_choice == 'All Regions':
+        query = """
+        SELECT sr.name AS sales_rep_name,
+                we.channel,
+                COUNT(*) AS number_of_occurrences
+        FROM web_events we
+        JOIN accounts a ON we.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        GROUP BY sr.name, we.channel
+        ORDER BY number_of_occurrences DESC;
+        """
+    else:
+        query = f"""
+        SELECT sr.name AS sales_rep_name,
+                we.channel,
+                COUNT(*) AS number_of_occurrences
+        FROM web_events we
+        JOIN accounts a ON we.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY sr.name, we.channel
+        ORDER BY number_of_occurrences DESC;
+        """
+    return query
+
+
+def plot4_query(region_choice):
+    if region_choice == "All Regions":
+        query = """
+        SELECT sr.name AS sales_representative,
+                COUNT(DISTINCT a.id) AS new_customers_acquired,
+                EXTRACT(YEAR FROM CAST(MIN(o.occurred_at) AS TIMESTAMP)) AS first_order_year
+        FROM sales_reps sr
+        LEFT JOIN accounts a ON sr.id = a.sales_rep_id
+        LEFT JOIN orders o ON a.id = o.account_id
+        GROUP BY sr.name
+        ORDER BY new_customers_acquired DESC;
+        """
+    else:
+        query = f"""
+        SELECT sr.name AS sales_representative,
+                COUNT(DISTINCT a.id) AS new_customers_acquired,
+                EXTRACT(YEAR FROM CAST(MIN(o.occurred_at) AS TIMESTAMP)) AS first_order_year
+        FROM sales_reps sr
+        LEFT JOIN accounts a ON sr.id = a.sales_rep_id
+        LEFT JOIN orders o ON a.id = o.account_id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY sr.name
+        ORDER BY new_customers_acquired DESC;
+        """
+    return query
+
+
+def plot5_query(region_choice):
+    query = f"""
+    SELECT
+        r.name AS region_name,
+        AVG(o.total_amt_usd) AS avg_order_size
+    FROM orders o
+    JOIN accounts a ON o.account_id = a.id
+    JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    JOIN region r ON sr.region_id = r.id
+    WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    GROUP BY r.name
+    ORDER BY avg_order_size DESC;
+    """
+    return query
+
+
+def plot6_query(region_choice, high_volume_orders=50, moderate_volume_orders=10, high_value_avg_usd=1000):
+    query = f"""
+    WITH order_summary AS (
+        SELECT
+            a.id AS account_id,
+            a.name AS account_name,
+            AVG(o.total_amt_usd) AS avg_order_amt_usd,
+            STDDEV(o.total_amt_usd) AS order_amt_std_dev,
+            COUNT(o.id) AS total_orders,
+            SUM(o.total_amt_usd) AS total_sales
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+        GROUP BY a.id, a.name
+    ),
+    segmented_orders AS (
+        SELECT
+            account_id,
+            account_name,
+            avg_order_amt_usd,
+            order_amt_std_dev,
+            total_orders,
+            total_sales,
+            CASE
+                WHEN total_orders > {high_volume_orders} THEN 'High Volume'
+                WHEN total_orders > {moderate_volume_orders} THEN 'Moderate Volume'
+                ELSE 'Low Volume'
+            END AS order_volume_segment,
+            CASE
+                WHEN avg_order_amt_usd > {high_value_avg_usd} THEN 'High Value'
+                ELSE 'Low Value'
+            END AS order_value_segment
+        FROM order_summary
+    )
+    SELECT
+        order_volume_segment,
+        order_value_segment,
+        COUNT(account_id) AS num_accounts,
+        AVG(avg_order_amt_usd) AS avg_order_size_usd,
+        AVG(order_amt_std_dev) AS avg_order_std_dev_usd,
+        SUM(total_sales) AS total_sales_in_segment
+    FROM segmented_orders
+    GROUP BY order_volume_segment, order_value_segment
+    ORDER BY num_accounts DESC;
+    """
+    return query
+
+
+def plot7_query(region_choice):
+    if region_choice == 'All Regions':
+        query = """
+        SELECT r.name AS region,
+                a.name AS account_name,
+                o.total_amt_usd / (o.total + 0.01) AS unit_price
+        FROM region r
+        JOIN sales_reps sr ON r.id = sr.region_id
+        JOIN accounts a ON sr.id = a.sales_rep_id
+        JOIN orders o ON a.id = o.account_id
+        WHERE o.standard_qty > 100
+            AND o.poster_qty > 50
+        ORDER BY unit_price DESC;
+        """
+    else:
+        query = f"""
+        SELECT r.name AS region,
+                a.name AS account_name,
+                o.total_amt_usd / (o.total + 0.01) AS unit_price
+        FROM region r
+        JOIN sales_reps sr ON r.id = sr.region_id
+        JOIN accounts a ON sr.id = a.sales_rep_id
+        JOIN orders o ON a.id = o.account_id
+        WHERE o.standard_qty > 100
+            AND o.poster_qty > 50
+            AND r.name = '{region_choice}'
+        ORDER BY unit_price DESC;
+        """
+    return query
+
+
+def plot8_query(region_choice):
+    if region_choice == "All Regions":
+        query = """
+        SELECT CAST(EXTRACT(YEAR FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS year,
+                SUM(total_amt_usd) AS total_usd
+        FROM orders
+        GROUP BY year
+        ORDER BY total_usd ASC;
+        """
+    else:
+        query = f"""
+        SELECT CAST(EXTRACT(YEAR FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS year,
+                SUM(o.total_amt_usd) AS total_usd
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY year
+        ORDER BY total_usd ASC;
+        """
+    return query
+
+
+def plot9_query(region_choice):
+    if region_choice == "All Regions":
+        query = """
+        SELECT a.id AS account_id,
+                a.name AS account_name,
+                SUM(o.total_amt_usd) AS total_spent,
+                COUNT(o.id) AS total_orders,
+                AVG(o.total_amt_usd) AS average_order_amount
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        GROUP BY a.id, a.name
+        ORDER BY total_spent DESC;
+        """
+    else:
+        query = f"""
+        SELECT a.id AS account_id,
+                a.name AS account_name,
+                SUM(o.total_amt_usd) AS total_spent,
+                COUNT(o.id) AS total_orders,
+                AVG(o.total_amt_usd) AS average_order_amount
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY a.id, a.name
+        ORDER BY total_spent DESC;
+        """
+    return query
+
+
+def plot10_query(region_choice):
+    query = f"""
+    WITH last_order_dates AS (
+        SELECT
+            account_id,
+            MAX(occurred_at) AS last_order_date
+        FROM orders
+        GROUP BY account_id
+    )
+    SELECT
+        COUNT(DISTINCT l.account_id) AS active_customers,
+        COUNT(DISTINCT a.id) - COUNT(DISTINCT l.account_id) AS churned_customers
+    FROM accounts a
+    LEFT JOIN last_order_dates l ON a.id = l.account_id
+    LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    LEFT JOIN region r ON sr.region_id = r.id
+    WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions';
+    """
+    return query
+
+
+def plot11_query(region_choice):
+    query = f"""
+    SELECT
+        r.name AS region_name,
+        we.channel,
+        COUNT(we.id) AS total_events,
+        COUNT(DISTINCT a.id) AS unique_accounts_impacted
+    FROM web_events we
+    LEFT JOIN accounts a ON we.account_id = a.id
+    LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    LEFT JOIN region r ON sr.region_id = r.id
+    WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    GROUP BY r.name, we.channel
+    ORDER BY r.name, total_events DESC;
+    """
+    return query
+
+
+def plot12_query(region_choice):
+    query = f"""
+    WITH sales_contribution AS (
+    SELECT
+        r.name AS region_name,
+        sr.name AS sales_representative,
+        COUNT(o.id) AS num_orders,
+        SUM(o.total_amt_usd) AS total_amt_usd
+    FROM sales_reps sr
+    JOIN accounts a ON sr.id = a.sales_rep_id
+    JOIN orders o ON a.id = o.account_id
+    JOIN region r ON sr.region_id = r.id
+    GROUP BY r.name, sr.name
+    ),
+    region_total_sales AS (
+    SELECT
+        region_name,
+        SUM(total_amt_usd) AS region_total_amt_usd
+    FROM sales_contribution
+    GROUP BY region_name
+    )
+    SELECT
+    sc.region_name,
+    sc.sales_representative,
+    sc.num_orders,
+    sc.total_amt_usd,
+    rt.region_total_amt_usd,
+    ROUND(sc.total_amt_usd / rt.region_total_amt_usd * 100, 2) AS contribution_percent_of_region
+    FROM sales_contribution sc
+    JOIN region_total_sales rt ON sc.region_name = rt.region_name
+    WHERE sc.region_name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    ORDER BY sc.region_name, contribution_percent_of_region DESC;
+    """
+    return query
+
+
+def plot13_query(region_choice, years=(2013, 2017)):
+    # With a date range applied the range replaces the fixed comparison years
+    if years:
+        year_filter = f"CAST(EXTRACT(YEAR FROM CAST(occurred_at AS TIMESTAMP)) AS INT) IN ({', '.join(map(str, years))})"
+    else:
+        year_filter = "TRUE"
+    if region_choice == "All Regions":
+        query = f"""
+        SELECT CAST(EXTRACT(YEAR FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS year,
+               CAST(EXTRACT(MONTH FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS month,
+               SUM(total_amt_usd) AS total_usd,
+               AVG(total_amt_usd) AS avg_order_amt,
+               COUNT(id) AS total_orders,
+               MAX(total_amt_usd) AS max_order_amt
+        FROM orders
+        WHERE {year_filter}
+        GROUP BY year, month
+        ORDER BY year ASC, month ASC;
+        """
+    else:
+        query = f"""
+        SELECT CAST(EXTRACT(YEAR FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS year,
+               CAST(EXTRACT(MONTH FROM CAST(occurred_at AS TIMESTAMP)) AS INT) AS month,
+               SUM(o.total_amt_usd) AS total_usd,
+               AVG(o.total_amt_usd) AS avg_order_amt,
+               COUNT(o.id) AS total_orders,
+               MAX(o.total_amt_usd) AS max_order_amt
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+          AND {year_filter}
+        GROUP BY year, month
+        ORDER BY year ASC, month ASC;
+        """
+    return query
+
+
+def plot14_query(region_choice):
+    if region_choice == 'All Regions':
+        query = """
+        SELECT 
+            a.name AS account_name,
+            AVG(o.standard_amt_usd) AS avg_standard_amt_usd,
+            AVG(o.gloss_amt_usd) AS avg_gloss_amt_usd,
+            AVG(o.poster_amt_usd) AS avg_poster_amt_usd
+        FROM
+            accounts a
+                JOIN
+            orders o ON a.id = o.account_id
+        GROUP BY a.name;
+        """
+    else:
+        query = f"""
+        SELECT 
+            a.name AS account_name,
+            AVG(o.standard_amt_usd) AS avg_standard_amt_usd,
+            AVG(o.gloss_amt_usd) AS avg_gloss_amt_usd,
+            AVG(o.poster_amt_usd) AS avg_poster_amt_usd
+        FROM
+            accounts a
+                JOIN
+            orders o ON a.id = o.account_id
+                JOIN
+            sales_reps sr ON a.sales_rep_id = sr.id
+                JOIN
+            region r ON sr.region_id = r.id  -- Joining region via sales_reps
+        WHERE r.name = '{region_choice}'  -- Filtering by region
+        GROUP BY a.name;
+        """
+    return query
+
+
+def plot15_query(region_choice):
+    if region_choice == "All Regions":
+        query = """
+        SELECT we.channel,
+                COUNT(we.id) AS total_events,
+                COUNT(DISTINCT we.account_id) AS unique_accounts,
+                COUNT(DISTINCT a.id) AS total_customers
+        FROM web_events we
+        LEFT JOIN accounts a ON we.account_id = a.id
+        GROUP BY we.channel
+        ORDER BY total_events DESC;
+        """
+    else:
+        query = f"""
+        SELECT we.channel,
+                COUNT(we.id) AS total_events,
+                COUNT(DISTINCT we.account_id) AS unique_accounts,
+                COUNT(DISTINCT a.id) AS total_customers
+        FROM web_events we
+        LEFT JOIN accounts a ON we.account_id = a.id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}'
+        GROUP BY we.channel
+        ORDER BY total_events DESC;
+        """
+    return query
+
+
+def plot16_query(region_choice):
+    query = f"""
+    SELECT
+        EXTRACT(MONTH FROM CAST(o.occurred_at AS TIMESTAMP)) AS month,
+        SUM(o.total_amt_usd) AS total_sales
+    FROM orders o
+    LEFT JOIN accounts a ON o.account_id = a.id
+    LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    LEFT JOIN region r ON sr.region_id = r.id
+    WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    GROUP BY month
+    ORDER BY month;
+    """
+    return query
+
+
+def plot17_query(region_choice, highly_active_rank=3, moderately_active_rank=10,
+                  high_spender_rank=3, moderate_spender_rank=10):
+    query = f"""
+    WITH customer_summary AS (
+        SELECT
+            a.id AS account_id,
+            a.name AS account_name,
+            COUNT(o.id) AS total_orders,
+            SUM(o.total_amt_usd) AS total_spend,
+            DENSE_RANK() OVER (ORDER BY COUNT(o.id) DESC) AS order_rank,
+            DENSE_RANK() OVER (ORDER BY SUM(o.total_amt_usd) DESC) AS spend_rank
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+        GROUP BY a.id, a.name
+    )
+    SELECT
+        account_name,
+        total_orders,
+        total_spend,
+        CASE
+            WHEN order_rank <= {highly_active_rank} THEN 'Highly Active'
+            WHEN order_rank <= {moderately_active_rank} THEN 'Moderately Active'
+            ELSE 'Less Active'
+        END AS order_activity_segment,
+        CASE
+            WHEN spend_rank <= {high_spender_rank} THEN 'High Spender'
+            WHEN spend_rank <= {moderate_spender_rank} THEN 'Moderate Spender'
+            ELSE 'Low Spender'
+        END AS spending_segment
+    FROM customer_summary
+    ORDER BY order_rank, spend_rank;
+    """
+    return query
+
+
+def plot18_query(region_choice, high_activity_orders=20, medium_activity_orders=10):
+    query = f"""
+    WITH account_order_count AS (
+        SELECT
+            a.id AS account_id,
+            a.name AS account_name,
+            COUNT(o.id) AS order_count,
+            SUM(o.total_amt_usd) AS total_sales,
+            r.name AS region_name
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+        GROUP BY a.id, a.name, r.name
+    ),
+    activity_segments AS (
+        SELECT
+            account_id,
+            account_name,
+            total_sales,
+            region_name,
+            CASE
+                WHEN order_count > {high_activity_orders} THEN 'High Activity'
+                WHEN order_count BETWEEN {medium_activity_orders} AND {high_activity_orders} THEN 'Medium Activity'
+                ELSE 'Low Activity'
+            END AS activity_segment
+        FROM account_order_count
+    )
+    SELECT
+        region_name,
+        activity_segment,
+        AVG(total_sales) AS avg_sales
+    FROM activity_segments
+    GROUP BY region_name, activity_segment
+    ORDER BY region_name, avg_sales DESC;
+    """
+    return query
+
+
+def plot19_query(region_choice):
+    # Each account's cohort is its first order month, found in one window pass
+    query = f"""
+    WITH cohort_orders AS (
+        SELECT
+            o.account_id,
+            date_trunc('month', CAST(o.occurred_at AS TIMESTAMP)) AS order_month,
+            MIN(date_trunc('month', CAST(o.occurred_at AS TIMESTAMP)))
+                OVER (PARTITION BY o.account_id) AS cohort_month,
+            o.total_amt_usd
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    ),
+    cohort_activity AS (
+        SELECT
+            cohort_month,
+            date_diff('month', cohort_month, order_month) AS months_since_first_order,
+            COUNT(DISTINCT account_id) AS active_accounts,
+            SUM(total_amt_usd) AS revenue
+        FROM cohort_orders
+        GROUP BY cohort_month, months_since_first_order
+    )
+    SELECT
+        cohort_month,
+        months_since_first_order,
+        MAX(active_accounts) FILTER (WHERE months_since_first_order = 0)
+            OVER (PARTITION BY cohort_month) AS cohort_size,
+        active_accounts,
+        active_accounts / cohort_size AS retention,
+        revenue
+    FROM cohort_activity
+    ORDER BY cohort_month, months_since_first_order;
+    """
+    return query
+
+
+def plot20_query(region_choice, churn_window_days=180):
+    # An account is churned at a month start if it has ordered before but not
+    # within the churn window; it is active if it ordered within the window
+    query = f"""
+    WITH account_orders AS (
+        SELECT
+            o.account_id,
+            CAST(o.occurred_at AS TIMESTAMP) AS ordered_at
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    ),
+    as_of AS (
+        SELECT range AS as_of_date
+        FROM range(
+            (SELECT date_trunc('month', MIN(ordered_at)) FROM account_orders) + INTERVAL 1 MONTH,
+            (SELECT date_trunc('month', MAX(ordered_at)) FROM account_orders) + INTERVAL 2 MONTH,
+            INTERVAL 1 MONTH
+        )
+    ),
+    last_orders AS (
+        SELECT d.as_of_date, ao.account_id, MAX(ao.ordered_at) AS last_order_at
+        FROM as_of d
+        JOIN account_orders ao ON ao.ordered_at < d.as_of_date
+        GROUP BY d.as_of_date, ao.account_id
+    )
+    SELECT
+        as_of_date,
+        COUNT(*) FILTER (WHERE last_order_at >= as_of_date - INTERVAL {int(churn_window_days)} DAY) AS active_accounts,
+        COUNT(*) FILTER (WHERE last_order_at < as_of_date - INTERVAL {int(churn_window_days)} DAY) AS churned_accounts,
+        churned_accounts / COUNT(*) AS churn_rate
+    FROM last_orders
+    GROUP BY as_of_date
+    ORDER BY as_of_date;
+    """
+    return query
+
+
+def plot21_query(region_choice, zoom_level=5, max_points=500):
+    # Past max_points accounts, accounts are aggregated into lat/long grid
+    # cells of 180 / 2^zoom_level degrees and each cell is drawn at its centroid
+    cell_degrees = 180 / 2 ** int(zoom_level)
+    query = f"""
+    WITH account_spend AS (
+        SELECT
+            a.id,
+            a.name,
+            a.lat,
+            a.long,
+            COUNT(o.id) AS total_orders,
+            COALESCE(SUM(o.total_amt_usd), 0) AS total_spend
+        FROM accounts a
+        LEFT JOIN orders o ON a.id = o.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+        GROUP BY a.id, a.name, a.lat, a.long
+    ),
+    binned AS (
+        SELECT
+            *,
+            CASE
+                WHEN total_orders > 20 THEN 'High Activity'
+                WHEN total_orders BETWEEN 10 AND 20 THEN 'Medium Activity'
+                ELSE 'Low Activity'
+            END AS activity_segment,
+            CASE WHEN COUNT(*) OVER () > {int(max_points)} THEN floor(lat / {cell_degrees}) END AS lat_bin,
+            CASE WHEN COUNT(*) OVER () > {int(max_points)} THEN floor(long / {cell_degrees}) END AS long_bin
+        FROM account_spend
+    )
+    SELECT
+        AVG(lat) AS lat,
+        AVG(long) AS long,
+        COUNT(*) AS accounts,
+        SUM(total_spend) AS total_spend,
+        CASE WHEN COUNT(*) = 1 THEN ANY_VALUE(name) ELSE COUNT(*) || ' accounts' END AS label,
+        mode(activity_segment) AS activity_segment
+    FROM binned
+    GROUP BY lat_bin, long_bin, CASE WHEN lat_bin IS NULL THEN id END
+    ORDER BY total_spend DESC;
+    """
+    return query
+
+
+ATTRIBUTION_TOUCHES = ('last', 'first')
+
+
+def plot22_query(region_choice, touch='last'):
+    # Each order is matched to the latest web event of its account at or
+    # before it (last touch) or to the account's first web event, provided
+    # that one precedes the order (first touch); other orders are unattributed
+    if touch not in ATTRIBUTION_TOUCHES:
+        raise ValueError(f"touch must be one of {ATTRIBUTION_TOUCHES}, not {touch!r}")
+    query = f"""
+    WITH touches AS (
+        SELECT
+            o.account_id,
+            o.total_amt_usd,
+            f.channel AS first_touch,
+            e.channel AS last_touch
+        FROM (SELECT account_id, CAST(occurred_at AS TIMESTAMP) AS ordered_at, total_amt_usd FROM orders) o
+        ASOF LEFT JOIN (SELECT account_id, CAST(occurred_at AS TIMESTAMP) AS event_at, channel FROM web_events) e
+            ON o.account_id = e.account_id AND o.ordered_at >= e.event_at
+        LEFT JOIN (
+            SELECT account_id, arg_min(channel, CAST(occurred_at AS TIMESTAMP)) AS channel
+            FROM web_events
+            GROUP BY account_id
+        ) f ON e.account_id = f.account_id
+    )
+    SELECT
+        r.name AS region_name,
+        COALESCE(t.{touch}_touch, 'unattributed') AS channel,
+        COUNT(*) AS orders,
+        SUM(t.total_amt_usd) AS revenue
+    FROM touches t
+    JOIN accounts a ON t.account_id = a.id
+    JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    JOIN region r ON sr.region_id = r.id
+    WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    GROUP BY r.name, COALESCE(t.{touch}_touch, 'unattributed')
+    ORDER BY region_name, revenue DESC;
+    """
+    return query
+
+
+PERCENTILE_GROUPS = ('region', 'sales_rep', 'segment', 'month')
+
+
+def plot23_query(region_choice, group_by='region', high_activity_orders=20, medium_activity_orders=10):
+    # Order value percentiles per region, sales rep, account activity segment or month
+    if group_by not in PERCENTILE_GROUPS:
+        raise ValueError(f"group_by must be one of {PERCENTILE_GROUPS}, not {group_by!r}")
+    group_columns = {
+        'region': "region_name",
+        'sales_rep': "sales_rep_name",
+        'segment': f"""CASE
+            WHEN order_count > {int(high_activity_orders)} THEN 'High Activity'
+            WHEN order_count BETWEEN {int(medium_activity_orders)} AND {int(high_activity_orders)} THEN 'Medium Activity'
+            ELSE 'Low Activity'
+        END""",
+        'month': "strftime(month, '%Y-%m')",
+    }
+    query = f"""
+    WITH account_orders AS (
+        SELECT
+            o.total_amt_usd,
+            date_trunc('month', CAST(o.occurred_at AS TIMESTAMP)) AS month,
+            r.name AS region_name,
+            sr.name AS sales_rep_name,
+            COUNT(*) OVER (PARTITION BY o.account_id) AS order_count
+        FROM orders o
+        JOIN accounts a ON o.account_id = a.id
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    )
+    SELECT
+        {group_columns[group_by]} AS group_value,
+        COUNT(*) AS orders,
+        quantile_disc(total_amt_usd, 0.5) AS p50,
+        quantile_disc(total_amt_usd, 0.9) AS p90,
+        quantile_disc(total_amt_usd, 0.99) AS p99
+    FROM account_orders
+    GROUP BY 1
+    ORDER BY group_value;
+    """
+    return query
+
+
+TIME_RESOLUTIONS = ('hour', 'day')
+
+
+def plot24_query(region_choice, resolution='day'):
+    # Orders and web events per channel in hourly or daily buckets, with empty buckets as zeros
+    if resolution not in TIME_RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {TIME_RESOLUTIONS}, not {resolution!r}")
+    query = f"""
+    WITH regional_accounts AS (
+        SELECT a.id
+        FROM accounts a
+        JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        JOIN region r ON sr.region_id = r.id
+        WHERE r.name = '{region_choice}' OR '{region_choice}' = 'All Regions'
+    ),
+    counts AS (
+        SELECT date_trunc('{resolution}', CAST(o.occurred_at AS TIMESTAMP)) AS bucket,
+               'orders' AS series,
+               COUNT(*) AS value
+        FROM orders o
+        JOIN regional_accounts ra ON o.account_id = ra.id
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT date_trunc('{resolution}', CAST(we.occurred_at AS TIMESTAMP)) AS bucket,
+               we.channel AS series,
+               COUNT(*) AS value
+        FROM web_events we
+        JOIN regional_accounts ra ON we.account_id = ra.id
+        GROUP BY 1, 2
+    ),
+    buckets AS (
+        SELECT range AS bucket
+        FROM range(
+            (SELECT MIN(bucket) FROM counts),
+            (SELECT MAX(bucket) FROM counts) + INTERVAL 1 {resolution},
+            INTERVAL 1 {resolution}
+        )
+    )
+    SELECT b.bucket, s.series, COALESCE(c.value, 0) AS value
+    FROM buckets b
+    CROSS JOIN (SELECT DISTINCT series FROM counts) s
+    LEFT JOIN counts c ON c.bucket = b.bucket AND c.series = s.series
+    ORDER BY s.series, b.bucket;
+    """
+    return query
+
+
+PLOT_QUERIES = {
+    'plot1': plot1_query,
+    'plot2': plot2_query,
+    'plot3': plot3_query,
+    'plot4': plot4_query,
+    'plot5': plot5_query,
+    'plot6': plot6_query,
+    'plot7': plot7_query,
+    'plot8': plot8_query,
+    'plot9': plot9_query,
+    'plot10': plot10_query,
+    'plot11': plot11_query,
+    'plot12': plot12_query,
+    'plot13': plot13_query,
+    'plot14': plot14_query,
+    'plot15': plot15_query,
+    'plot16': plot16_query,
+    'plot17': plot17_query,
+    'plot18': plot18_query,
+    'plot19': plot19_query,
+    'plot20': plot20_query,
+    'plot21': plot21_query,
+    'plot22': plot22_query,
+    'plot23': plot23_query,
+    'plot24': plot24_query,
+}
+
+PLOT_IDS = list(PLOT_QUERIES)
+
+PLOT_TITLES = {
+    'plot1': 'Total Sales Amount',
+    'plot2': 'Accounts by Sales Rep',
+    'plot3': 'Web Event Occurrences by Sales Rep and Channel',
+    'plot4': 'Customer Acquisition by Sales Rep',
+    'plot5': 'Average Order Size Across Regions',
+    'plot6': 'Order Size and Sales by Customer Segment',
+    'plot7': 'Unit Price for Orders with Quantity Conditions',
+    'plot8': 'Total Order Amount by Year',
+    'plot9': 'Customer Lifetime Value',
+    'plot10': 'Customer Churn',
+    'plot11': 'Web Event Effectiveness by Region and Channel',
+    'plot12': 'Sales Contribution by Sales Rep',
+    'plot13': 'Order Trends by Year and Month',
+    'plot14': 'Average Order Amounts by Account',
+    'plot15': 'Channel Effectiveness',
+    'plot16': 'Seasonal Sales Trends',
+    'plot17': 'Customer Segmentation by Frequency and Spend',
+    'plot18': 'Average Sales by Account Activity Segment',
+    'plot19': 'Cohort Retention by First Order Month',
+    'plot20': 'Customer Churn by Inactivity Window',
+    'plot21': 'Account Map by Spend and Segment',
+    'plot22': 'Revenue by Attributed Channel',
+    'plot23': 'Order Value Percentiles',
+    'plot24': 'Orders and Web Events Over Time',
+}
+
+
+# Tunable thresholds and options of the plots that take them, with their defaults
+PLOT_THRESHOLDS = {
+    'plot6': {'high_volume_orders': 50, 'moderate_volume_orders': 10, 'high_value_avg_usd': 1000},
+    'plot17': {'highly_active_rank': 3, 'moderately_active_rank': 10,
+               'high_spender_rank': 3, 'moderate_spender_rank': 10},
+    'plot18': {'high_activity_orders': 20, 'medium_activity_orders': 10},
+    'plot20': {'churn_window_days': 180},
+    'plot21': {'zoom_level': 5, 'max_points': 500},
+    'plot22': {'touch': 'last'},
+    'plot23': {'group_by': 'region', 'high_activity_orders': 20, 'medium_activity_orders': 10},
+    'plot24': {'resolution': 'day'},
+}
+
+# Inclusive (min, max) of every numeric threshold: the sidebar's bounds, also enforced by api.py
+THRESHOLD_RANGES = {
+    'plot6': {'high_volume_orders': (1, 200), 'moderate_volume_orders': (1, 200),
+              'high_value_avg_usd': (0, 100000)},
+    'plot17': {'highly_active_rank': (1, 50), 'moderately_active_rank': (1, 50),
+               'high_spender_rank': (1, 50), 'moderate_spender_rank': (1, 50)},
+    'plot18': {'high_activity_orders': (1, 100), 'medium_activity_orders': (1, 100)},
+    'plot20': {'churn_window_days': (1, 3650)},
+    'plot21': {'zoom_level': (1, 8), 'max_points': (1, 100000)},
+    'plot23': {'high_activity_orders': (1, 100), 'medium_activity_orders': (1, 100)},
+}
+
+
+def month_after(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def date_range_clause(date_range):
+    """Condition on ``occurred_at`` keeping the months in ``date_range`` (inclusive)."""
+    start, end = date_range
+    return f"occurred_at >= '{start:%Y-%m-%d}' AND occurred_at < '{month_after(end):%Y-%m-%d}'"
+
+
+def shadow_tables(query, ctes):
+    """Prepend ``ctes`` to ``query``, merging them into its WITH clause if it has one."""
+    ctes = ",\n".join(ctes)
+    query = query.strip()
+    if query[:4].upper() == 'WITH':
+        return f"WITH {ctes},\n{query[4:].lstrip()}"
+    return f"WITH {ctes}\n{query}"
+
+
+def with_date_range(query, date_range, schema='main'):
+    """Restrict ``query`` to the months in ``date_range`` (inclusive).
+
+    The fact tables are shadowed by CTEs of the same name that only keep rows
+    in range, so the plot's SQL itself does not change. ``schema`` holds the
+    tables the CTEs read from.
+    """
+    return shadow_tables(query, [
+        f"{table} AS (SELECT * FROM {schema}.{table} WHERE {date_range_clause(date_range)})"
+        for table in DATED_TABLES
+    ])
+
+
+def base_query(plot_id, region_choice, date_range=None, thresholds=None):
+    """The plot's own SQL, before its tables are restricted to ``date_range``.
+
+    ``thresholds`` overrides the plot's PLOT_THRESHOLDS.
+    """
+    if date_range is not None and plot_id == 'plot13':
+        return plot13_query(region_choice, years=None)
+    return PLOT_QUERIES[plot_id](region_choice, **(thresholds or {}))
+
+
+def plot_query(plot_id, region_choice, date_range=None, thresholds=None, schema='main'):
+    """SQL for a plot, optionally restricted to a ``(start, end)`` month range."""
+    query = base_query(plot_id, region_choice, date_range, thresholds)
+    return query if date_range is None else with_date_range(query, date_range, schema)
@@ -0,0 +1,212 @@
+"""Query-plan capture and plan regression detection for the plot queries.
+
+``capture`` runs ``EXPLAIN (ANALYZE, FORMAT JSON)`` on the SQL of every plot
+and stores, per plot and region, the operator tree flattened into operator
+type, timing, cardinality, rows scanned, the tables scanned with the filters
+pushed into them, and the kind of every join (hash, nested loop, as-of,
+index...). Plans are written as ``plans/<commit>.json``:
+
+    python query_plans.py capture
+    python query_plans.py capture --regions "All Regions" West --repeat 5
+
+``compare`` flags plots whose plan shape changed between two captures,
+including joins that changed kind and filters no longer pushed into a
+scan, and plots whose latency or row counts grew past a threshold:
+
+    python query_plans.py compare plans/1a2b3c4.json plans/5d6e7f8.json
+
+The exit status of ``compare`` is non-zero if any plan was flagged.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+import duckdb
+
+import datastore
+from queries import ALL_REGIONS, PLOT_IDS, plot_query
+
+PLANS_DIR = os.path.join(datastore.DATA_DIR, 'plans')
+
+JOIN_OPERATORS = ('HASH_JOIN', 'NESTED_LOOP_JOIN', 'PIECEWISE_MERGE_JOIN', 'ASOF_JOIN', 'INDEX_JOIN',
+                  'CROSS_PRODUCT', 'POSITIONAL_JOIN', 'IEJOIN', 'BLOCKWISE_NL_JOIN')
+
+
+def commit_id():
+    """The checked out commit, marked dirty if the tree has changes; ``None`` outside git."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=datastore.DATA_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _operators(node, path='0'):
+    """The operator tree under ``node`` flattened in pre-order."""
+    operators = []
+    operator_type = node.get('operator_type')
+    if operator_type and operator_type != 'EXPLAIN_ANALYZE':
+        extra = node.get('extra_info', {})
+        operator = {
+            'path': path,
+            'type': operator_type,
+            'timing_s': node.get('operator_timing', 0.0),
+            'cardinality': node.get('operator_cardinality', 0),
+            'rows_scanned': node.get('operator_rows_scanned', 0),
+        }
+        if operator_type.endswith('SCAN'):
+            operator['table'] = extra.get('Text') or extra.get('Table') or extra.get('Name')
+            filters = extra.get('Filters') or []
+            operator['filters'] = filters.splitlines() if isinstance(filters, str) else list(filters)
+            operator['scan_type'] = extra.get('Type')
+        if operator_type in JOIN_OPERATORS:
+            operator['join_type'] = extra.get('Join Type')
+            operator['conditions'] = extra.get('Conditions')
+        operators.append(operator)
+    for index, child in enumerate(node.get('children', [])):
+        operators.extend(_operators(child, f'{path}.{index}'))
+    return operators
+
+
+def _shape(operators):
+    """Operator types, tables, join kinds and pushed-down filters, in plan order."""
+    shape = []
+    for operator in operators:
+        step = operator['type']
+        if operator.get('table'):
+            step += f"[{operator['table']}{'|filtered' if operator.get('filters') else ''}]"
+        if operator.get('join_type'):
+            step += f"[{operator['join_type']}]"
+        shape.append(f"{operator['path']}:{step}")
+    return shape
+
+
+def profile_query(con, query, repeat=3):
+    """Plan profile of ``query``, from the fastest of ``repeat`` analyzed runs."""
+    best = None
+    for _ in range(repeat):
+        cursor = con.cursor()
+        try:
+            started = time.perf_counter()
+            rows = cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}").fetchall()
+            latency = time.perf_counter() - started
+        finally:
+            cursor.close()
+        if best is None or latency < best[0]:
+            best = (latency, json.loads(rows[0][1]))
+    latency, plan = best
+    operators = _operators(plan)
+    return {
+        'latency_s': latency,
+        'rows': operators[0]['cardinality'] if operators else 0,
+        'total_cardinality': sum(operator['cardinality'] for operator in operators),
+        'joins': sorted(operator['type'] for operator in operators if operator['type'] in JOIN_OPERATORS),
+        'index_scans': sum(1 for operator in operators if operator.get('scan_type') == 'Index Scan'),
+        'shape': _shape(operators),
+        'operators': operators,
+    }
+
+
+def capture(con, plot_ids=PLOT_IDS, regions=(ALL_REGIONS,), repeat=3):
+    """Plan profiles of every plot query for every region."""
+    return {
+        'commit': commit_id(),
+        'captured_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'duckdb_version': duckdb.__version__,
+        'plots': {
+            plot_id: {region: profile_query(con, plot_query(plot_id, region), repeat) for region in regions}
+            for plot_id in plot_ids
+        },
+    }
+
+
+def _pushed_filters(profile):
+    """Table -> filters pushed into its scans."""
+    filters = {}
+    for operator in profile['operators']:
+        if operator.get('filters'):
+            filters.setdefault(operator['table'], set()).update(operator['filters'])
+    return filters
+
+
+def compare(old, new, cost_ratio=2.0, min_latency_ms=5.0):
+    """Findings for every plot and region whose plan shape or cost changed significantly."""
+    findings = []
+    for plot_id, regions in new['plots'].items():
+        for region, after in regions.items():
+            before = old['plots'].get(plot_id, {}).get(region)
+            if before is None:
+                continue
+            notes = []
+            if before['shape'] != after['shape']:
+                changed = next((f"{b} -> {a}" for b, a in zip(before['shape'], after['shape']) if b != a),
+                               f"{len(before['shape'])} -> {len(after['shape'])} operators")
+                notes.append(f"plan shape changed ({changed})")
+            if before['joins'] != after['joins']:
+                notes.append(f"joins {before['joins']} -> {after['joins']}")
+            pushed = _pushed_filters(after)
+            for table, filters in sorted(_pushed_filters(before).items()):
+                lost = filters - pushed.get(table, set())
+                if lost:
+                    notes.append(f"no longer pushed into the {table} scan: {', '.join(sorted(lost))}")
+            if after['index_scans'] < before['index_scans']:
+                notes.append(f"index scans {before['index_scans']} -> {after['index_scans']}")
+            latency_ms = after['latency_s'] * 1000
+            if (latency_ms - before['latency_s'] * 1000 >= min_latency_ms
+                    and after['latency_s'] > cost_ratio * before['latency_s']):
+                notes.append(f"latency {before['latency_s'] * 1000:.1f} -> {latency_ms:.1f} ms")
+            if after['total_cardinality'] > cost_ratio * max(before['total_cardinality'], 1):
+                notes.append(f"rows through operators {before['total_cardinality']} -> {after['total_cardinality']}")
+            if notes:
+                findings.append({'plot_id': plot_id, 'region': region, 'notes': notes})
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    capture_parser = commands.add_parser('capture', help='Profile every plot query and write the plans')
+    capture_parser.add_argument('--out', help='Output file (default: plans/<commit>.json)')
+    capture_parser.add_argument('--data-dir', default=datastore.DATA_DIR, help='Directory holding the source CSVs')
+    capture_parser.add_argument('--plots', nargs='+', default=PLOT_IDS, help='Plot ids to profile (default: all)')
+    capture_parser.add_argument('--regions', nargs='+', default=[ALL_REGIONS], help='Region choices to profile')
+    capture_parser.add_argument('--repeat', type=int, default=3, help='Analyzed runs per query; the fastest is kept')
+    compare_parser = commands.add_parser('compare', help='Flag plans that changed between two captures')
+    compare_parser.add_argument('old', help='Baseline capture')
+    compare_parser.add_argument('new', help='Capture to check')
+    compare_parser.add_argument('--ratio', type=float, default=2.0,
+                                help='Growth of latency or row counts that is flagged')
+    compare_parser.add_argument('--min-latency-ms', type=float, default=5.0,
+                                help='Latency growth below this is never flagged')
+    args = parser.parse_args(argv)
+
+    if args.command == 'capture':
+        con = datastore.open_database(args.data_dir)
+        plans = capture(con, args.plots, args.regions, args.repeat)
+        out = args.out or os.path.join(PLANS_DIR, f"{plans['commit'] or 'working-tree'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(plans, f, indent=2)
+        print(f"wrote {sum(len(regions) for regions in plans['plots'].values())} plans to {out}")
+        return 0
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    findings = compare(old, new, args.ratio, args.min_latency_ms)
+    for finding in findings:
+        print(f"{finding['plot_id']} {finding['region']}:")
+        for note in finding['notes']:
+            print(f"    {note}")
+    print(f"{len(findings)} plans flagged between {old.get('commit')} and {new.get('commit')}")
+    return 1 if findings else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Headless batch renderer for the dashboard charts.
+
+Renders every plot for every region into a static report bundle without
+Streamlit:
+
+    python report.py --out reports/2025-01-31 --formats html,json
+
+Work is fanned out over a process pool, one task per (region, plot). The
+data comes from the same source as the dashboard's (``--source`` or
+``SALES_DASHBOARD_SOURCE``, else the CSVs in ``--data-dir``; see
+sources.py), and plot results go through the shared result cache (see
+result_cache.py) under that source's data version, so a run against a warm
+cache skips DuckDB entirely and only pays for rendering. PNG output needs
+the optional ``kaleido`` package.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import datastore
+import result_cache
+import sources
+from queries import ALL_REGIONS, PLOT_IDS, region_slug
+
+FORMATS = ('html', 'json', 'png')
+DEFAULT_CACHE_DIR = os.path.join(datastore.DATA_DIR, '.plot_cache')
+PLOTLY_JS = 'plotly.min.js'
+
+# Per-process state, set up once by _init_worker
+_worker = {}
+
+
+def default_cache_url():
+    # An in-process memory cache would not survive across pool workers or runs
+    url = os.environ.get(result_cache.CACHE_ENV_VAR, '')
+    if not url or url.startswith('memory://'):
+        return 'file://' + DEFAULT_CACHE_DIR
+    return url
+
+
+def make_source(source_url=None, data_dir=datastore.DATA_DIR):
+    """The source at ``source_url`` or ``SALES_DASHBOARD_SOURCE``, else the CSVs in ``data_dir``."""
+    url = source_url or os.environ.get(sources.SOURCE_ENV_VAR)
+    return sources.from_url(url) if url else sources.CsvSource(data_dir)
+
+
+def _init_worker(source_url, data_dir, cache_url, version):
+    _worker['source'] = make_source(source_url, data_dir)
+    _worker['cache'] = result_cache.from_url(cache_url)
+    # Read once by build_report, so every worker and the manifest agree on it
+    _worker['version'] = version
+    _worker['con'] = None
+
+
+def _connection():
+    # Only load the source tables when a worker actually misses the cache
+    if _worker['con'] is None:
+        _worker['con'] = _worker['source'].open_database()
+    return _worker['con']
+
+
+class _LazyConnection:
+    def cursor(self):
+        return _connection().cursor()
+
+
+def render_plot(region_choice, plot_id, out_dir, formats):
+    """Render one plot for one region and return its manifest entry."""
+    from figures import BACKGROUND, build_figure
+
+    started = time.perf_counter()
+    data = _worker['source'].fetch_plot_data(
+        _LazyConnection(), plot_id, region_choice, _worker['cache'], _worker['version']
+    )
+    query_seconds = time.perf_counter() - started
+
+    fig = build_figure(plot_id, data, region_choice)
+    # The template's white text is drawn on the page background the dashboard gives it
+    fig.update_layout(paper_bgcolor=BACKGROUND)
+    region_dir = os.path.join(out_dir, region_slug(region_choice))
+    os.makedirs(region_dir, exist_ok=True)
+    files = []
+    if 'html' in formats:
+        path = os.path.join(region_dir, f'{plot_id}.html')
+        fig.write_html(path, include_plotlyjs=f'../{PLOTLY_JS}', full_html=True)
+        files.append(path)
+    if 'json' in formats:
+        path = os.path.join(region_dir, f'{plot_id}.json')
+        fig.write_json(path)
+        files.append(path)
+    if 'png' in formats:
+        path = os.path.join(region_dir, f'{plot_id}.png')
+        fig.write_image(path)
+        files.append(path)
+
+    return {
+        'region': region_choice,
+        'plot_id': plot_id,
+        'rows': len(data),
+        'query_seconds': round(query_seconds, 4),
+        'total_seconds': round(time.perf_counter() - started, 4),
+        'files': [os.path.relpath(path, out_dir) for path in files],
+    }
+
+
+def write_index(out_dir, entries):
+    by_region = {}
+    for entry in entries:
+        by_region.setdefault(entry['region'], []).append(entry)
+    sections = []
+    for region_choice, region_entries in by_region.items():
+        links = ''.join(
+            f"<li><a href='{entry['files'][0]}'>{entry['plot_id']}</a></li>"
+            for entry in sorted(region_entries, key=lambda e: PLOT_IDS.index(e['plot_id']))
+            if entry['files']
+        )
+        sections.append(f"<h2>{region_choice}</h2><ul>{links}</ul>")
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write("<html><head><title>Sales Metrics Report</title></head><body>"
+                "<h1>Sales Metrics Report</h1>" + ''.join(sections) + "</body></html>")
+
+
+def build_report(out_dir, regions=None, plot_ids=None, formats=('html', 'json'),
+                 workers=None, data_dir=datastore.DATA_DIR, cache_url=None, source_url=None):
+    """Render ``plot_ids`` for ``regions`` into ``out_dir`` and return the manifest."""
+    source = make_source(source_url, data_dir)
+    version = source.version()
+    if regions is None:
+        regions = [ALL_REGIONS] + source.region_names()
+    plot_ids = plot_ids or PLOT_IDS
+    cache_url = cache_url or default_cache_url()
+    if 'png' in formats:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError as exc:
+            raise SystemExit("PNG output needs the 'kaleido' package: pip install kaleido") from exc
+
+    os.makedirs(out_dir, exist_ok=True)
+    if 'html' in formats:
+        from plotly.offline import get_plotlyjs
+        with open(os.path.join(out_dir, PLOTLY_JS), 'w') as f:
+            f.write(get_plotlyjs())
+
+    started = time.perf_counter()
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(source_url, data_dir, cache_url, version)) as pool:
+        futures = [
+            pool.submit(render_plot, region_choice, plot_id, out_dir, formats)
+            for region_choice in regions
+            for plot_id in plot_ids
+        ]
+        for future in as_completed(futures):
+            entries.append(future.result())
+
+    manifest = {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'data_version': version,
+        'formats': list(formats),
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+        'plots': sorted(entries, key=lambda e: (e['region'], PLOT_IDS.index(e['plot_id']))),
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if 'html' in formats:
+        write_index(out_dir, manifest['plots'])
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=os.path.join('reports', datetime.date.today().isoformat()),
+                        help='Output directory for the report bundle')
+    parser.add_argument('--regions', nargs='+', help='Regions to render (default: all, plus All Regions)')
+    parser.add_argument('--plots', nargs='+', choices=PLOT_IDS, help='Plots to render (default: all)')
+    parser.add_argument('--formats', default='html,json',
+                        help=f"Comma-separated output formats from {', '.join(FORMATS)}")
+    parser.add_argument('--workers', type=int, help='Process pool size (default: CPU count)')
+    parser.add_argument('--data-dir', default=datastore.DATA_DIR, help='Directory holding the source CSVs')
+    parser.add_argument('--source', help=f'Source URL (default: ${sources.SOURCE_ENV_VAR}, else the CSVs)')
+    parser.add_argument('--cache', help=f'Result cache URL (default: ${result_cache.CACHE_ENV_VAR} '
+                                        f'or file://{DEFAULT_CACHE_DIR})')
+    args = parser.parse_args(argv)
+
+    formats = tuple(fmt.strip() for fmt in args.formats.split(',') if fmt.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+
+    manifest = build_report(args.out, args.regions, args.plots, formats,
+                            args.workers, args.data_dir, args.cache, args.source)
+    print(f"Rendered {len(manifest['plots'])} plots to {args.out} "
+          f"in {manifest['elapsed_seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
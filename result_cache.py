@@ -0,0 +1,175 @@
+"""Second-level result cache shared between dashboard replicas.
+
+Plot results are stored as Arrow/Parquet bytes keyed by plot id, region and
+data version, so a result computed by one replica can be served by all the
+others. The backend is picked from the ``SALES_DASHBOARD_CACHE`` environment
+variable:
+
+    memory://                      in-process dict (default, local testing)
+    file:///mnt/shared/plot-cache  Parquet files on a shared volume
+    redis://host:6379/0            any Redis-compatible server
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+
+import pandas as pd
+
+CACHE_ENV_VAR = "SALES_DASHBOARD_CACHE"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+_version_lock = threading.Lock()
+_version_memo = {}
+
+
+def data_version(paths):
+    """Content hash of the source files.
+
+    Hashing content rather than mtimes keeps the version identical across
+    replicas that received the same files at different times. Hashes are
+    memoized per (path, size, mtime) so unchanged files are read only once.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with _version_lock:
+            file_hash = _version_memo.get(memo_key)
+        if file_hash is None:
+            file_digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    file_digest.update(chunk)
+            file_hash = file_digest.hexdigest()
+            with _version_lock:
+                _version_memo[memo_key] = file_hash
+        digest.update(os.path.basename(path).encode())
+        digest.update(file_hash.encode())
+    return digest.hexdigest()[:16]
+
+
+def make_key(plot_id, region_choice, version, query=""):
+    """Build a cache key from plot id, region and data version.
+
+    The query text is folded into the key as a short digest so a deploy that
+    edits a plot's SQL never serves results computed by the old SQL.
+    """
+    region_slug = re.sub(r"[^A-Za-z0-9]+", "-", region_choice).strip("-").lower()
+    query_hash = hashlib.sha1(query.encode()).hexdigest()[:8]
+    return f"{plot_id}/{region_slug}/{version}-{query_hash}"
+
+
+def _to_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, engine="pyarrow", index=False)
+    return buffer.getvalue()
+
+
+def _from_bytes(payload):
+    return pd.read_parquet(io.BytesIO(payload), engine="pyarrow")
+
+
+class ResultCache:
+    """Interface for the second-level cache backends."""
+
+    def get(self, key):
+        """Return the cached DataFrame for ``key`` or ``None`` on a miss."""
+        payload = self.get_bytes(key)
+        return None if payload is None else _from_bytes(payload)
+
+    def set(self, key, df):
+        self.set_bytes(key, _to_bytes(df))
+
+    def get_bytes(self, key):
+        raise NotImplementedError
+
+    def set_bytes(self, key, payload):
+        raise NotImplementedError
+
+
+class MemoryResultCache(ResultCache):
+    """In-process stand-in; values go through the same Parquet round trip."""
+
+    def __init__(self):
+        self._store = {}
+        self._lock = threading.Lock()
+
+    def get_bytes(self, key):
+        with self._lock:
+            return self._store.get(key)
+
+    def set_bytes(self, key, payload):
+        with self._lock:
+            self._store[key] = payload
+
+
+class ParquetResultCache(ResultCache):
+    """One Parquet file per key under a directory on a shared volume."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/")) + ".parquet"
+
+    def get_bytes(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set_bytes(self, key, payload):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers on other replicas never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+class RedisResultCache(ResultCache):
+    """Redis-compatible backend; needs the optional ``redis`` package."""
+
+    def __init__(self, url, ttl=DEFAULT_TTL_SECONDS, prefix="sales-dashboard:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImportError(
+                "The redis backend needs the 'redis' package: pip install redis"
+            ) from exc
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get_bytes(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set_bytes(self, key, payload):
+        self.client.set(self.prefix + key, payload, ex=self.ttl)
+
+
+def from_url(url=None):
+    """Create a backend from a cache URL, falling back to the environment."""
+    url = url or os.environ.get(CACHE_ENV_VAR) or "memory://"
+    if url.startswith("memory://"):
+        return MemoryResultCache()
+    if url.startswith("file://"):
+        return ParquetResultCache(url[len("file://"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisResultCache(url)
+    raise ValueError(f"Unsupported {CACHE_ENV_VAR} value: {url!r}")
+
+
+def cached_query(cache, key, compute):
+    """Return ``cache[key]``, computing and storing it on a miss."""
+    df = cache.get(key)
+    if df is None:
+        df = compute()
+        cache.set(key, df)
+    return df
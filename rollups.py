@@ -0,0 +1,426 @@
+"""Monthly partial aggregates behind the date-range filter.
+
+``orders_monthly`` holds one row per account and month with the order count,
+sum, sum of squares, min and max of ``total_amt_usd`` plus the product
+amount sums and first/last order times; ``web_events_monthly`` holds event
+counts per account, channel and month. Both are built when the data is
+loaded and merged into on append. Every plot that aggregates orders or web
+events is answered from them, so moving the date range combines a few dozen
+monthly buckets per account instead of rescanning the fact tables.
+
+Executors mirror the reference SQL in queries.py column for column,
+including its join and NULL semantics.
+"""
+
+from crossfilter import compile_ctes
+from queries import ALL_REGIONS, PLOT_THRESHOLDS
+
+ORDERS_ROLLUP = 'orders_monthly'
+WEB_EVENTS_ROLLUP = 'web_events_monthly'
+
+_ORDERS_ROLLUP_QUERY = """
+SELECT account_id,
+       date_trunc('month', CAST(occurred_at AS TIMESTAMP)) AS month,
+       COUNT(*) AS orders,
+       SUM(total_amt_usd) AS total_amt_usd_sum,
+       SUM(total_amt_usd * total_amt_usd) AS total_amt_usd_sumsq,
+       MIN(total_amt_usd) AS total_amt_usd_min,
+       MAX(total_amt_usd) AS total_amt_usd_max,
+       SUM(standard_amt_usd) AS standard_amt_usd_sum,
+       SUM(gloss_amt_usd) AS gloss_amt_usd_sum,
+       SUM(poster_amt_usd) AS poster_amt_usd_sum,
+       MIN(CAST(occurred_at AS TIMESTAMP)) AS first_order_at,
+       MAX(CAST(occurred_at AS TIMESTAMP)) AS last_order_at
+FROM {source}
+GROUP BY ALL
+"""
+
+_ORDERS_MERGE = {
+    'orders': 'SUM',
+    'total_amt_usd_sum': 'SUM',
+    'total_amt_usd_sumsq': 'SUM',
+    'total_amt_usd_min': 'MIN',
+    'total_amt_usd_max': 'MAX',
+    'standard_amt_usd_sum': 'SUM',
+    'gloss_amt_usd_sum': 'SUM',
+    'poster_amt_usd_sum': 'SUM',
+    'first_order_at': 'MIN',
+    'last_order_at': 'MAX',
+}
+
+_WEB_EVENTS_ROLLUP_QUERY = """
+SELECT account_id,
+       channel,
+       date_trunc('month', CAST(occurred_at AS TIMESTAMP)) AS month,
+       COUNT(*) AS events
+FROM {source}
+GROUP BY ALL
+"""
+
+_REGION_JOIN = """
+JOIN accounts a ON o.account_id = a.id
+JOIN sales_reps sr ON a.sales_rep_id = sr.id
+JOIN region r ON sr.region_id = r.id
+"""
+
+
+def enabled():
+    return True
+
+
+def cache_tag():
+    return 'monthly'
+
+
+def is_built(con):
+    return bool(con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [ORDERS_ROLLUP]
+    ).fetchone()[0])
+
+
+def build(con):
+    con.execute(f"CREATE OR REPLACE TABLE {ORDERS_ROLLUP} AS "
+                f"{_ORDERS_ROLLUP_QUERY.format(source='orders')} ORDER BY month, account_id")
+    con.execute(f"CREATE OR REPLACE TABLE {WEB_EVENTS_ROLLUP} AS "
+                f"{_WEB_EVENTS_ROLLUP_QUERY.format(source='web_events')} ORDER BY month, account_id")
+
+
+def _merge(con, rollup, keys, merges, rollup_query, rows):
+    """Fold the buckets of newly appended ``rows`` into ``rollup``."""
+    key_match = " AND ".join(f"r.{key} IS NOT DISTINCT FROM d.{key}" for key in keys)
+    merged = ", ".join(f"{fn}({column}) AS {column}" for column, fn in merges.items())
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_rows', rows)
+        cursor.execute(f"CREATE TEMP TABLE _rollup_delta AS {rollup_query.format(source='_new_rows')}")
+        cursor.unregister('_new_rows')
+        cursor.execute(f"""
+        CREATE TEMP TABLE _rollup_merged AS
+        SELECT {', '.join(keys)}, {merged}
+        FROM (
+            SELECT r.* FROM {rollup} r SEMI JOIN _rollup_delta d ON {key_match}
+            UNION ALL BY NAME
+            SELECT * FROM _rollup_delta
+        )
+        GROUP BY ALL
+        """)
+        cursor.execute(f"DELETE FROM {rollup} r USING _rollup_delta d WHERE {key_match}")
+        cursor.execute(f"INSERT INTO {rollup} BY NAME SELECT * FROM _rollup_merged")
+        cursor.execute("DROP TABLE _rollup_delta")
+        cursor.execute("DROP TABLE _rollup_merged")
+    finally:
+        cursor.close()
+
+
+def update(con, table, rows):
+    """Merge newly appended orders or web events into the monthly buckets."""
+    if not is_built(con):
+        return
+    if table == 'orders':
+        _merge(con, ORDERS_ROLLUP, ['account_id', 'month'], _ORDERS_MERGE, _ORDERS_ROLLUP_QUERY, rows)
+    elif table == 'web_events':
+        _merge(con, WEB_EVENTS_ROLLUP, ['account_id', 'channel', 'month'], {'events': 'SUM'},
+               _WEB_EVENTS_ROLLUP_QUERY, rows)
+
+
+def _buckets(date_range, filters):
+    """CTEs selecting the monthly buckets in range and in ``filters`` as ``om`` and ``wm``."""
+    ctes, params = compile_ctes(filters, date_range, (ORDERS_ROLLUP, WEB_EVENTS_ROLLUP))
+    return "WITH " + ",\n".join(ctes) + "\n", params
+
+
+def _run(con, buckets, query, region_choice):
+    """Run ``query`` after the ``buckets`` CTEs, binding the region when filtered."""
+    prefix, params = buckets
+    if region_choice != ALL_REGIONS:
+        params = params + [region_choice]
+    cursor = con.cursor()
+    try:
+        return cursor.execute(prefix + query, params).df()
+    finally:
+        cursor.close()
+
+
+def query_buckets(con, query, region_choice, date_range=None, filters=None):
+    """Run ``query`` over the ``om`` and ``wm`` buckets in range and in ``filters``.
+
+    ``query`` may hold one ``?`` placeholder, bound to the region when one is chosen.
+    """
+    return _run(con, _buckets(date_range, filters), query, region_choice)
+
+
+def _region_where(region_choice, keyword='WHERE'):
+    return "" if region_choice == ALL_REGIONS else f"{keyword} r.name = ?"
+
+
+def plot1_data(con, region_choice, date_range=None, filters=None):
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT r.name AS region_name,
+           SUM(o.total_amt_usd_sum) AS total_sales
+    FROM om o
+    {_REGION_JOIN}
+    {_region_where(region_choice)}
+    GROUP BY r.name
+    ORDER BY total_sales DESC
+    """, region_choice)
+
+
+def plot3_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else "JOIN region r ON sr.region_id = r.id"
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT sr.name AS sales_rep_name,
+           w.channel,
+           CAST(SUM(w.events) AS BIGINT) AS number_of_occurrences
+    FROM wm w
+    JOIN accounts a ON w.account_id = a.id
+    JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    {region_join}
+    {_region_where(region_choice)}
+    GROUP BY sr.name, w.channel
+    ORDER BY number_of_occurrences DESC
+    """, region_choice)
+
+
+def plot4_data(con, region_choice, date_range=None, filters=None):
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT sr.name AS sales_representative,
+           COUNT(DISTINCT a.id) AS new_customers_acquired,
+           EXTRACT(YEAR FROM MIN(o.first_order_at)) AS first_order_year
+    FROM sales_reps sr
+    LEFT JOIN accounts a ON sr.id = a.sales_rep_id
+    LEFT JOIN om o ON a.id = o.account_id
+    LEFT JOIN region r ON sr.region_id = r.id
+    {_region_where(region_choice)}
+    GROUP BY sr.name
+    ORDER BY new_customers_acquired DESC
+    """, region_choice)
+
+
+def plot5_data(con, region_choice, date_range=None, filters=None):
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT r.name AS region_name,
+           SUM(o.total_amt_usd_sum) / SUM(o.orders) AS avg_order_size
+    FROM om o
+    {_REGION_JOIN}
+    {_region_where(region_choice)}
+    GROUP BY r.name
+    ORDER BY avg_order_size DESC
+    """, region_choice)
+
+
+def account_metrics(con, region_choice, date_range=None, filters=None):
+    """Per-account order count, spend, average and standard deviation in range.
+
+    Accounts without orders keep NULL amounts and a zero count, like the LEFT
+    JOIN in the segmentation plots' SQL. The standard deviation is recovered
+    from the bucket sums of squares.
+    """
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT a.id AS account_id,
+           a.name AS account_name,
+           r.name AS region_name,
+           CAST(COALESCE(SUM(o.orders), 0) AS BIGINT) AS total_orders,
+           SUM(o.total_amt_usd_sum) AS total_sales,
+           SUM(o.total_amt_usd_sum) / SUM(o.orders) AS avg_order_amt_usd,
+           CASE WHEN SUM(o.orders) > 1 THEN sqrt(greatest(
+               (SUM(o.total_amt_usd_sumsq) - SUM(o.total_amt_usd_sum) ^ 2 / SUM(o.orders)) / (SUM(o.orders) - 1),
+               0)) END AS order_amt_std_dev
+    FROM accounts a
+    LEFT JOIN om o ON a.id = o.account_id
+    LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    LEFT JOIN region r ON sr.region_id = r.id
+    {_region_where(region_choice)}
+    GROUP BY a.id, a.name, r.name
+    """, region_choice)
+
+
+def plot8_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else _REGION_JOIN
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT CAST(EXTRACT(YEAR FROM o.month) AS INT) AS year,
+           SUM(o.total_amt_usd_sum) AS total_usd
+    FROM om o
+    {region_join}
+    {_region_where(region_choice)}
+    GROUP BY year
+    ORDER BY total_usd ASC
+    """, region_choice)
+
+
+def plot9_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else (
+        "JOIN sales_reps sr ON a.sales_rep_id = sr.id JOIN region r ON sr.region_id = r.id")
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT a.id AS account_id,
+           a.name AS account_name,
+           SUM(o.total_amt_usd_sum) AS total_spent,
+           CAST(COALESCE(SUM(o.orders), 0) AS BIGINT) AS total_orders,
+           SUM(o.total_amt_usd_sum) / SUM(o.orders) AS average_order_amount
+    FROM accounts a
+    LEFT JOIN om o ON a.id = o.account_id
+    {region_join}
+    {_region_where(region_choice)}
+    GROUP BY a.id, a.name
+    ORDER BY total_spent DESC
+    """, region_choice)
+
+
+def plot10_data(con, region_choice, date_range=None, filters=None):
+    return _run(con, _buckets(date_range, filters), f"""
+    , last_order_dates AS (
+        SELECT account_id, MAX(last_order_at) AS last_order_date
+        FROM om
+        GROUP BY account_id
+    )
+    SELECT
+        COUNT(DISTINCT l.account_id) AS active_customers,
+        COUNT(DISTINCT a.id) - COUNT(DISTINCT l.account_id) AS churned_customers
+    FROM accounts a
+    LEFT JOIN last_order_dates l ON a.id = l.account_id
+    LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+    LEFT JOIN region r ON sr.region_id = r.id
+    {_region_where(region_choice)}
+    """, region_choice)
+
+
+def plot12_data(con, region_choice, date_range=None, filters=None):
+    region_where = "" if region_choice == ALL_REGIONS else "WHERE sc.region_name = ?"
+    return _run(con, _buckets(date_range, filters), f"""
+    , sales_contribution AS (
+        SELECT r.name AS region_name,
+               sr.name AS sales_representative,
+               CAST(SUM(o.orders) AS BIGINT) AS num_orders,
+               SUM(o.total_amt_usd_sum) AS total_amt_usd
+        FROM sales_reps sr
+        JOIN accounts a ON sr.id = a.sales_rep_id
+        JOIN om o ON a.id = o.account_id
+        JOIN region r ON sr.region_id = r.id
+        GROUP BY r.name, sr.name
+    ),
+    region_total_sales AS (
+        SELECT region_name, SUM(total_amt_usd) AS region_total_amt_usd
+        FROM sales_contribution
+        GROUP BY region_name
+    )
+    SELECT sc.region_name,
+           sc.sales_representative,
+           sc.num_orders,
+           sc.total_amt_usd,
+           rt.region_total_amt_usd,
+           ROUND(sc.total_amt_usd / rt.region_total_amt_usd * 100, 2) AS contribution_percent_of_region
+    FROM sales_contribution sc
+    JOIN region_total_sales rt ON sc.region_name = rt.region_name
+    {region_where}
+    ORDER BY sc.region_name, contribution_percent_of_region DESC
+    """, region_choice)
+
+
+# The buckets carry their own ``month`` column, so the plots that output a
+# month number group and sort by position rather than by name
+
+def plot13_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else _REGION_JOIN
+    # Without a date range the plot keeps its fixed comparison years
+    clauses = ["year(o.month) IN (2013, 2017)"] if date_range is None else []
+    if region_choice != ALL_REGIONS:
+        clauses.append("r.name = ?")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT CAST(EXTRACT(YEAR FROM o.month) AS INT) AS year,
+           CAST(EXTRACT(MONTH FROM o.month) AS INT) AS month,
+           SUM(o.total_amt_usd_sum) AS total_usd,
+           SUM(o.total_amt_usd_sum) / SUM(o.orders) AS avg_order_amt,
+           CAST(SUM(o.orders) AS BIGINT) AS total_orders,
+           MAX(o.total_amt_usd_max) AS max_order_amt
+    FROM om o
+    {region_join}
+    {where}
+    GROUP BY 1, 2
+    ORDER BY year ASC, 2 ASC
+    """, region_choice)
+
+
+def plot14_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else (
+        "JOIN sales_reps sr ON a.sales_rep_id = sr.id JOIN region r ON sr.region_id = r.id")
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT a.name AS account_name,
+           SUM(o.standard_amt_usd_sum) / SUM(o.orders) AS avg_standard_amt_usd,
+           SUM(o.gloss_amt_usd_sum) / SUM(o.orders) AS avg_gloss_amt_usd,
+           SUM(o.poster_amt_usd_sum) / SUM(o.orders) AS avg_poster_amt_usd
+    FROM accounts a
+    JOIN om o ON a.id = o.account_id
+    {region_join}
+    {_region_where(region_choice)}
+    GROUP BY a.name
+    """, region_choice)
+
+
+def plot16_data(con, region_choice, date_range=None, filters=None):
+    region_join = "" if region_choice == ALL_REGIONS else _REGION_JOIN
+    return _run(con, _buckets(date_range, filters), f"""
+    SELECT EXTRACT(MONTH FROM o.month) AS month,
+           SUM(o.total_amt_usd_sum) AS total_sales
+    FROM om o
+    {region_join}
+    {_region_where(region_choice)}
+    GROUP BY 1
+    ORDER BY 1
+    """, region_choice)
+
+
+def plot21_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    thresholds = {**PLOT_THRESHOLDS['plot21'], **(thresholds or {})}
+    cell_degrees = 180 / 2 ** int(thresholds['zoom_level'])
+    max_points = int(thresholds['max_points'])
+    return _run(con, _buckets(date_range, filters), f"""
+    , account_spend AS (
+        SELECT a.id, a.name, a.lat, a.long,
+               COALESCE(SUM(o.orders), 0) AS total_orders,
+               COALESCE(SUM(o.total_amt_usd_sum), 0) AS total_spend
+        FROM accounts a
+        LEFT JOIN om o ON a.id = o.account_id
+        LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+        LEFT JOIN region r ON sr.region_id = r.id
+        {_region_where(region_choice)}
+        GROUP BY a.id, a.name, a.lat, a.long
+    ),
+    binned AS (
+        SELECT *,
+            CASE
+                WHEN total_orders > 20 THEN 'High Activity'
+                WHEN total_orders BETWEEN 10 AND 20 THEN 'Medium Activity'
+                ELSE 'Low Activity'
+            END AS activity_segment,
+            CASE WHEN COUNT(*) OVER () > {max_points} THEN floor(lat / {cell_degrees}) END AS lat_bin,
+            CASE WHEN COUNT(*) OVER () > {max_points} THEN floor(long / {cell_degrees}) END AS long_bin
+        FROM account_spend
+    )
+    SELECT AVG(lat) AS lat,
+           AVG(long) AS long,
+           COUNT(*) AS accounts,
+           SUM(total_spend) AS total_spend,
+           CASE WHEN COUNT(*) = 1 THEN ANY_VALUE(name) ELSE COUNT(*) || ' accounts' END AS label,
+           mode(activity_segment) AS activity_segment
+    FROM binned
+    GROUP BY lat_bin, long_bin, CASE WHEN lat_bin IS NULL THEN id END
+    ORDER BY total_spend DESC
+    """, region_choice)
+
+
+CROSS_FILTERS = ('sales_rep', 'channel', 'segment')
+
+PLOT_EXECUTORS = {
+    'plot1': plot1_data,
+    'plot3': plot3_data,
+    'plot4': plot4_data,
+    'plot5': plot5_data,
+    'plot8': plot8_data,
+    'plot9': plot9_data,
+    'plot10': plot10_data,
+    'plot12': plot12_data,
+    'plot13': plot13_data,
+    'plot14': plot14_data,
+    'plot16': plot16_data,
+    'plot21': plot21_data,
+}
@@ -0,0 +1,201 @@
+"""Batch runner for the query pack in Analysis.sql.
+
+Splits the file into statements, translates the MySQL-specific bits to
+DuckDB, runs the queries concurrently and writes each result to Parquet:
+
+    python run_analysis.py --out analysis_results
+
+Each query is written as ``<nn>-<title>.parquet`` next to a
+``manifest.json`` holding row counts and per-query timings.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import datastore
+
+SQL_FILE = os.path.join(datastore.DATA_DIR, 'Analysis.sql')
+
+
+def split_statements(sql):
+    """Split ``sql`` into (title, statement) pairs.
+
+    Semicolons inside string literals and comments do not end a statement.
+    The title is taken from the last ``-- `` comment before the statement.
+    """
+    statements = []
+    current = []
+    title = None
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+            current.append(char)
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = len(sql) if end == -1 else end
+            if not ''.join(current).strip():
+                title = sql[i + 2:end].strip()
+            i = end
+            continue
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append((title, statement))
+            current = []
+            title = None
+        else:
+            current.append(char)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append((title, statement))
+    return statements
+
+
+def _split_args(text):
+    """Split a function argument list on top-level commas."""
+    args, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(text[start:i].strip())
+            start = i + 1
+    args.append(text[start:].strip())
+    return args
+
+
+def _replace_function(sql, name, rewrite):
+    """Replace every ``name(...)`` call in ``sql`` with ``rewrite(args)``."""
+    pattern = re.compile(rf'\b{name}\s*\(', re.IGNORECASE)
+    while True:
+        match = pattern.search(sql)
+        if not match:
+            return sql
+        depth, end = 1, match.end()
+        while depth:
+            depth += {'(': 1, ')': -1}.get(sql[end], 0)
+            end += 1
+        args = _split_args(sql[match.end():end - 1])
+        sql = sql[:match.start()] + rewrite(args) + sql[end:]
+
+
+def translate_mysql(sql):
+    """Translate a MySQL statement to DuckDB, or return None to skip it."""
+    if re.match(r'^\s*use\s+\w+\s*$', sql, re.IGNORECASE):
+        return None
+    sql = sql.replace('`', '"')
+    # MySQL DATEDIFF(end, start) counts days from start to end
+    sql = _replace_function(sql, 'DATEDIFF', lambda args: f"date_diff('day', {args[1]}, {args[0]})")
+    # LIKE is case-insensitive under MySQL's default collation
+    sql = re.sub(r'\bLIKE\b', 'ILIKE', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bIFNULL\s*\(', 'COALESCE(', sql, flags=re.IGNORECASE)
+    return sql
+
+
+def load_queries(path=SQL_FILE):
+    """Return the translated queries from ``path`` as a list of dicts."""
+    with open(path) as f:
+        statements = split_statements(f.read())
+    queries = []
+    for title, statement in statements:
+        translated = translate_mysql(statement)
+        if translated is None:
+            continue
+        number = len(queries) + 1
+        match = re.match(r'^(\d+)\.\s*(.*)$', title or '')
+        if match:
+            number, title = int(match.group(1)), match.group(2)
+        slug = re.sub(r'[^a-z0-9]+', '-', (title or 'query').lower()).strip('-')[:60]
+        queries.append({'number': number, 'title': title, 'name': f'{number:02d}-{slug}', 'sql': translated})
+    return queries
+
+
+def warehouse_connection(data_dir=datastore.DATA_DIR):
+    """Load the source tables; their compact layout has MySQL's DATETIME columns as timestamps."""
+    return datastore.connect(datastore.load_tables(data_dir))
+
+
+def run_query(con, query, out_dir):
+    cursor = con.cursor()
+    path = os.path.join(out_dir, f"{query['name']}.parquet")
+    started = time.perf_counter()
+    try:
+        # COPY streams the result straight to Parquet without a pandas round trip
+        rows = cursor.execute(f"COPY ({query['sql']}) TO '{path}' (FORMAT PARQUET)").fetchone()[0]
+        error = None
+    except Exception as exc:
+        rows, error = None, str(exc)
+    finally:
+        cursor.close()
+    return {
+        'number': query['number'],
+        'title': query['title'],
+        'file': os.path.basename(path) if error is None else None,
+        'rows': rows,
+        'seconds': round(time.perf_counter() - started, 4),
+        'error': error,
+    }
+
+
+def run_all(out_dir, workers=None, sql_file=SQL_FILE, data_dir=datastore.DATA_DIR, only=None):
+    queries = load_queries(sql_file)
+    if only:
+        queries = [query for query in queries if query['number'] in only]
+    os.makedirs(out_dir, exist_ok=True)
+    con = warehouse_connection(data_dir)
+    started = time.perf_counter()
+    # DuckDB releases the GIL while executing, so threads run queries in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda query: run_query(con, query, out_dir), queries))
+    manifest = {
+        'source': os.path.basename(sql_file),
+        'data_version': datastore.data_version(data_dir),
+        'elapsed_seconds': round(time.perf_counter() - started, 4),
+        'queries': results,
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='analysis_results', help='Output directory for the Parquet files')
+    parser.add_argument('--sql', default=SQL_FILE, help='SQL file to run')
+    parser.add_argument('--data-dir', default=datastore.DATA_DIR, help='Directory holding the source CSVs')
+    parser.add_argument('--workers', type=int, help='Number of queries to run at once')
+    parser.add_argument('--only', type=int, nargs='+', help='Query numbers to run (default: all)')
+    parser.add_argument('--print-sql', action='store_true', help='Print the translated SQL and exit')
+    args = parser.parse_args(argv)
+
+    if args.print_sql:
+        for query in load_queries(args.sql):
+            print(f"-- {query['number']}. {query['title']}\n{query['sql']};\n")
+        return
+
+    manifest = run_all(args.out, args.workers, args.sql, args.data_dir, args.only)
+    failed = [query for query in manifest['queries'] if query['error']]
+    for query in manifest['queries']:
+        status = f"{query['rows']} rows" if not query['error'] else f"FAILED: {query['error']}"
+        print(f"{query['number']:>3}. {query['title']} ({query['seconds']}s) {status}")
+    print(f"Ran {len(manifest['queries'])} queries in {manifest['elapsed_seconds']}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
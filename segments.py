@@ -0,0 +1,187 @@
+"""Segmentation plots recomputed from per-account metrics as thresholds move.
+
+The order count, spend, average order and its standard deviation of every
+account in scope are read once from the monthly rollups and kept as NumPy
+arrays sorted by order count, alongside prefix sums of the amounts and the
+dense spend and order ranks. Moving a segment threshold then only takes a
+binary search for the band edges and a difference of prefix sums per
+segment, instead of another pass over the orders.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import rollups
+from queries import PLOT_THRESHOLDS
+
+
+def enabled():
+    return True
+
+
+def cache_tag():
+    return 'account-metrics'
+
+
+def build(con):
+    _scope_metrics.cache_clear()
+
+
+def update(con, table, rows):
+    if table == 'orders':
+        _scope_metrics.cache_clear()
+
+
+def _prefix_sums(values):
+    """Prefix sums of ``values`` ignoring NaN, and of how many were not NaN."""
+    present = ~np.isnan(values)
+    return (np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))]),
+            np.concatenate([[0], np.cumsum(present)]))
+
+
+def _dense_rank_desc(values):
+    """``DENSE_RANK() OVER (ORDER BY values DESC)``, with NaN ranked last."""
+    filled = np.where(np.isnan(values), -np.inf, values)
+    distinct = np.unique(filled)[::-1]
+    return np.searchsorted(-distinct, -filled) + 1
+
+
+class AccountMetrics:
+    """Per-account metrics for one region, date range and cross-filter."""
+
+    def __init__(self, metrics):
+        metrics = metrics.sort_values(['region_name', 'total_orders'], na_position='last', kind='stable')
+        metrics = metrics.reset_index(drop=True)
+        self.account_names = metrics['account_name'].to_numpy()
+        self.region_names = metrics['region_name'].to_numpy()
+        self.orders = metrics['total_orders'].to_numpy(dtype=np.int64)
+        self.sales = metrics['total_sales'].to_numpy(dtype=float)
+        self.averages = metrics['avg_order_amt_usd'].to_numpy(dtype=float)
+        self.std_devs = metrics['order_amt_std_dev'].to_numpy(dtype=float)
+        self.sales_sums, self.sales_counts = _prefix_sums(self.sales)
+        # Accounts of each region are contiguous and sorted by order count
+        self.regions = []
+        for region_name, rows in metrics.groupby('region_name', dropna=False, sort=False).indices.items():
+            self.regions.append((region_name, rows[0], rows[-1] + 1))
+        by_orders = np.argsort(self.orders, kind='stable')
+        self.orders_sorted = self.orders[by_orders]
+        self.by_orders = by_orders
+        self.order_ranks = _dense_rank_desc(self.orders.astype(float))
+        self.spend_ranks = _dense_rank_desc(self.sales)
+
+    def mean_sales(self, start, stop):
+        """Average of the non-NULL spends between two sorted positions, or NaN."""
+        count = self.sales_counts[stop] - self.sales_counts[start]
+        if count == 0:
+            return np.nan
+        return (self.sales_sums[stop] - self.sales_sums[start]) / count
+
+
+@lru_cache(maxsize=32)
+def _scope_metrics(con, region_choice, date_range, filters):
+    return AccountMetrics(rollups.account_metrics(con, region_choice, date_range, filters))
+
+
+def _thresholds(plot_id, thresholds):
+    return {**PLOT_THRESHOLDS[plot_id], **(thresholds or {})}
+
+
+def _nan_mean(values):
+    values = values[~np.isnan(values)]
+    return values.mean() if len(values) else np.nan
+
+
+def _nan_sum(values):
+    values = values[~np.isnan(values)]
+    return values.sum() if len(values) else np.nan
+
+
+def plot6_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    thresholds = _thresholds('plot6', thresholds)
+    metrics = _scope_metrics(con, region_choice, date_range, filters)
+    # Volume bands are contiguous ranges of the order-count-sorted accounts
+    high_start = np.searchsorted(metrics.orders_sorted, thresholds['high_volume_orders'], side='right')
+    moderate_start = min(high_start, np.searchsorted(metrics.orders_sorted, thresholds['moderate_volume_orders'],
+                                                     side='right'))
+    bands = (
+        ('High Volume', high_start, len(metrics.orders_sorted)),
+        ('Moderate Volume', moderate_start, high_start),
+        ('Low Volume', 0, moderate_start),
+    )
+    rows = []
+    for volume_segment, start, stop in bands:
+        accounts = metrics.by_orders[start:stop]
+        high_value = metrics.averages[accounts] > thresholds['high_value_avg_usd']
+        for value_segment, in_segment in (('High Value', high_value), ('Low Value', ~high_value)):
+            members = accounts[in_segment]
+            if len(members) == 0:
+                continue
+            rows.append({
+                'order_volume_segment': volume_segment,
+                'order_value_segment': value_segment,
+                'num_accounts': len(members),
+                'avg_order_size_usd': _nan_mean(metrics.averages[members]),
+                'avg_order_std_dev_usd': _nan_mean(metrics.std_devs[members]),
+                'total_sales_in_segment': _nan_sum(metrics.sales[members]),
+            })
+    data = pd.DataFrame(rows, columns=['order_volume_segment', 'order_value_segment', 'num_accounts',
+                                       'avg_order_size_usd', 'avg_order_std_dev_usd', 'total_sales_in_segment'])
+    return data.sort_values('num_accounts', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def plot17_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    thresholds = _thresholds('plot17', thresholds)
+    metrics = _scope_metrics(con, region_choice, date_range, filters)
+    order_activity = np.select(
+        [metrics.order_ranks <= thresholds['highly_active_rank'],
+         metrics.order_ranks <= thresholds['moderately_active_rank']],
+        ['Highly Active', 'Moderately Active'], 'Less Active')
+    spending = np.select(
+        [metrics.spend_ranks <= thresholds['high_spender_rank'],
+         metrics.spend_ranks <= thresholds['moderate_spender_rank']],
+        ['High Spender', 'Moderate Spender'], 'Low Spender')
+    order = np.lexsort((metrics.spend_ranks, metrics.order_ranks))
+    return pd.DataFrame({
+        'account_name': metrics.account_names[order],
+        'total_orders': metrics.orders[order],
+        'total_spend': metrics.sales[order],
+        'order_activity_segment': order_activity[order],
+        'spending_segment': spending[order],
+    })
+
+
+def plot18_data(con, region_choice, date_range=None, filters=None, thresholds=None):
+    thresholds = _thresholds('plot18', thresholds)
+    metrics = _scope_metrics(con, region_choice, date_range, filters)
+    high, medium = thresholds['high_activity_orders'], thresholds['medium_activity_orders']
+    rows = []
+    for region_name, start, stop in metrics.regions:
+        orders = metrics.orders[start:stop]
+        # BETWEEN medium AND high is Medium Activity, above high is High Activity
+        medium_start = start + np.searchsorted(orders, medium, side='left')
+        high_start = start + np.searchsorted(orders, high, side='right')
+        if medium > high:
+            medium_start = high_start
+        bands = (
+            ('High Activity', high_start, stop),
+            ('Medium Activity', medium_start, high_start),
+            ('Low Activity', start, medium_start),
+        )
+        for segment, band_start, band_stop in bands:
+            if band_stop > band_start:
+                rows.append({'region_name': region_name, 'activity_segment': segment,
+                             'avg_sales': metrics.mean_sales(band_start, band_stop)})
+    data = pd.DataFrame(rows, columns=['region_name', 'activity_segment', 'avg_sales'])
+    data = data.sort_values(['region_name', 'avg_sales'], ascending=[True, False], na_position='last', kind='stable')
+    return data.reset_index(drop=True)
+
+
+CROSS_FILTERS = rollups.CROSS_FILTERS
+
+PLOT_EXECUTORS = {
+    'plot6': plot6_data,
+    'plot17': plot17_data,
+    'plot18': plot18_data,
+}
@@ -0,0 +1,380 @@
+"""HyperLogLog sketches for approximate distinct account counts.
+
+``web_event_reach`` holds one sketch of the accounts reached per region,
+channel and month, built when the data is loaded and merged into on every
+append. Unique-account reach for any slice is then a register-wise max over
+a few dozen sketches instead of a ``COUNT(DISTINCT)`` over all web events.
+
+The relative standard error is ``1.04 / sqrt(2 ** precision)`` and is set
+with the ``SALES_DASHBOARD_DISTINCT_ERROR`` environment variable (default
+0.02). Setting it to 0 turns the sketches off and every count is exact.
+"""
+
+import math
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+ERROR_ENV_VAR = "SALES_DASHBOARD_DISTINCT_ERROR"
+DEFAULT_RELATIVE_ERROR = 0.02
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+REACH_TABLE = "web_event_reach"
+
+_UINT64 = np.uint64
+
+
+def _splitmix64(values):
+    """Well-mixed 64-bit hashes of an integer array."""
+    x = np.asarray(values).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        x = x + _UINT64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> _UINT64(30))) * _UINT64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> _UINT64(27))) * _UINT64(0x94D049BB133111EB)
+        x = x ^ (x >> _UINT64(31))
+    return x
+
+
+def _bit_length(x):
+    """Vectorized int.bit_length() for a uint64 array."""
+    x = x.copy()
+    length = np.zeros(x.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = x >= (_UINT64(1) << _UINT64(shift))
+        length[mask] += shift
+        x[mask] >>= _UINT64(shift)
+    return length + (x > 0).astype(np.uint8)
+
+
+def precision_for_error(relative_error):
+    """Smallest precision whose standard error is at most ``relative_error``."""
+    precision = math.ceil(math.log2((1.04 / relative_error) ** 2))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def configured_relative_error():
+    """Relative error from the environment; 0 means exact counts only."""
+    return float(os.environ.get(ERROR_ENV_VAR, DEFAULT_RELATIVE_ERROR))
+
+
+def enabled():
+    return configured_relative_error() > 0
+
+
+def cache_tag():
+    """Identifies the sketch configuration in result cache keys."""
+    return f"hll-p{precision_for_error(configured_relative_error())}"
+
+
+def register_updates(values, precision):
+    """Register index and rank for each value, as used by ``HyperLogLog.add``."""
+    hashes = _splitmix64(values)
+    index = (hashes >> _UINT64(64 - precision)).astype(np.int64)
+    remainder = hashes & ((_UINT64(1) << _UINT64(64 - precision)) - _UINT64(1))
+    rank = (64 - precision + 1) - _bit_length(remainder).astype(np.int64)
+    return index, rank.astype(np.uint8)
+
+
+class HyperLogLog:
+    """A mergeable HyperLogLog sketch over integer values."""
+
+    def __init__(self, precision=12, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.m, dtype=np.uint8)
+        self.registers = registers
+
+    @classmethod
+    def for_error(cls, relative_error):
+        return cls(precision_for_error(relative_error))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, values):
+        index, rank = register_updates(values, self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, payload, precision):
+        return cls(precision, np.frombuffer(payload, dtype=np.uint8).copy())
+
+
+# Reach sketches over web events
+
+def _pack_registers(registers):
+    """Stored form of a sketch's registers.
+
+    Compressed, so a 4096-register sketch stays under the size at which
+    DuckDB moves a BLOB to its own overflow block, as scanning those pins a
+    block per row and does not fit a small memory limit.
+    """
+    return zlib.compress(registers.tobytes())
+
+
+def _unpack_registers(payload):
+    return np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+
+
+_PARTITION_QUERY = """
+SELECT r.name AS region_name,
+       we.channel,
+       date_trunc('month', CAST(we.occurred_at AS TIMESTAMP)) AS month,
+       a.id IS NOT NULL AS matched,
+       we.account_id,
+       COUNT(*) AS events
+FROM {source} we
+LEFT JOIN accounts a ON we.account_id = a.id
+LEFT JOIN sales_reps sr ON a.sales_rep_id = sr.id
+LEFT JOIN region r ON sr.region_id = r.id
+GROUP BY ALL
+"""
+
+_PARTITION_KEYS = ['region_name', 'channel', 'month', 'matched']
+
+# Rows of (partition, account) pairs sketched at a time while building
+_PAIRS_PER_CHUNK = 1 << 18
+
+
+def _group_codes(frame):
+    """Partition code per row plus the distinct partitions, in first-seen order."""
+    keys = frame[_PARTITION_KEYS]
+    codes = keys.groupby(_PARTITION_KEYS, dropna=False, sort=False, observed=True).ngroup().to_numpy()
+    return codes, keys.drop_duplicates().reset_index(drop=True)
+
+
+def _partition_sketches(pairs, precision):
+    """Build one sketch per partition from (partition, account_id, events) rows."""
+    if pairs.empty:
+        return pd.DataFrame(columns=_PARTITION_KEYS + ['events', 'registers'])
+    codes, result = _group_codes(pairs)
+    registers = np.zeros((len(result), 1 << precision), dtype=np.uint8)
+    index, rank = register_updates(pairs['account_id'].to_numpy(), precision)
+    np.maximum.at(registers, (codes, index), rank)
+    result['events'] = np.bincount(codes, weights=pairs['events'].to_numpy()).astype(np.int64)
+    result['registers'] = [_pack_registers(row) for row in registers]
+    return result
+
+
+def _merge_partitions(sketches, precision):
+    """One sketch per partition, merging the rows of ``sketches`` that share one."""
+    codes, merged = _group_codes(sketches)
+    registers = np.zeros((len(merged), 1 << precision), dtype=np.uint8)
+    for code, payload in zip(codes, sketches['registers']):
+        np.maximum(registers[code], _unpack_registers(payload), out=registers[code])
+    merged['events'] = np.bincount(codes, weights=sketches['events'].to_numpy()).astype(np.int64)
+    merged['registers'] = [_pack_registers(row) for row in registers]
+    return merged
+
+
+def _write_partitions(con, partitions, precision):
+    cursor = con.cursor()
+    try:
+        cursor.register('_reach_partitions', partitions)
+        cursor.execute(f"""
+        INSERT INTO {REACH_TABLE}
+        SELECT region_name, channel, CAST(month AS TIMESTAMP), matched, events, {precision},
+               CAST(registers AS BLOB)
+        FROM _reach_partitions
+        """)
+        cursor.unregister('_reach_partitions')
+    finally:
+        cursor.close()
+
+
+def build(con, relative_error=None):
+    """Materialize the reach sketches from the full web_events table."""
+    relative_error = configured_relative_error() if relative_error is None else relative_error
+    con.execute(f"DROP TABLE IF EXISTS {REACH_TABLE}")
+    if relative_error <= 0:
+        return
+    precision = precision_for_error(relative_error)
+    con.execute(f"""
+    CREATE TABLE {REACH_TABLE} (
+        region_name VARCHAR, channel VARCHAR, month TIMESTAMP, matched BOOLEAN,
+        events BIGINT, precision INTEGER, registers BLOB
+    )
+    """)
+    # Pairs are sketched a chunk at a time so they never have to fit in memory at once
+    chunks = []
+    cursor = con.cursor()
+    try:
+        cursor.execute(_PARTITION_QUERY.format(source='web_events'))
+        while True:
+            pairs = cursor.fetch_df_chunk(_PAIRS_PER_CHUNK // 2048)
+            if pairs.empty:
+                break
+            chunks.append(_partition_sketches(pairs, precision))
+    finally:
+        cursor.close()
+    if chunks:
+        _write_partitions(con, _merge_partitions(pd.concat(chunks, ignore_index=True), precision), precision)
+
+
+def update(con, table, rows):
+    """Merge newly appended web events into the existing sketches."""
+    if table != 'web_events' or not is_built(con):
+        return
+    precision = con.execute(f"SELECT ANY_VALUE(precision) FROM {REACH_TABLE}").fetchone()[0]
+    cursor = con.cursor()
+    try:
+        cursor.register('_new_web_events', rows)
+        pairs = cursor.execute(_PARTITION_QUERY.format(source='_new_web_events')).df()
+        cursor.unregister('_new_web_events')
+        new = _partition_sketches(pairs, precision)
+        cursor.register('_new_partitions', new[_PARTITION_KEYS])
+        existing = cursor.execute(f"""
+        SELECT s.region_name, s.channel, s.month, s.matched, s.events, s.registers
+        FROM {REACH_TABLE} s
+        JOIN _new_partitions n
+          ON s.region_name IS NOT DISTINCT FROM n.region_name
+         AND s.channel IS NOT DISTINCT FROM n.channel
+         AND s.month = n.month AND s.matched = n.matched
+        """).df()
+        cursor.execute(f"""
+        DELETE FROM {REACH_TABLE} s
+        USING _new_partitions n
+        WHERE s.region_name IS NOT DISTINCT FROM n.region_name
+          AND s.channel IS NOT DISTINCT FROM n.channel
+          AND s.month = n.month AND s.matched = n.matched
+        """)
+        cursor.unregister('_new_partitions')
+    finally:
+        cursor.close()
+    if not existing.empty:
+        new = _merge_partitions(pd.concat([existing, new], ignore_index=True), precision)
+    _write_partitions(con, new, precision)
+
+
+def is_built(con):
+    return bool(con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [REACH_TABLE]
+    ).fetchone()[0])
+
+
+def _load_sketches(con, where="", params=None):
+    cursor = con.cursor()
+    try:
+        return cursor.execute(f"""
+        SELECT region_name, channel, month, matched, events, precision, registers
+        FROM {REACH_TABLE} {where}
+        """, params or []).df()
+    finally:
+        cursor.close()
+
+
+def _merged_count(sketches):
+    if sketches.empty:
+        return 0
+    precision = int(sketches['precision'].iloc[0])
+    merged = HyperLogLog(precision)
+    for payload in sketches['registers']:
+        np.maximum(merged.registers, _unpack_registers(payload), out=merged.registers)
+    return merged.count()
+
+
+def unique_accounts(con, region_name=None, channel=None, start_month=None, end_month=None,
+                    matched_only=True):
+    """Approximate distinct accounts reached, merged from the stored sketches.
+
+    Any argument left as ``None`` is not filtered on; months are inclusive.
+    """
+    clauses, params = [], []
+    for column, value in (('region_name', region_name), ('channel', channel)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if start_month is not None:
+        clauses.append("month >= date_trunc('month', CAST(? AS TIMESTAMP))")
+        params.append(start_month)
+    if end_month is not None:
+        clauses.append("month <= date_trunc('month', CAST(? AS TIMESTAMP))")
+        params.append(end_month)
+    if matched_only:
+        clauses.append("matched")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return _merged_count(_load_sketches(con, where, params))
+
+
+# Sketch-backed executors for the plots that count distinct accounts
+
+def _region_sketches(con, region_choice, date_range=None, filters=None):
+    clauses, params = [], []
+    if region_choice != 'All Regions':
+        clauses.append("region_name = ?")
+        params.append(region_choice)
+    if filters is not None and filters.channel is not None:
+        # A channel selection only keeps events of known accounts, like the SQL
+        clauses.append("channel = ? AND matched")
+        params.append(filters.channel)
+    if date_range is not None:
+        clauses.append("month BETWEEN date_trunc('month', CAST(? AS TIMESTAMP)) "
+                       "AND date_trunc('month', CAST(? AS TIMESTAMP))")
+        params.extend(date_range)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return _load_sketches(con, where, params)
+
+
+def plot11_data(con, region_choice, date_range=None, filters=None):
+    sketches = _region_sketches(con, region_choice, date_range, filters)
+    rows = []
+    for (region_name, channel), group in sketches.groupby(['region_name', 'channel'], dropna=False):
+        rows.append({
+            'region_name': region_name,
+            'channel': channel,
+            'total_events': int(group['events'].sum()),
+            'unique_accounts_impacted': _merged_count(group[group['matched']]),
+        })
+    data = pd.DataFrame(rows, columns=['region_name', 'channel', 'total_events', 'unique_accounts_impacted'])
+    data = data.sort_values(['region_name', 'total_events'], ascending=[True, False], na_position='last')
+    return data.reset_index(drop=True)
+
+
+def plot15_data(con, region_choice, date_range=None, filters=None):
+    sketches = _region_sketches(con, region_choice, date_range, filters)
+    rows = []
+    for channel, group in sketches.groupby('channel'):
+        rows.append({
+            'channel': channel,
+            'total_events': int(group['events'].sum()),
+            'unique_accounts': _merged_count(group),
+            'total_customers': _merged_count(group[group['matched']]),
+        })
+    data = pd.DataFrame(rows, columns=['channel', 'total_events', 'unique_accounts', 'total_customers'])
+    return data.sort_values('total_events', ascending=False).reset_index(drop=True)
+
+
+# Cross-filter dimensions the sketches can answer; other selections fall back to SQL
+CROSS_FILTERS = ('channel',)
+
+PLOT_EXECUTORS = {
+    'plot11': plot11_data,
+    'plot15': plot15_data,
+}
@@ -0,0 +1,320 @@
+"""Pluggable data sources behind the dashboard.
+
+The source is picked from the ``SALES_DASHBOARD_SOURCE`` environment
+variable:
+
+    (unset)                              the five CSVs next to the app
+    sqlite:///path/to/sales.db           a SQLite database
+    postgresql://user@host:5432/sales    PostgreSQL; needs the optional psycopg
+
+A SQL source is read over a bounded connection pool, with a timeout both on
+waiting for a connection and on every statement. Region-filtered plots whose
+reference SQL the database can run are pushed down to it, so only their
+aggregated rows travel; the other plots run on a local DuckDB copy of the
+tables loaded through the same pool. Either way results go through the
+shared result cache (see result_cache.py), keyed by a data version the
+database computes from its row counts and latest ids and timestamps, so a
+refresh needs no CSV export. ``Snapshots`` reloads the local copy whenever
+that version changes, so pushed-down and local plots see the same data.
+
+``python sources.py sqlite:///sales.db`` writes the sample CSVs to a SQLite
+database to try a SQL source locally.
+"""
+
+import contextlib
+import decimal
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import compaction
+import datastore
+import result_cache
+from queries import DATED_TABLES, plot_query
+
+SOURCE_ENV_VAR = "SALES_DASHBOARD_SOURCE"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+# Plots whose reference SQL each dialect runs as is, with the same results
+PUSHDOWN_PLOTS = {
+    'sqlite': ('plot1', 'plot2', 'plot3', 'plot5', 'plot7', 'plot9', 'plot10', 'plot11', 'plot12',
+               'plot14', 'plot15', 'plot17', 'plot18'),
+    # ROUND(double precision, int) does not exist in PostgreSQL, which rules out plot12
+    'postgresql': ('plot1', 'plot2', 'plot3', 'plot5', 'plot7', 'plot9', 'plot10', 'plot11',
+                   'plot14', 'plot15', 'plot17', 'plot18'),
+}
+
+# Rows fetched at a time when copying a table out of a SQL source
+_FETCH_ROWS = 50_000
+
+
+class DataSource:
+    """Interface for the places the dashboard's tables come from."""
+
+    def version(self):
+        """Identifies the current data in result cache keys."""
+        raise NotImplementedError
+
+    def open_database(self):
+        """A DuckDB connection holding the tables and their materialized aggregates."""
+        raise NotImplementedError
+
+    def region_names(self):
+        """Names of the regions, in id order, without loading the other tables."""
+        raise NotImplementedError
+
+    def fetch_plot_data(self, con, plot_id, region_choice, cache=None, version=None, **kwargs):
+        """Data of a plot; takes the arguments of datastore.fetch_plot_data."""
+        return datastore.fetch_plot_data(con, plot_id, region_choice, cache, version, **kwargs)
+
+
+class CsvSource(DataSource):
+    """The CSV files in a directory, loaded into DuckDB."""
+
+    def __init__(self, data_dir=datastore.DATA_DIR):
+        self.data_dir = data_dir
+
+    def version(self):
+        return datastore.data_version(self.data_dir)
+
+    def open_database(self):
+        return datastore.open_database(self.data_dir)
+
+    def region_names(self):
+        return datastore.load_table('region', self.data_dir)['name'].tolist()
+
+
+class Snapshots:
+    """The DuckDB copy of a source's tables, reloaded whenever the source's version changes.
+
+    Results are cached under the version read before computing them, so
+    they must come from a copy loaded at that version rather than the first
+    one the process loaded. One copy is kept; connections handed out before
+    a reload stay usable until their callers drop them.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._lock = threading.Lock()
+        self._version = None
+        self._con = None
+
+    def connection(self, version):
+        """A connection holding the tables as of ``version``, loading them if needed."""
+        with self._lock:
+            if self._con is None or version != self._version:
+                self._con = self.source.open_database()
+                self._version = version
+            return self._con
+
+
+class ConnectionPool:
+    """At most ``size`` connections made by ``connect``, reused across threads.
+
+    Waiting longer than ``timeout`` seconds for a free connection raises
+    TimeoutError. A connection whose use raised is closed rather than reused.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self._connect = connect
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.size = size
+        self.timeout = timeout
+
+    @contextlib.contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No source connection became free within {self.timeout:g}s")
+        try:
+            with self._lock:
+                con = self._idle.pop() if self._idle else None
+            if con is None:
+                con = self._connect()
+            try:
+                yield con
+            except BaseException:
+                con.close()
+                raise
+            with self._lock:
+                self._idle.append(con)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
+
+
+def _frame(cursor, rows):
+    """DataFrame of ``rows`` with PostgreSQL NUMERIC values as floats, as DuckDB reads the CSVs."""
+    frame = pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description])
+    for column in frame.columns:
+        values = frame[column].dropna()
+        if len(values) and isinstance(values.iloc[0], decimal.Decimal):
+            frame[column] = frame[column].astype(float)
+    return frame
+
+
+class SqlSource(DataSource):
+    """A SQLite or PostgreSQL database holding the five tables."""
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT_SECONDS, pushdown=True):
+        if url.startswith('sqlite:///'):
+            self.dialect = 'sqlite'
+            self._path = url[len('sqlite:///'):]
+            connect = self._connect_sqlite
+        elif url.startswith(('postgresql://', 'postgres://')):
+            self.dialect = 'postgresql'
+            try:
+                import psycopg
+            except ImportError as exc:
+                raise ImportError(
+                    "The PostgreSQL source needs the 'psycopg' package: pip install 'psycopg[binary]'"
+                ) from exc
+            self._psycopg = psycopg
+            connect = self._connect_postgresql
+        else:
+            raise ValueError(f"Unsupported {SOURCE_ENV_VAR} value: {url!r}")
+        self.url = url
+        self.timeout = timeout
+        self.pushdown_plots = PUSHDOWN_PLOTS[self.dialect] if pushdown else ()
+        self.pool = ConnectionPool(connect, pool_size, timeout)
+        self._schema = None
+
+    def _connect_sqlite(self):
+        # Pooled connections move between threads, one thread at a time
+        return sqlite3.connect(self._path, timeout=self.timeout, check_same_thread=False)
+
+    def _connect_postgresql(self):
+        return self._psycopg.connect(self.url, connect_timeout=max(1, round(self.timeout)),
+                                     options=f"-c statement_timeout={round(self.timeout * 1000)}")
+
+    def query(self, sql, params=(), chunked=False):
+        """Rows of ``sql`` as a DataFrame, on a pooled connection, within the timeout."""
+        with self.pool.connection() as con:
+            if self.dialect == 'sqlite':
+                # SQLite has no statement timeout; the progress handler aborts past the deadline
+                deadline = time.monotonic() + self.timeout
+                con.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            cursor = con.cursor()
+            try:
+                cursor.execute(sql, params)
+                if not chunked:
+                    return _frame(cursor, cursor.fetchall())
+                parts = []
+                while rows := cursor.fetchmany(_FETCH_ROWS):
+                    parts.append(_frame(cursor, rows))
+                return pd.concat(parts, ignore_index=True) if parts else _frame(cursor, [])
+            except Exception as exc:
+                if self._timed_out(exc):
+                    raise TimeoutError(f"Source query ran over {self.timeout:g}s") from exc
+                raise
+            finally:
+                cursor.close()
+                if self.dialect == 'sqlite':
+                    con.set_progress_handler(None, 0)
+                else:
+                    con.rollback()
+
+    def _timed_out(self, exc):
+        if self.dialect == 'sqlite':
+            return isinstance(exc, sqlite3.OperationalError) and 'interrupted' in str(exc)
+        return isinstance(exc, self._psycopg.errors.QueryCanceled)
+
+    def schema(self):
+        """Schema holding the tables, which the date range CTEs read from."""
+        if self._schema is None:
+            self._schema = 'main' if self.dialect == 'sqlite' else self.query("SELECT current_schema()").iat[0, 0]
+        return self._schema
+
+    def version(self):
+        """Hash of each table's row count, highest id and, for fact tables, latest timestamp.
+
+        Appends and deletes change it; rows updated in place do not.
+        """
+        selects = []
+        for name in datastore.TABLE_FILES:
+            latest = "MAX(occurred_at)" if name in DATED_TABLES else "NULL"
+            selects.append(f"SELECT '{name}' AS name, COUNT(*) AS n, MAX(id) AS max_id, "
+                           f"CAST({latest} AS VARCHAR(32)) AS latest FROM {name}")
+        fingerprint = self.query(" UNION ALL ".join(selects)).sort_values('name')
+        payload = fingerprint.to_csv(index=False).encode()
+        return f"{self.dialect}-{hashlib.sha1(payload).hexdigest()[:16]}"
+
+    def load_tables(self):
+        """Every table in the compact layout, copied over the pool with one connection per table."""
+        with ThreadPoolExecutor(max_workers=self.pool.size) as workers:
+            futures = {name: workers.submit(self.query, f"SELECT * FROM {name} ORDER BY id", (), True)
+                       for name in datastore.TABLE_FILES}
+            return {name: compaction.compact_table(name, future.result()) for name, future in futures.items()}
+
+    def open_database(self):
+        return datastore.connect(self.load_tables())
+
+    def region_names(self):
+        return self.query("SELECT name FROM region ORDER BY id")['name'].tolist()
+
+    def can_push_down(self, plot_id, filters=None):
+        # Account dimension cross-filters compile to DuckDB SQL (see crossfilter.py)
+        return plot_id in self.pushdown_plots and not (filters and filters.account_dimensions())
+
+    def fetch_plot_data(self, con, plot_id, region_choice, cache=None, version=None, exact=False,
+                        date_range=None, filters=None, thresholds=None):
+        """Run the plot's SQL in the database when it can be pushed down, else on ``con``."""
+        if not self.can_push_down(plot_id, filters):
+            return super().fetch_plot_data(con, plot_id, region_choice, cache, version, exact=exact,
+                                           date_range=date_range, filters=filters, thresholds=thresholds)
+        if filters:
+            region_choice, date_range = filters.scope(region_choice, date_range)
+        query = plot_query(plot_id, region_choice, date_range, thresholds, self.schema())
+
+        def compute():
+            result = self.query(query)
+            # Column names as DuckDB reports them; PostgreSQL folds unquoted aliases to lower case.
+            # DuckDB describes the query over its own tables, which are not in the source's schema.
+            local_query = plot_query(plot_id, region_choice, date_range, thresholds)
+            result.columns = datastore.fetch_column(con, f"DESCRIBE {local_query}")
+            return result
+
+        if cache is None:
+            return compute()
+        key = result_cache.make_key(plot_id, region_choice, version, f"{query}@{self.dialect}")
+        return result_cache.cached_query(cache, key, compute)
+
+
+def from_url(url=None):
+    """Create a source from a source URL, falling back to the environment and then the CSVs."""
+    url = url or os.environ.get(SOURCE_ENV_VAR)
+    if not url:
+        return CsvSource()
+    return SqlSource(url)
+
+
+def write_sqlite(url, data_dir=datastore.DATA_DIR):
+    """Write the CSVs in ``data_dir`` to the SQLite database at ``url``, indexed on account_id."""
+    if not url.startswith('sqlite:///'):
+        raise ValueError(f"Not a sqlite:/// URL: {url!r}")
+    with contextlib.closing(sqlite3.connect(url[len('sqlite:///'):])) as con:
+        for name, table in datastore.load_tables(data_dir).items():
+            table.to_sql(name, con, if_exists='replace', index=False)
+        for name in DATED_TABLES:
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_account_id ON {name} (account_id)")
+        con.commit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python sources.py sqlite:///path/to/sales.db")
+    write_sqlite(sys.argv[1])
+    print(f"wrote the sample data to {sys.argv[1]}")
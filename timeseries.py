@@ -0,0 +1,73 @@
+"""Resolution choice and downsampling of the plot24 time series.
+
+plot24's SQL counts orders and web events per channel in hourly or daily
+buckets. The dashboard picks the finest resolution whose bucket count over
+the visible months stays within ``FINE_BUCKET_LIMIT``, so narrowing the
+date range (or cross-filtering a month) re-aggregates at a finer
+resolution. Before drawing, each series is cut down to ``MAX_POINTS`` with
+Largest-Triangle-Three-Buckets, which keeps the points that shape the
+line - peaks, dips and steps - rather than every n-th one.
+"""
+
+import numpy as np
+import pandas as pd
+
+from queries import TIME_RESOLUTIONS, month_after
+
+# Points drawn per series
+MAX_POINTS = 1000
+
+# Buckets per series the SQL may return before a coarser resolution is used
+FINE_BUCKET_LIMIT = 5000
+
+_BUCKET_HOURS = {'hour': 1, 'day': 24}
+
+
+def resolution_for(start, end):
+    """Finest resolution whose buckets over the months ``start`` to ``end`` fit FINE_BUCKET_LIMIT."""
+    hours = (month_after(end) - start).days * 24
+    for resolution in TIME_RESOLUTIONS:
+        if hours / _BUCKET_HOURS[resolution] <= FINE_BUCKET_LIMIT:
+            return resolution
+    return TIME_RESOLUTIONS[-1]
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points of ``(x, y)`` that Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept. The points between are split
+    into ``threshold - 2`` buckets, and from each bucket the point forming
+    the largest triangle with the point kept before it and the mean of the
+    next bucket is kept. ``x`` must be sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Twice the triangle areas; the constant factor does not change the largest
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(frame, max_points=MAX_POINTS, x='bucket', y='value', by='series'):
+    """``frame`` with every ``by`` series cut to ``max_points`` rows by lttb."""
+    parts = []
+    for _, series in frame.groupby(by, sort=False):
+        series = series.sort_values(x)
+        parts.append(series.iloc[lttb(series[x].to_numpy().astype(np.int64), series[y].to_numpy(), max_points)])
+    return pd.concat(parts) if parts else frame